@@ -1,24 +1,40 @@
-import re
 import subprocess
-import wikipediaapi
 from color import Color
 import os
 import shutil
 import glob
 
+# Largest output cat, head and read_lines return (set from ReadLimitKB in config.ini)
+MAX_READ_BYTES = 256 * 1024
+
 # Wikipedia lookup tool
 def wiki(query, sentences=3):
-    wiki_wiki = wikipediaapi.Wikipedia(language='en', user_agent='frea-tools/1.0')
-    page = wiki_wiki.page(query)
-    if not page.exists():
-        return f"No Wikipedia page found for '{query}'."
-    summary = page.summary or ''
-    sentences_list = re.split(r'(?<=[\.!?]) +', summary)
-    selected = sentences_list[:sentences]
-    return ' '.join(selected)
+    """
+    Look up a topic on Wikipedia and return the first sentences of its summary.
+    Several topics separated by '|' are looked up at once.
+    """
+    import wiki_client  # Deferred: only this tool needs it
+
+    titles = [title.strip() for title in query.split("|") if title.strip()]
+    if len(titles) <= 1:
+        found = wiki_client.get_client().summary(query, sentences)
+        if found is None:
+            return f"No Wikipedia page found for '{query}'."
+        return found[0]
+    found = wiki_client.lookup_many(titles, sentences, timeout=wiki_client.REQUEST_TIMEOUT)
+    results = []
+    for title in titles:
+        if title not in found:
+            results.append(f"{title}: lookup failed or timed out.")
+        elif found[title] is None:
+            results.append(f"{title}: no Wikipedia page found.")
+        else:
+            results.append(f"{title}: {found[title][0]}")
+    return "\n\n".join(results)
 
 # Calculator tool
 def calc(expression):
+    """Evaluate an arithmetic expression (^ means power)."""
     try:
         expr = expression.replace('^', '**')
         result = eval(expr, {'__builtins__': None}, {})
@@ -28,6 +44,7 @@ def calc(expression):
 
 # Vim editor tool
 def vim(file_path):
+    """Open a file in vim."""
     try:
         subprocess.run(['vim', file_path])
         return f"Opened vim for {file_path}"
@@ -35,60 +52,126 @@ def vim(file_path):
         return f"Error opening vim: {e}"
 
 # File operation tools
-def ls(path='.'):  # List directory contents
+def list_dir(path='.', color=False):
+    """Return directory contents, one entry per line, folders ending in '/' (colored for the terminal with color)."""
+    lines = []
+    for name in os.listdir(path):
+        if os.path.isdir(os.path.join(path, name)):
+            lines.append(f"{Color.LIGHTBLUE}{name}/{Color.ENDC}" if color else f"{name}/")
+        else:
+            lines.append(f"{Color.LIGHTGREEN}{name}{Color.ENDC}" if color else name)
+    return '\n'.join(lines)
+
+def ls(path='.'):
+    """List directory contents."""
     try:
-        for name in os.listdir(path):
-            full = os.path.join(path, name)
-            if os.path.isdir(full):
-                print(f"{Color.LIGHTBLUE}{name}/ {Color.ENDC}")
-            else:
-                print(f"{Color.LIGHTGREEN}{name}{Color.ENDC}")
-        return ''
+        return list_dir(path) or f"{path} is empty."
     except Exception as e:
         return f"ls error: {e}"
 
-def cat(file_path):  # Show full file content
+def cat(file_path):
+    """Show full file content (files above the read limit must be read in parts with read_lines)."""
     try:
+        size = os.path.getsize(file_path)
+        if size > MAX_READ_BYTES:
+            return (
+                f"cat: {file_path} is {size // 1024} KB, above the {MAX_READ_BYTES // 1024} KB "
+                "read limit; read it in parts with read_lines(file_path, start_line, line_count)."
+            )
         with open(file_path, 'r', encoding='utf-8') as f:
             return f.read()
     except Exception as e:
         return f"cat error: {e}"
 
-def head(file_path, lines=10):  # Show first N lines
+def head(file_path, lines=10):
+    """Show the first N lines of a file."""
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
             content = []
+            size = 0
             for i, line in enumerate(f, 1):
                 if i > lines:
                     break
+                size += len(line)
+                if size > MAX_READ_BYTES:
+                    content.append(
+                        f"... stopped at the {MAX_READ_BYTES // 1024} KB read limit; "
+                        f"continue with read_lines(file_path, {i}, line_count)."
+                    )
+                    break
                 content.append(line.rstrip())
             return '\n'.join(content)
     except Exception as e:
         return f"head error: {e}"
 
-def tail(file_path, lines=10):  # Show last N lines
+def read_lines(file_path, start_line=1, line_count=200):
+    """Show a numbered range of lines of a file of any size (only that range is read)."""
+    from line_index import read_lines as read_range  # Deferred: only read_lines needs it
+
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.readlines()
-            return '\n'.join([line.rstrip() for line in content[-lines:]])
+        start_line = max(1, start_line)
+        content, total = read_range(file_path, start_line, line_count, MAX_READ_BYTES)
+    except Exception as e:
+        return f"read_lines error: {e}"
+    if not content:
+        return f"{file_path} has {total} lines; line {start_line} is past the end."
+    last = start_line + len(content) - 1
+    result = [f"{file_path}: lines {start_line}-{last} of {total}"]
+    result += [f"{i}: {line}" for i, line in enumerate(content, start_line)]
+    if len(content) < line_count and last < total:
+        result.append(
+            f"... stopped at the {MAX_READ_BYTES // 1024} KB read limit; continue from line {last + 1}."
+        )
+    return '\n'.join(result)
+
+def tail(file_path, lines=10, follow=False, follow_seconds=10.0, follow_max_lines=200):
+    """Show the last N lines of a file; with follow, also wait up to follow_seconds for appended lines (at most follow_max_lines)."""
+    from file_tail import read_last_lines, follow_lines  # Deferred: only tail needs it
+
+    try:
+        if follow:
+            return '\n'.join(follow_lines(file_path, follow_seconds, follow_max_lines, lines))
+        return '\n'.join(read_last_lines(file_path, lines))
     except Exception as e:
         return f"tail error: {e}"
 
-def grep(pattern, path='.'):  # Search regex in files
+def grep_lines(pattern, path='.', max_results=200, context_lines=0, ignore_case=False, color=False):
+    """Yield grep output lines as matches are found (see grep_engine.iter_grep); color the locations for the terminal with color."""
+    from grep_engine import iter_grep  # Deferred: only grep needs it
+    from search_index import index_for
+
+    matches = 0
+    previous = last_match = None
+    for file_path, i, line, is_match in iter_grep(
+        pattern, path, max_results + 1, context_lines, ignore_case, index_for(path)
+    ):
+        if matches >= max_results and (
+            is_match or last_match is None or last_match[0] != file_path
+            or i - last_match[1] > context_lines
+        ):
+            yield f"... stopped after {max_results} matches; narrow the pattern or path."
+            return
+        if is_match:
+            matches += 1
+            last_match = (file_path, i)
+        if context_lines and previous and previous != (file_path, i - 1):
+            yield "--"
+        previous = (file_path, i)
+        sep = ':' if is_match else '-'
+        if color:
+            yield f"{Color.LIGHTBLUE}{file_path}{sep}{i}{sep}{Color.ENDC} {line}"
+        else:
+            yield f"{file_path}{sep}{i}{sep} {line}"
+
+def grep(pattern, path='.', max_results=200, context_lines=0, ignore_case=False):
+    """Search files under a path for lines matching a regex (skips binary and ignored files)."""
     try:
-        result = []
-        for root, dirs, files in os.walk(path):
-            for fname in files:
-                file_path = os.path.join(root, fname)
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    for i, line in enumerate(f, 1):
-                        if re.search(pattern, line):
-                            result.append(f"{Color.LIGHTBLUE}{file_path}:{i}:{Color.ENDC} {line.rstrip()}")
-        return '\n'.join(result)
+        return '\n'.join(grep_lines(pattern, path, max_results, context_lines, ignore_case))
     except Exception as e:
         return f"grep error: {e}"
 
-def write_file(file_path, content):  # Overwrite file
+def write_file(file_path, content):
+    """Overwrite a file with new content."""
     try:
         with open(file_path, 'w', encoding='utf-8') as f:
             f.write(content)
@@ -96,7 +179,8 @@ def write_file(file_path, content):  # Overwrite file
     except Exception as e:
         return f"write_file error: {e}"
 
-def append_file(file_path, content):  # Append to file
+def append_file(file_path, content):
+    """Append content to a file."""
     try:
         with open(file_path, 'a', encoding='utf-8') as f:
             f.write(content)
@@ -104,7 +188,8 @@ def append_file(file_path, content):  # Append to file
     except Exception as e:
         return f"append_file error: {e}"
 
-def delete_file(file_path):  # Delete a file
+def delete_file(file_path):
+    """Delete a file."""
     try:
         if os.path.exists(file_path):
             os.remove(file_path)
@@ -114,14 +199,16 @@ def delete_file(file_path):  # Delete a file
     except Exception as e:
         return f"delete_file error: {e}"
 
-def move(src, dst):  # Move or rename file
+def move(src, dst):
+    """Move or rename a file."""
     try:
         shutil.move(src, dst)
         return f"Moved {src} -> {dst}"
     except Exception as e:
         return f"move error: {e}"
 
-def copy(src, dst):  # Copy file
+def copy(src, dst):
+    """Copy a file."""
     try:
         shutil.copy2(src, dst)
         return f"Copied {src} -> {dst}"
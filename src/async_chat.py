@@ -0,0 +1,355 @@
+import asyncio
+import logging
+import time
+from color import Color
+from main import AIChat
+from circuit_breaker import CircuitOpenError, CLOSED
+from hedging import prefetch_stream_async, close_response_async, close_stream
+from token_counter import get_token_counter
+from tool_runner import run_tool_calls
+from utils import async_loading_animation, StreamPrinter
+
+
+class AsyncAIChat(AIChat):
+    """
+    asyncio engine behind the same REPL as AIChat.
+
+    Terminal input, provider calls, retries, tool execution and Wikipedia
+    lookups are awaited on one event loop, so network waits and rendering
+    overlap instead of blocking each other. Command handling, message
+    building and tool parsing are shared with AIChat.
+    """
+
+    def run(self):
+        """Starts the asyncio chat loop."""
+        try:
+            asyncio.run(self.generate_chat_async())
+        except KeyboardInterrupt:
+            print("\nKeyboard Interrupt")
+
+    async def generate_chat_async(self):
+        """
+        Main chat generation loop. Handles user input, processes commands, and interacts with the AI model.
+        """
+        chat = self.initialize_chat()
+        if chat is None:
+            print(f"{Color.BRIGHTRED}Failed to initialize chat. Exiting...{Color.ENDC}")
+            return
+
+        # Load the API client while the user types the first prompt
+        asyncio.get_running_loop().run_in_executor(None, self.initializer.warm_up)
+
+        while True:
+            try:
+                # Read in a worker thread so background tasks keep running while we wait
+                user_input = await asyncio.to_thread(self.read_user_input)
+                prompt = self.route_user_input(user_input)
+                if prompt is not None:
+                    await self.process_user_input_async(chat, prompt)
+
+            except (KeyboardInterrupt, EOFError):
+                print("\nKeyboard Interrupt")
+                break
+            except Exception as e:
+                logging.error(f"Error during chat generation: {e}", exc_info=True)
+                print(
+                    f"\n{Color.BRIGHTRED}An error occurred. Please check the logs for more details.{Color.ENDC}"
+                )
+                break
+
+    async def process_user_input_async(self, chat, user_input):
+        """
+        Processes user input, sends it to the AI model, and displays the response.
+
+        Args:
+            chat: The chat session.
+            user_input (str): The user input to process.
+        """
+        user_input = self.apply_fresh_flag(user_input)
+        user_prompt = user_input
+
+        # Near-identical prompts are answered from the similarity cache
+        cached = self.similar_response(user_prompt)
+        if cached is not None:
+            self._print_cached_turn(user_prompt, cached)
+            return
+
+        # Check if the user wants to use Wikipedia
+        if "-wiki" in user_input.lower():
+            queries = self.extract_wikipedia_queries(user_input)
+            if queries:
+                wiki_info = await self.initializer.query_wikipedia_many_async(queries)
+                if wiki_info:
+                    user_input += f"\n\nHere's some additional information from Wikipedia:\n{wiki_info}"
+
+        print()  # blank line before frea prompt
+        print(f"{Color.LIGHTPURPLE}╭─ 𝑓rea\n╰─❯❯ {Color.ENDC}", end="", flush=True)
+        response_text = await self.send_message_to_ai_async(chat, user_input)
+        print()  # blank line after AI response
+        self.chat_history.append({"role": "user", "content": user_prompt})
+        self.chat_history.append({"role": "assistant", "content": response_text})
+        self.remember_response(user_prompt, response_text)
+        self.compact_history()
+
+    async def _create_completion_async(self, messages, stream, max_retries=3):
+        """
+        Requests a completion from the async client, retrying failed calls with backoff.
+
+        Args:
+            messages (list): The messages to send.
+            stream (bool): Whether to request a streamed response.
+            max_retries (int): The number of attempts before giving up.
+
+        Returns:
+            tuple: The completion (or an async stream of chunks) and the provider that answered.
+
+        Raises:
+            openai.OpenAIError: If every attempt fails.
+            CircuitOpenError: If every usable provider's circuit is open.
+        """
+        import openai
+
+        for attempt in range(max_retries):
+            try:
+                return await self._send_completion_async(messages, stream)
+            except (openai.OpenAIError, CircuitOpenError) as e:
+                logging.warning(f"API request failed ({attempt+1}/{max_retries}): {e}")
+                if attempt == max_retries - 1 or isinstance(e, CircuitOpenError):
+                    raise
+                if self.initializer.failover and self.circuit(self.ai_service).state != CLOSED:
+                    continue  # The next attempt goes to the backup provider
+                await asyncio.sleep(2 ** attempt)
+
+    def _async_client_for(self, ai_service):
+        """Returns the async client of the configured or the backup provider."""
+        if ai_service == self.ai_service:
+            return self.initializer.async_client
+        return self.initializer.async_backup_client
+
+    async def _send_to_async(self, ai_service, kwargs, checked=False):
+        """Async variant of `_send_to`."""
+        breaker = self.circuit(ai_service)
+        if not checked and not breaker.allow_request():
+            raise CircuitOpenError(ai_service, breaker.retry_in())
+        try:
+            response = await self._paced_create_async(
+                ai_service, self._async_client_for(ai_service), kwargs
+            )
+        except asyncio.CancelledError:
+            raise  # A lost hedge says nothing about the provider's health
+        except Exception as e:
+            breaker.record(e)
+            raise
+        breaker.record_success()
+        return response
+
+    async def _send_completion_async(self, messages, stream):
+        """
+        Sends one completion request to a healthy provider, hedged against the
+        backup provider if enabled (see `_send_completion`).
+
+        Args:
+            messages (list): The messages to send.
+            stream (bool): Whether to request a streamed response.
+
+        Returns:
+            tuple: The completion (or an async stream of chunks) and the provider that answered.
+        """
+        kwargs = self.completion_kwargs(messages, stream)
+        primary = self.circuit(self.ai_service)
+        if not primary.allow_request(as_probe=not self.initializer.failover):
+            if not self.initializer.failover:
+                raise CircuitOpenError(self.ai_service, primary.retry_in())
+            if primary.claim_probe():
+                self._start_probe(self.ai_service)
+            self.failovers += 1
+            backup = self.initializer.backup_service
+            return await self._send_to_async(backup, self._backup_kwargs(kwargs)), backup
+        if not self.hedger:
+            return await self._send_to_async(self.ai_service, kwargs, checked=True), self.ai_service
+
+        async def send(ai_service, request, checked=False):
+            response = await self._send_to_async(ai_service, request, checked)
+            if not stream:
+                return response
+            try:
+                # A stream has answered once its first content arrives
+                return await prefetch_stream_async(response)
+            except BaseException:
+                await close_stream(response)  # Also when the hedge lost and was cancelled
+                raise
+
+        response, from_backup = await self.hedger.run_async(
+            lambda: send(self.ai_service, kwargs, checked=True),
+            lambda: send(self.initializer.backup_service, self._backup_kwargs(kwargs)),
+            discard=close_response_async,
+        )
+        return response, self.initializer.backup_service if from_backup else self.ai_service
+
+    async def _paced_create_async(self, ai_service, client, kwargs):
+        """
+        Async variant of `_paced_create`: waits for the provider's rate limiter
+        without blocking the event loop.
+        """
+        limiter = self.initializer.rate_limiter(ai_service)
+        if limiter is None:
+            return await client.chat.completions.create(**kwargs)
+        import openai
+
+        estimate = self.estimate_request_tokens(kwargs)
+        reserved = await limiter.acquire_async(estimate)
+        try:
+            raw = await client.chat.completions.with_raw_response.create(**kwargs)
+        except openai.APIStatusError as e:
+            limiter.observe(e.response.headers)
+            limiter.settle(reserved, 0)  # Rejected requests use no tokens
+            raise
+        limiter.observe(raw.headers)
+        response = await raw.parse()
+        if kwargs.get("stream"):
+            return self._metered_stream_async(response, limiter, estimate, reserved, kwargs)
+        usage = getattr(response, "usage", None)
+        if getattr(usage, "total_tokens", None):
+            limiter.settle(reserved, usage.total_tokens)
+        return response
+
+    async def _metered_stream_async(self, stream, limiter, estimate, reserved, kwargs):
+        """Async variant of `_metered_stream`."""
+        pieces = []
+        usage = None
+        try:
+            async for chunk in stream:
+                usage = getattr(chunk, "usage", None) or usage
+                if chunk.choices:
+                    delta = chunk.choices[0].delta
+                    pieces.append(delta.content or "")
+                    for call in getattr(delta, "tool_calls", None) or ():
+                        pieces.append(getattr(call.function, "arguments", None) or "")
+                yield chunk
+        finally:
+            await stream.close()
+            used = getattr(usage, "total_tokens", None)
+            if not used:
+                counter = get_token_counter(self.ai_service, self.model)
+                used = estimate - kwargs.get("max_tokens", 0) + counter.count("".join(pieces))
+            limiter.settle(reserved, used)
+
+    async def _read_stream_async(self, stream, on_first_chunk=None):
+        """
+        Prints an async streamed completion as its chunks arrive and collects the full text.
+
+        Args:
+            stream: The async iterator returned by `chat.completions.create(stream=True)`.
+            on_first_chunk (callable): Coroutine function awaited once, when the
+                first content chunk arrives and before it is printed (it stops the spinner).
+
+        Returns:
+            tuple: The full response text, whether it was printed, and the native tool calls.
+        """
+        printer = StreamPrinter(hold_tool_json=not self.initializer.native_tools)
+        async for chunk in stream:
+            if on_first_chunk and printer.has_payload(chunk):
+                await on_first_chunk()
+                on_first_chunk = None
+            printer.feed_chunk(chunk)
+        return printer.finish()
+
+    async def send_message_to_ai_async(self, chat, user_input):
+        """
+        Sends a message to the AI model and returns the response.
+
+        Args:
+            chat: The chat session.
+            user_input (str): The user input to send.
+
+        Returns:
+            str: The AI model's response.
+        """
+        import httpx
+        import openai
+
+        messages = self.build_messages(user_input)
+        turn_start = time.perf_counter()
+        self.last_response_cacheable = False
+
+        # Identical requests are answered from the response cache
+        cache_key = self.response_cache_key(messages)
+        if cache_key:
+            cached = await asyncio.to_thread(self.response_cache.get, cache_key)
+            if cached is not None:
+                self.last_response_cacheable = True
+                print(cached)
+                self._record_turn_metrics(turn_start, [time.perf_counter()], False, cached=True)
+                return cached
+
+        stream = self.stream_responses
+        first_token_at = []
+        stop_event = asyncio.Event()
+        spinner = asyncio.create_task(async_loading_animation(stop_event))
+
+        async def stop_spinner():
+            # Awaited before anything is printed, so the spinner's line is cleared first
+            if not first_token_at:
+                first_token_at.append(time.perf_counter())
+            stop_event.set()
+            await spinner
+
+        async def read(response, on_first_chunk=None):
+            if stream:
+                return await self._read_stream_async(response, on_first_chunk)
+            if on_first_chunk:
+                await on_first_chunk()
+            return self._read_response(response, stream)
+
+        used_tools = False
+        try:
+            try:
+                response, answered_by = await self._create_completion_async(messages, stream)
+            except CircuitOpenError as e:
+                return f"Error calling AI API: {e}"
+            except openai.OpenAIError as e:
+                return f"Error calling AI API after 3 attempts: {e}"
+            try:
+                output, printed, native_calls = await read(response, stop_spinner)
+            except (openai.OpenAIError, httpx.HTTPError) as e:
+                # The connection can also fail after the request went through, mid-stream
+                self.circuit(answered_by).record(e)
+                return f"Error reading AI response: {e}"
+            await stop_spinner()  # Empty stream
+
+            # Run tool calls and hand their output back to the model, within the step budget
+            tool_calls = self.get_tool_calls(output, native_calls)
+            used_tools = bool(tool_calls)
+            rounds = 0
+            while tool_calls and rounds < self.initializer.max_tool_rounds:
+                rounds += 1
+                results = await asyncio.to_thread(
+                    run_tool_calls, tool_calls, self.initializer.tool_workers
+                )
+                self.append_tool_results(messages, output, tool_calls, results)
+                try:
+                    follow, follow_by = await self._create_completion_async(messages, stream)
+                except (openai.OpenAIError, CircuitOpenError) as e:
+                    return f"Error calling AI API after tool result: {e}"
+                try:
+                    output, printed, native_calls = await read(follow)
+                except (openai.OpenAIError, httpx.HTTPError) as e:
+                    self.circuit(follow_by).record(e)
+                    return f"Error reading AI response after tool result: {e}"
+                tool_calls = self.get_tool_calls(output, native_calls)
+            if tool_calls:
+                print(
+                    f"{Color.BRIGHTYELLOW}Stopped after {rounds} tool rounds (MaxToolRounds).{Color.ENDC}"
+                )
+        finally:
+            stop_event.set()
+            await spinner
+
+        if not printed:
+            print(output)
+        # The key names the configured provider; a backup's answer is not cached under it
+        if cache_key and not used_tools and answered_by == self.ai_service:
+            await asyncio.to_thread(self.response_cache.put, cache_key, output)
+        self.last_response_cacheable = not used_tools
+        self._record_turn_metrics(turn_start, first_token_at, stream)
+        return output
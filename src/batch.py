@@ -0,0 +1,263 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+from tool_runner import run_tool_calls
+
+# Usage fields summed over the requests of one item (tool rounds included)
+USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens")
+
+
+def parse_item(line, line_number):
+    """
+    Parses one line of batch input.
+
+    A line is either a JSON object with a `prompt` (and optionally an `id`,
+    a string or an integer; other fields are copied to the output) or a JSON
+    string. Items without an id are numbered by their line.
+
+    Args:
+        line (str): The input line.
+        line_number (int): The 1-based line number.
+
+    Returns:
+        dict: The item with `id` and `prompt`, or None for a blank line.
+
+    Raises:
+        ValueError: If the line is not a valid item.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    data = json.loads(line)
+    if isinstance(data, str):
+        data = {"prompt": data}
+    if not isinstance(data, dict) or not isinstance(data.get("prompt"), str):
+        raise ValueError("expected a JSON string or an object with a string 'prompt'")
+    data.setdefault("id", line_number)
+    if not _valid_id(data["id"]):
+        raise ValueError("'id' must be a string or an integer")
+    return data
+
+
+def _valid_id(item_id):
+    # Ids are kept in a set for resuming, so they must be hashable; True would equal line 1
+    return isinstance(item_id, (str, int)) and not isinstance(item_id, bool)
+
+
+def completed_ids(path):
+    """
+    Returns the ids already answered in an output file, for resuming.
+
+    Items that ended with an error are not counted, so a resumed run retries them.
+
+    Args:
+        path (str): The JSONL output file.
+
+    Returns:
+        set: The ids of successful results.
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # A line cut short by the interruption
+            if isinstance(record, dict) and "error" not in record and _valid_id(record.get("id")):
+                done.add(record["id"])
+    return done
+
+
+class BatchRunner:
+    """
+    Answers a stream of prompts concurrently through the asyncio engine.
+
+    Each item is an independent single-turn conversation with the configured
+    instruction, tools, caches and hedging. Results are written as JSONL as
+    soon as each item finishes, so their order follows completion, not input.
+    """
+
+    def __init__(self, chat, output, concurrency=4, skip_ids=()):
+        """
+        Args:
+            chat (AsyncAIChat): The engine providing clients, tools and caches.
+            output: Text stream the JSONL results are written to.
+            concurrency (int): Maximum number of items in flight.
+            skip_ids (set): Ids to skip (already answered in a previous run).
+        """
+        self.chat = chat
+        self.output = output
+        self.concurrency = max(1, concurrency)
+        self.skip_ids = set(skip_ids)
+        self.counts = {"ok": 0, "error": 0, "skipped": 0}
+
+    async def answer(self, prompt):
+        """
+        Answers one prompt, running tool rounds like the REPL but without printing.
+
+        Args:
+            prompt (str): The user prompt.
+
+        Returns:
+            tuple: The answer, summed token usage (dict), the model that
+                   answered and whether the answer came from the response cache.
+        """
+        chat = self.chat
+        messages = chat.build_messages(prompt)
+        cache_key = chat.response_cache_key(messages)
+        if cache_key:
+            cached = await asyncio.to_thread(chat.response_cache.get, cache_key)
+            if cached is not None:
+                return cached, {}, chat.model, True
+
+        usage = {}
+        model = chat.model
+        answered_by = chat.ai_service
+
+        async def complete():
+            nonlocal model, answered_by
+            response, answered_by = await chat._create_completion_async(messages, False)
+            model = getattr(response, "model", None) or model
+            reported = getattr(response, "usage", None)
+            for field in USAGE_FIELDS:
+                value = getattr(reported, field, None)
+                if value is not None:
+                    usage[field] = usage.get(field, 0) + value
+            output, _, native_calls = chat._read_response(response, False)
+            return output, chat.get_tool_calls(output, native_calls)
+
+        output, tool_calls = await complete()
+        used_tools = bool(tool_calls)
+        rounds = 0
+        while tool_calls and rounds < chat.initializer.max_tool_rounds:
+            rounds += 1
+            results = await asyncio.to_thread(
+                run_tool_calls, tool_calls, chat.initializer.tool_workers
+            )
+            chat.append_tool_results(messages, output, tool_calls, results)
+            output, tool_calls = await complete()
+        # The key names the configured provider; a backup's answer is not cached under it
+        if cache_key and not used_tools and answered_by == chat.ai_service:
+            await asyncio.to_thread(chat.response_cache.put, cache_key, output)
+        return output, usage, model, False
+
+    async def process(self, item):
+        """Answers one item and writes its result line."""
+        start = time.perf_counter()
+        record = dict(item)
+        try:
+            response, usage, model, cached = await self.answer(item["prompt"])
+            record.update(response=response, usage=usage, model=model, cached=cached)
+            self.counts["ok"] += 1
+        except Exception as e:
+            logging.error(f"Batch item {item['id']!r} failed: {e}")
+            record.update(error=str(e), model=self.chat.model)
+            self.counts["error"] += 1
+        record.update(provider=self.chat.ai_service, latency=round(time.perf_counter() - start, 3))
+        self.output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.output.flush()
+
+    async def run(self, source):
+        """
+        Processes every item of an input stream.
+
+        Input is read on a worker thread as it arrives, so piping into stdin
+        works and memory stays bounded however long the input is.
+
+        Args:
+            source: Text stream of JSONL items.
+
+        Returns:
+            dict: Counts of answered, failed and skipped items.
+        """
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                try:
+                    if item is None:
+                        return
+                    await self.process(item)
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            line_number = 0
+            while True:
+                line = await asyncio.to_thread(source.readline)
+                if not line:
+                    break
+                line_number += 1
+                try:
+                    item = parse_item(line, line_number)
+                except ValueError as e:  # json.JSONDecodeError included
+                    print(f"Skipping line {line_number}: {e}", file=sys.stderr)
+                    self.counts["error"] += 1
+                    continue
+                if item is None:
+                    continue
+                if item["id"] in self.skip_ids:
+                    self.counts["skipped"] += 1
+                    continue
+                await queue.put(item)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+        return self.counts
+
+
+def run_batch(input_path, output_path=None, concurrency=4, resume=False):
+    """
+    Runs batch mode: answers the prompts of a JSONL file (or stdin) and writes JSONL results.
+
+    Args:
+        input_path (str): The input file, or "-" for stdin.
+        output_path (str): The output file; None writes to stdout.
+        concurrency (int): Maximum number of prompts in flight.
+        resume (bool): Append to `output_path`, skipping items it already answered.
+
+    Returns:
+        int: The process exit status (0 if every item was answered).
+    """
+    from async_chat import AsyncAIChat
+
+    if resume and not output_path:
+        print("--resume needs --output: the finished items are read from it.", file=sys.stderr)
+        return 2
+    skip_ids = completed_ids(output_path) if resume else set()
+    if resume and os.path.exists(output_path) and os.path.getsize(output_path):
+        with open(output_path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")  # Terminate a line cut short by the interruption
+
+    chat = AsyncAIChat()
+    source = sys.stdin if input_path == "-" else open(input_path, "r", encoding="utf-8")
+    output = open(output_path, "a" if resume else "w", encoding="utf-8") if output_path else sys.stdout
+    try:
+        runner = BatchRunner(chat, output, concurrency, skip_ids)
+        counts = asyncio.run(runner.run(source))
+    except KeyboardInterrupt:
+        print("Interrupted; rerun with --resume to continue.", file=sys.stderr)
+        return 130
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+    print(
+        f"Batch finished: {counts['ok']} answered, {counts['error']} failed, "
+        f"{counts['skipped']} skipped",
+        file=sys.stderr,
+    )
+    return 1 if counts["error"] else 0
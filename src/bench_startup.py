@@ -0,0 +1,235 @@
+"""
+Startup benchmark for frea.
+
+Measures, in fresh interpreter processes:
+  * import time per module (`python -X importtime -c "import main"`), and
+  * time-to-first-prompt: from launching `python main.py` until the input
+    prompt is printed.
+
+Both run in a throwaway working directory with a dummy configuration, so the
+results do not depend on (or touch) your own config, logs or caches, and no
+API request is made. Run it from anywhere:
+
+    python src/bench_startup.py --runs 10
+    python src/bench_startup.py --max-ms 400   # exit with status 1 above 400 ms
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import selectors
+import statistics
+import subprocess
+import tempfile
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+PROMPT_MARKER = "╰─❯❯".encode("utf-8")
+
+DUMMY_CONFIG = """[DEFAULT]
+geminiapi = bench-dummy-key
+groqapi = bench-dummy-key
+aiservice = groq
+loadingstyle = L1
+instructionfile = ./config/instruction.txt
+aimodel = llama-3.3-70b-versatile
+"""
+
+
+def make_sandbox():
+    """
+    Creates a working directory with a dummy config, instruction file and logs folder.
+
+    Returns:
+        tempfile.TemporaryDirectory: The sandbox; its `name` is the path.
+    """
+    sandbox = tempfile.TemporaryDirectory(prefix="frea-bench-")
+    os.makedirs(os.path.join(sandbox.name, "config"))
+    os.makedirs(os.path.join(sandbox.name, "logs"))
+    with open(os.path.join(sandbox.name, "config", "config.ini"), "w") as f:
+        f.write(DUMMY_CONFIG)
+    with open(os.path.join(sandbox.name, "config", "instruction.txt"), "w") as f:
+        f.write("You are a helpful assistant.\n")
+    return sandbox
+
+
+def bench_env():
+    """Returns the environment for benchmark subprocesses."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = SRC_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    # Keep the configured dummy keys, not whatever the caller exported
+    env.pop("GEMINI_API_KEY", None)
+    env.pop("GROQ_API_KEY", None)
+    return env
+
+
+def parse_importtime(stderr):
+    """
+    Parses `-X importtime` output.
+
+    Args:
+        stderr (str): The interpreter's stderr.
+
+    Returns:
+        list: (module, self_us, cumulative_us, depth) tuples in import order.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            depth = (len(name) - len(name.lstrip())) // 2
+            rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+        except ValueError:
+            continue
+    return rows
+
+
+def measure_imports(sandbox):
+    """
+    Imports `main` in a fresh interpreter with `-X importtime`.
+
+    Args:
+        sandbox (str): The working directory.
+
+    Returns:
+        list: Parsed rows from `parse_importtime`.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=sandbox, env=bench_env(), capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"'import main' failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def measure_first_prompt(sandbox, timeout=30.0):
+    """
+    Starts `main.py` and times how long it takes to print the input prompt.
+
+    Args:
+        sandbox (str): The working directory.
+        timeout (float): Seconds to wait for the prompt.
+
+    Returns:
+        float: Time to first prompt in milliseconds.
+    """
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-u", os.path.join(SRC_DIR, "main.py")],
+        cwd=sandbox, env=bench_env(),
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    output = {proc.stdout: b"", proc.stderr: b""}
+    elapsed = None
+    with selectors.DefaultSelector() as selector:
+        selector.register(proc.stdout, selectors.EVENT_READ)
+        selector.register(proc.stderr, selectors.EVENT_READ)
+        # Until the prompt shows, or the child exits (both pipes closed)
+        while selector.get_map() and time.perf_counter() - start < timeout:
+            events = selector.select(timeout=0.5)
+            if not events and proc.poll() is not None:
+                break  # Exited, but something it started still holds the pipes
+            for key, _ in events:
+                chunk = os.read(key.fileobj.fileno(), 4096)
+                if not chunk:
+                    selector.unregister(key.fileobj)
+                    continue
+                output[key.fileobj] += chunk
+            if PROMPT_MARKER in output[proc.stdout]:
+                elapsed = (time.perf_counter() - start) * 1000
+                break
+    exited = proc.poll()
+    try:
+        proc.communicate(b"exit\n", timeout=5)
+    except (subprocess.TimeoutExpired, BrokenPipeError, ValueError):
+        proc.kill()
+        proc.wait()
+    if elapsed is None:
+        stdout = output[proc.stdout].decode("utf-8", "replace")[-2000:]
+        stderr = output[proc.stderr].decode("utf-8", "replace")[-4000:]
+        if exited is not None:
+            reason = f"main.py exited with status {exited} before the prompt"
+        else:
+            reason = f"No prompt within {timeout:.0f}s"
+        raise RuntimeError(f"{reason}. Output:\n{stdout}\nStderr:\n{stderr}")
+    return elapsed
+
+
+def summarize_imports(rows, top):
+    """
+    Picks the slowest imports.
+
+    Args:
+        rows (list): Parsed rows from `parse_importtime`.
+        top (int): How many modules to report.
+
+    Returns:
+        dict: Total import time and the `top` modules by cumulative time.
+    """
+    total = sum(cumulative for _, _, cumulative, depth in rows if depth == 0)
+    slowest = sorted(rows, key=lambda row: row[2], reverse=True)[:top]
+    return {
+        "total_ms": total / 1000,
+        "modules": [
+            {"module": name, "self_ms": self_us / 1000, "cumulative_ms": cumulative / 1000}
+            for name, self_us, cumulative, _ in slowest
+        ],
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark frea's startup time.")
+    parser.add_argument("--runs", type=int, default=5, help="Measured runs (default: 5)")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list (default: 15)")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    parser.add_argument(
+        "--max-ms", type=float, default=None,
+        help="Exit with status 1 if the median time-to-first-prompt exceeds this",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    sandbox = make_sandbox()
+    try:
+        # One untimed run compiles the bytecode, so every measured run is comparable
+        measure_first_prompt(sandbox.name)
+        imports = summarize_imports(measure_imports(sandbox.name), args.top)
+        timings = [measure_first_prompt(sandbox.name) for _ in range(max(1, args.runs))]
+    finally:
+        sandbox.cleanup()
+
+    result = {
+        "python": sys.version.split()[0],
+        "runs": len(timings),
+        "first_prompt_ms": {
+            "median": statistics.median(timings),
+            "min": min(timings),
+            "max": max(timings),
+        },
+        "imports": imports,
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"Import time of main: {imports['total_ms']:.1f} ms (slowest modules, cumulative)")
+        for module in imports["modules"]:
+            print(f"  {module['cumulative_ms']:8.1f} ms  {module['self_ms']:8.1f} ms self  {module['module']}")
+        first = result["first_prompt_ms"]
+        print(
+            f"Time to first prompt over {len(timings)} runs: median {first['median']:.1f} ms, "
+            f"min {first['min']:.1f} ms, max {first['max']:.1f} ms"
+        )
+
+    if args.max_ms is not None and result["first_prompt_ms"]["median"] > args.max_ms:
+        print(f"Startup regression: median above {args.max_ms:.0f} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
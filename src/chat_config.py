@@ -1,7 +1,6 @@
 import os
 import sys
 import configparser
-import google.generativeai as genai
 import subprocess
 from color import Color
 
@@ -18,11 +17,15 @@ class ChatConfig:
     SERVICE_COMMAND = "provider"
     RECONFIGURE_COMMAND = "recon"
     HELP_COMMAND = "help"
+    STATS_COMMAND = "stats"
+    INDEX_COMMAND = "index"
 
     # Configuration file paths
     CONFIG_FILE = "./config/config.ini"
     LOG_FOLDER = "logs"
     EXPORT_FOLDER = "exports"
+    CACHE_FOLDER = "cache"
+    SESSIONS_FOLDER = "sessions"
 
     # Default settings
     DEFAULT_LOADING_STYLE = "L1"
@@ -30,6 +33,49 @@ class ChatConfig:
     DEFAULT_GEMINI_MODEL = "gemini-1.5-flash"  # Default model for Gemini
     DEFAULT_GROQ_MODEL = "llama3-8b-8192"  # Default model for Groq
     DEFAULT_AI_SERVICE = "gemini"  # Default AI service
+    DEFAULT_STREAM_RESPONSES = True  # Print tokens as they arrive
+    DEFAULT_COMPACT_HISTORY = True  # Summarize old turns instead of dropping them
+    COMPACTION_MAX_TOKENS = 512  # Output limit for history summaries
+    DEFAULT_RESPONSE_CACHE = False  # Reuse responses to identical requests (opt-in)
+    DEFAULT_RESPONSE_CACHE_MAX_MB = 50
+    DEFAULT_RESPONSE_CACHE_TTL = 7 * 24 * 3600  # Seconds
+    DEFAULT_SIMILARITY_CACHE = False  # Reuse answers to near-identical prompts (opt-in)
+    DEFAULT_SIMILARITY_THRESHOLD = 0.9  # Minimum estimated Jaccard similarity
+    FRESH_FLAG = "-fresh"  # Per-turn flag that bypasses the response caches
+    DEFAULT_MAX_TOOL_ROUNDS = 5  # Tool call/response rounds allowed per turn
+    DEFAULT_TOOL_WORKERS = 4  # Read-only tools run concurrently on this many threads
+    DEFAULT_NATIVE_TOOLS = True  # Use the API's function calling instead of JSON-in-text
+    DEFAULT_HTTP_MAX_CONNECTIONS = 20  # Connection pool size per API endpoint
+    DEFAULT_HTTP_MAX_KEEPALIVE = 10  # Idle connections kept open per endpoint
+    DEFAULT_HTTP_KEEPALIVE_EXPIRY = 120.0  # Seconds an idle connection is kept
+    DEFAULT_HTTP2 = True  # Negotiate HTTP/2 where supported (needs the h2 package)
+    DEFAULT_MODEL_CATALOG_TTL = 24 * 3600  # Seconds before the cached model list is refreshed
+    DEFAULT_HEDGING = False  # Race slow requests against the other provider (opt-in)
+    DEFAULT_HEDGE_DELAY = "auto"  # Seconds before the backup request, or "auto" for the p90 latency
+    DEFAULT_BATCH_CONCURRENCY = 4  # Prompts answered at once in batch mode
+    DEFAULT_FAILOVER = True  # Use the other provider while the configured one is down
+    DEFAULT_CIRCUIT_FAILURES = 3  # Consecutive outages that open a provider's circuit
+    DEFAULT_CIRCUIT_COOLDOWN = 30.0  # Seconds before a failed provider is probed again
+    DEFAULT_RATE_LIMIT = True  # Pace requests per provider/key across all local processes
+    DEFAULT_RPM = 0  # Requests per minute; 0 learns the limit from response headers
+    DEFAULT_TPM = 0  # Tokens per minute; 0 learns the limit from response headers
+    DEFAULT_SEARCH_INDEX = False  # Keep a trigram index of the workspace for grep (opt-in)
+    DEFAULT_SEARCH_INDEX_MAX_MB = 200
+    DEFAULT_WIKI_CACHE = True  # Keep Wikipedia summaries on disk (cache/wikipedia.sqlite)
+    DEFAULT_WIKI_CACHE_TTL = 7 * 24 * 3600  # Seconds before a cached summary is fetched again
+    DEFAULT_WIKI_CACHE_MAX_MB = 20
+    DEFAULT_WIKI_BACKEND = "online"  # online, offline (a local dump) or auto (dump first)
+    DEFAULT_WIKI_DEADLINE = 2.0  # Seconds -wiki waits for its lookups; late ones are dropped
+    WIKI_MAX_QUERIES = 6  # Candidate queries -wiki looks up per prompt
+    DEFAULT_JOURNAL = True  # Write every message to sessions/<session>.jsonl as it is created
+    DEFAULT_RESUME_TURNS = 20  # Turns --resume loads from a session
+    DEFAULT_READ_LIMIT_KB = 256  # Larger files are paged (REPL) or read in ranges (tools)
+    DEFAULT_REVIEW_CHUNK_TOKENS = 6000  # Larger files sent for review are reviewed in chunks
+    DEFAULT_REVIEW_CONCURRENCY = 4  # Chunk reviews in flight at once
+    REVIEW_RESERVED_TOKENS = 512  # Room for the review instructions around file contents
+    DEFAULT_SEND_MAX_TOKENS = 32000  # Budget for the files one send packs into a request
+    DEFAULT_SEND_ORDER = "given"  # Which files send packs first: given, newest, smallest or name
+    HEDGE_INITIAL_DELAY = 2.0  # Delay used by "auto" until enough latencies are measured
 
     @staticmethod
     def initialize_config():
@@ -167,6 +213,8 @@ class ChatConfig:
             gemini_api_key (str): The Gemini API key.
         """
         if gemini_api_key:
+            import google.generativeai as genai  # Slow to import and only needed here
+
             genai.configure(api_key=gemini_api_key)
         else:
             ChatConfig._exit_with_error("Gemini API key is required.")
@@ -268,22 +316,27 @@ class ChatConfig:
   {Color.BRIGHTGREEN}{ChatConfig.SERVICE_COMMAND}{Color.ENDC}   Switch AI provider
   {Color.BRIGHTGREEN}{ChatConfig.MODEL_COMMAND}{Color.ENDC}     Switch AI model
   {Color.BRIGHTGREEN}{ChatConfig.RECONFIGURE_COMMAND}{Color.ENDC}  Reconfigure settings
+  {Color.BRIGHTGREEN}{ChatConfig.STATS_COMMAND}{Color.ENDC}     Show response timings
+  {Color.BRIGHTGREEN}{ChatConfig.INDEX_COMMAND} [update|clear]{Color.ENDC}  Search index status
 
 {Color.BRIGHTYELLOW}Shell Commands:{Color.ENDC}
   {Color.BRIGHTGREEN}run /<cmd>{Color.ENDC}     Execute shell command
-  {Color.BRIGHTGREEN}send <file_path>{Color.ENDC}        Send file for review
+  {Color.BRIGHTGREEN}send <file_path>{Color.ENDC}        Send file for review (large files in chunks)
+  {Color.BRIGHTGREEN}send <paths|folders|globs> [--order given|newest|smallest|name]{Color.ENDC}
+                          Send several files for review in one request
 
 {Color.BRIGHTYELLOW}AI Tools:{Color.ENDC}
-  {Color.BRIGHTGREEN}wiki <query>{Color.ENDC}      Wikipedia summary
+  {Color.BRIGHTGREEN}wiki <query>{Color.ENDC}      Wikipedia summary (several: wiki a | b | c)
   {Color.BRIGHTGREEN}calc <expression>{Color.ENDC}  Calculate expression
   {Color.BRIGHTGREEN}vim <file_path>{Color.ENDC}  Open file in Vim
 
 {Color.BRIGHTYELLOW}File Operations:{Color.ENDC}
   {Color.BRIGHTGREEN}ls [path]{Color.ENDC}          List directory contents
-  {Color.BRIGHTGREEN}cat <file_path>{Color.ENDC}    Display file content
+  {Color.BRIGHTGREEN}cat <file_path>{Color.ENDC}    Display file content (large files page by page)
   {Color.BRIGHTGREEN}head <file_path> [N]{Color.ENDC}  Show first N lines
-  {Color.BRIGHTGREEN}tail <file_path> [N]{Color.ENDC}  Show last N lines
-  {Color.BRIGHTGREEN}grep <pattern> [path]{Color.ENDC}  Search regex in files
+  {Color.BRIGHTGREEN}lines <file_path> <start> [N]{Color.ENDC}  Show N lines from line start
+  {Color.BRIGHTGREEN}tail [-f] <file_path> [N]{Color.ENDC}  Show last N lines (-f: follow, Ctrl+C stops)
+  {Color.BRIGHTGREEN}grep [-i] [-C N] [-m N] <pattern> [path]{Color.ENDC}  Search regex in files
   {Color.BRIGHTGREEN}write <file_path> <content>{Color.ENDC}  Overwrite file
   {Color.BRIGHTGREEN}append <file_path> <content>{Color.ENDC}  Append to file
   {Color.BRIGHTGREEN}delete <file_path>{Color.ENDC}       Delete file
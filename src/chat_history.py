@@ -0,0 +1,192 @@
+import threading
+from bisect import bisect_left
+
+
+class ChatHistory:
+    """
+    Conversation history with token counts cached per message.
+
+    Each message is counted once, when it is appended, and a running prefix
+    sum of the counts is kept. Choosing the newest messages that fit a token
+    budget then only advances a start pointer past the messages it drops,
+    instead of re-counting and copying the whole history every turn.
+    """
+
+    def __init__(self, counter, messages=None):
+        """
+        Args:
+            counter (TokenCounter): Counts the tokens of each message.
+            messages (list): Initial messages, if any.
+        """
+        self.counter = counter
+        self.messages = []
+        self._prefix = [0]  # _prefix[i] = tokens in messages[:i]
+        self._start = 0  # First message of the last window
+        self._lock = threading.Lock()
+        self.summary = ""  # Rolling summary of messages[:summarized_upto]
+        self.summarized_upto = 0
+        self.summary_tokens = 0
+        self.generation = 0  # Bumped on clear() so stale summaries are discarded
+        self.journal = None  # SessionJournal new messages are written to, if any
+        for message in messages or []:
+            self.append(message)
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def __getitem__(self, index):
+        return self.messages[index]
+
+    def append(self, message):
+        """Appends a message, caches its token count and writes it to the journal."""
+        self.messages.append(message)
+        self._prefix.append(self._prefix[-1] + self.counter.count_message(message))
+        if self.journal is not None:
+            self.journal.append(message)
+
+    def clear(self):
+        """Removes every message and the summary."""
+        with self._lock:
+            self.messages = []
+            self._prefix = [0]
+            self._start = 0
+            self.summary = ""
+            self.summarized_upto = 0
+            self.summary_tokens = 0
+            self.generation += 1
+
+    def copy(self):
+        """Returns the messages as a plain list."""
+        return list(self.messages)
+
+    def to_list(self):
+        """Returns the messages as a plain list (for saving)."""
+        return list(self.messages)
+
+    @property
+    def total_tokens(self):
+        """Tokens in the whole history."""
+        return self._prefix[-1]
+
+    def tokens_between(self, start, end):
+        """Tokens in messages[start:end]."""
+        return self._prefix[end] - self._prefix[start]
+
+    def set_counter(self, counter):
+        """
+        Switches to another provider/model's token counter and recounts the history.
+
+        Args:
+            counter (TokenCounter): The new token counter.
+        """
+        if counter is self.counter:
+            return
+        with self._lock:
+            self.counter = counter
+            self._prefix = [0]
+            for message in self.messages:
+                self._prefix.append(self._prefix[-1] + counter.count_message(message))
+            self._start = 0
+            self.summary_tokens = self._count_summary(self.summary)
+
+    def _count_summary(self, summary):
+        return self.counter.count_message({"content": summary}) if summary else 0
+
+    def summary_message(self):
+        """
+        Returns the rolling summary as a message for the head of the history.
+
+        Returns:
+            dict: The summary message, or None if nothing has been summarized.
+        """
+        if not self.summary:
+            return None
+        return {
+            "role": "system",
+            "content": f"Summary of the earlier conversation:\n{self.summary}",
+        }
+
+    def set_summary(self, summary, upto, generation):
+        """
+        Replaces the rolling summary, unless the history was cleared meanwhile.
+
+        Args:
+            summary (str): The summary of messages[:upto].
+            upto (int): The number of leading messages the summary covers.
+            generation (int): The `generation` the summary was computed for.
+
+        Returns:
+            bool: True if the summary was applied.
+        """
+        with self._lock:
+            if generation != self.generation or upto < self.summarized_upto:
+                return False
+            self.summary = summary
+            self.summarized_upto = upto
+            self.summary_tokens = self._count_summary(summary)
+            return True
+
+    def window_start(self, budget):
+        """
+        Finds the oldest message of the newest suffix that fits in `budget` tokens.
+
+        While the budget stays the same the start only moves forward, so the
+        cost is proportional to the number of messages dropped this turn.
+
+        Args:
+            budget (int): The token budget for the history.
+
+        Returns:
+            int: The index of the first message in the window.
+        """
+        end = len(self.messages)
+        total = self._prefix[end]
+        start = min(self._start, end)
+        if total - self._prefix[start] > budget:
+            # Drop the oldest messages until the rest fits
+            while start < end and total - self._prefix[start] > budget:
+                start += 1
+        elif start and total - self._prefix[start - 1] <= budget:
+            # The budget grew (e.g. after a model switch): find the new start
+            start = bisect_left(self._prefix, total - budget, 0, start)
+        self._start = start
+        return start
+
+    def window(self, budget):
+        """
+        Returns the newest messages that fit in `budget` tokens.
+
+        Messages already folded into the rolling summary are never repeated;
+        the summary message (see `summary_message`) stands in for them.
+
+        Args:
+            budget (int): The token budget for the history.
+
+        Returns:
+            list: The messages in the window, oldest first.
+        """
+        start = max(self.window_start(budget), self.summarized_upto)
+        return self.messages[start:]
+
+    def compaction_range(self, keep_tokens):
+        """
+        Returns the oldest unsummarized user/assistant pairs to fold into the
+        summary so that at most `keep_tokens` of raw history remain.
+
+        The newest pair is always kept verbatim.
+
+        Args:
+            keep_tokens (int): Raw history tokens to keep after compaction.
+
+        Returns:
+            tuple: (start, end) indexes into `messages`; nothing to fold when start == end.
+        """
+        start = end = self.summarized_upto
+        last_pair = len(self.messages) - len(self.messages) % 2 - 2
+        total = self._prefix[-1]
+        while end < last_pair and total - self._prefix[end] > keep_tokens:
+            end += 2  # Only fold complete pairs
+        return start, end
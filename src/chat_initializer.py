@@ -1,17 +1,20 @@
 import os
-import openai
+import hashlib
+import logging
+import transport
+import token_counter
+import wiki_client
 from chat_config import ChatConfig
-import wikipediaapi
-from functools import lru_cache
-import re
-
-# Import potential exceptions from openai library for more specific handling
-from openai import APIConnectionError, AuthenticationError, RateLimitError
+from model_catalog import ModelCatalog, model_entry
+from rate_limiter import RateLimiter, default_state_dir, state_path
 import warnings  # To warn if the configured model isn't available
 
 
 class ChatInitializer:
-    USER_AGENT = "frea/1.0 (azzarmrzs@gmail.com)"
+    BASE_URLS = {
+        "gemini": "https://generativelanguage.googleapis.com/v1beta/openai/",
+        "groq": "https://api.groq.com/openai/v1",
+    }
 
     def __init__(self):
         """
@@ -31,50 +34,174 @@ class ChatInitializer:
         self.loading_style = config["DEFAULT"]["LoadingStyle"]
         self.instruction_file = config["DEFAULT"]["InstructionFile"]
         self.instruction = ChatConfig.chat_instruction(self.instruction_file)
-
-        # Initialize the OpenAI client based on the AI service
-        self.client = None  # Initialize client to None first
-        try:
-            if self.ai_service == "gemini":
-                # Note: Using the OpenAI SDK with Google's endpoint.
-                # Model listing (`client.models.list()`) compatibility depends on Google's implementation.
-                # If this fails, using the native 'google-generativeai' SDK might be necessary for model listing.
-                self.client = openai.OpenAI(
-                    api_key=self.gemini_api_key,
-                    # The base URL provided in the original code. Double-check if this is the correct one
-                    # for OpenAI SDK compatibility, especially for model listing.
-                    # Sometimes it might just be "https://generativelanguage.googleapis.com/v1beta"
-                    base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
-                )
-            elif self.ai_service == "groq":
-                self.client = openai.OpenAI(
-                    api_key=self.groq_api_key, base_url="https://api.groq.com/openai/v1"
-                )
-            else:
-                # Keep the original ValueError for unsupported service
-                raise ValueError(f"Unsupported AI service: {self.ai_service}")
-
-            # Assign the configured model name to the instance variable 'model'
-            self.model = self.configured_model
-
-        # Catch specific API errors during initialization if possible
-        except AuthenticationError as e:
-            print(
-                f"Authentication Error initializing API client for {self.ai_service}: {e}. Check API Key."
+        self.stream_responses = config["DEFAULT"].getboolean(
+            "StreamResponses", fallback=ChatConfig.DEFAULT_STREAM_RESPONSES
+        )
+        self.compact_history = config["DEFAULT"].getboolean(
+            "CompactHistory", fallback=ChatConfig.DEFAULT_COMPACT_HISTORY
+        )
+        self.response_cache = config["DEFAULT"].getboolean(
+            "ResponseCache", fallback=ChatConfig.DEFAULT_RESPONSE_CACHE
+        )
+        self.response_cache_max_mb = config["DEFAULT"].getfloat(
+            "ResponseCacheMaxMB", fallback=ChatConfig.DEFAULT_RESPONSE_CACHE_MAX_MB
+        )
+        self.response_cache_ttl = config["DEFAULT"].getfloat(
+            "ResponseCacheTTL", fallback=ChatConfig.DEFAULT_RESPONSE_CACHE_TTL
+        )
+        self.similarity_cache = config["DEFAULT"].getboolean(
+            "SimilarityCache", fallback=ChatConfig.DEFAULT_SIMILARITY_CACHE
+        )
+        self.similarity_threshold = config["DEFAULT"].getfloat(
+            "SimilarityThreshold", fallback=ChatConfig.DEFAULT_SIMILARITY_THRESHOLD
+        )
+        self.max_tool_rounds = config["DEFAULT"].getint(
+            "MaxToolRounds", fallback=ChatConfig.DEFAULT_MAX_TOOL_ROUNDS
+        )
+        self.native_tools = config["DEFAULT"].getboolean(
+            "NativeTools", fallback=ChatConfig.DEFAULT_NATIVE_TOOLS
+        )
+        self.tool_workers = max(
+            1, config["DEFAULT"].getint("ToolWorkers", fallback=ChatConfig.DEFAULT_TOOL_WORKERS)
+        )
+        self.http_options = {
+            "max_connections": config["DEFAULT"].getint(
+                "HttpMaxConnections", fallback=ChatConfig.DEFAULT_HTTP_MAX_CONNECTIONS
+            ),
+            "max_keepalive": config["DEFAULT"].getint(
+                "HttpMaxKeepalive", fallback=ChatConfig.DEFAULT_HTTP_MAX_KEEPALIVE
+            ),
+            "keepalive_expiry": config["DEFAULT"].getfloat(
+                "HttpKeepaliveExpiry", fallback=ChatConfig.DEFAULT_HTTP_KEEPALIVE_EXPIRY
+            ),
+            "http2": config["DEFAULT"].getboolean("HTTP2", fallback=ChatConfig.DEFAULT_HTTP2),
+        }
+        self.rate_limit = config["DEFAULT"].getboolean(
+            "RateLimit", fallback=ChatConfig.DEFAULT_RATE_LIMIT
+        )
+        self.rate_limit_dir = config["DEFAULT"].get("RateLimitDir", fallback="") or default_state_dir()
+        self.rate_limits = {
+            service: (
+                config["DEFAULT"].getint(f"{service.capitalize()}RPM", fallback=ChatConfig.DEFAULT_RPM),
+                config["DEFAULT"].getint(f"{service.capitalize()}TPM", fallback=ChatConfig.DEFAULT_TPM),
             )
-            raise ConnectionError(f"Authentication failed for {self.ai_service}") from e
-        except APIConnectionError as e:
+            for service in self.BASE_URLS
+        }
+        self._rate_limiters = {}
+        # Hedging and failover send requests to the other provider, so they need both keys
+        self.backup_service = "groq" if self.ai_service == "gemini" else "gemini"
+        default_backup_model = (
+            ChatConfig.DEFAULT_GROQ_MODEL
+            if self.backup_service == "groq"
+            else ChatConfig.DEFAULT_GEMINI_MODEL
+        )
+        self.backup_model = config["DEFAULT"].get(
+            "BackupModel",
+            fallback=config["DEFAULT"].get("HedgeModel", fallback=default_backup_model),
+        )
+        has_backup_key = bool(self.service_api_key(self.backup_service))
+        hedge_delay = config["DEFAULT"].get("HedgeDelay", fallback=ChatConfig.DEFAULT_HEDGE_DELAY)
+        self.hedge_delay = None if hedge_delay.strip().lower() == "auto" else float(hedge_delay)
+        self.hedging = config["DEFAULT"].getboolean("Hedging", fallback=ChatConfig.DEFAULT_HEDGING)
+        if self.hedging and not has_backup_key:
             print(
-                f"Connection Error initializing API client for {self.ai_service}: {e}. Check API endpoint and network."
+                f"Warning: Hedging needs an API key for {self.backup_service}; hedging is disabled."
             )
-            raise ConnectionError(f"Could not connect to {self.ai_service} API") from e
-        except Exception as e:
-            # Catch any other unexpected error during initialization
+            self.hedging = False
+        self.failover = has_backup_key and config["DEFAULT"].getboolean(
+            "Failover", fallback=ChatConfig.DEFAULT_FAILOVER
+        )
+        self.circuit_failures = config["DEFAULT"].getint(
+            "CircuitFailures", fallback=ChatConfig.DEFAULT_CIRCUIT_FAILURES
+        )
+        self.circuit_cooldown = config["DEFAULT"].getfloat(
+            "CircuitCooldown", fallback=ChatConfig.DEFAULT_CIRCUIT_COOLDOWN
+        )
+        self.search_index = config["DEFAULT"].getboolean(
+            "SearchIndex", fallback=ChatConfig.DEFAULT_SEARCH_INDEX
+        )
+        self.search_index_root = os.path.abspath(
+            config["DEFAULT"].get("SearchIndexRoot", fallback="") or os.getcwd()
+        )
+        self.search_index_max_mb = config["DEFAULT"].getfloat(
+            "SearchIndexMaxMB", fallback=ChatConfig.DEFAULT_SEARCH_INDEX_MAX_MB
+        )
+        wiki_backend = config["DEFAULT"].get("WikiBackend", fallback=ChatConfig.DEFAULT_WIKI_BACKEND).lower()
+        if wiki_backend not in wiki_client.BACKENDS:
+            logging.warning(f"Unknown WikiBackend {wiki_backend!r}; using online")
+            wiki_backend = "online"
+        wiki_dump = os.path.expanduser(config["DEFAULT"].get("WikiDump", fallback=""))
+        wiki_dump_index = os.path.expanduser(config["DEFAULT"].get("WikiDumpIndex", fallback=""))
+        # One title index per dump, named after its path
+        dump_digest = hashlib.sha256(os.path.abspath(wiki_dump).encode("utf-8")).hexdigest()[:12]
+        wiki_client.configure(
+            os.path.join(ChatConfig.CACHE_FOLDER, "wikipedia.sqlite")
+            if config["DEFAULT"].getboolean("WikiCache", fallback=ChatConfig.DEFAULT_WIKI_CACHE)
+            else None,
+            config["DEFAULT"].getfloat("WikiCacheTTL", fallback=ChatConfig.DEFAULT_WIKI_CACHE_TTL),
+            int(
+                config["DEFAULT"].getfloat(
+                    "WikiCacheMaxMB", fallback=ChatConfig.DEFAULT_WIKI_CACHE_MAX_MB
+                )
+                * 1024
+                * 1024
+            ),
+            wiki_backend,
+            (
+                wiki_dump,
+                wiki_dump_index or None,
+                os.path.join(ChatConfig.CACHE_FOLDER, f"wiki_offline_{dump_digest}.sqlite"),
+            )
+            if wiki_dump
+            else None,
+        )
+        self.wiki_deadline = config["DEFAULT"].getfloat(
+            "WikiDeadline", fallback=ChatConfig.DEFAULT_WIKI_DEADLINE
+        )
+        self.journal = config["DEFAULT"].getboolean("Journal", fallback=ChatConfig.DEFAULT_JOURNAL)
+        self.resume_turns = config["DEFAULT"].getint(
+            "ResumeTurns", fallback=ChatConfig.DEFAULT_RESUME_TURNS
+        )
+        self.read_limit_kb = config["DEFAULT"].getfloat(
+            "ReadLimitKB", fallback=ChatConfig.DEFAULT_READ_LIMIT_KB
+        )
+        self.review_chunk_tokens = config["DEFAULT"].getint(
+            "ReviewChunkTokens", fallback=ChatConfig.DEFAULT_REVIEW_CHUNK_TOKENS
+        )
+        self.send_max_tokens = config["DEFAULT"].getint(
+            "SendMaxTokens", fallback=ChatConfig.DEFAULT_SEND_MAX_TOKENS
+        )
+        self.send_order = config["DEFAULT"].get("SendOrder", fallback=ChatConfig.DEFAULT_SEND_ORDER)
+        self.review_concurrency = max(
+            1,
+            config["DEFAULT"].getint(
+                "ReviewConcurrency", fallback=ChatConfig.DEFAULT_REVIEW_CONCURRENCY
+            ),
+        )
+        self.model_catalog = ModelCatalog(
+            os.path.join(ChatConfig.CACHE_FOLDER, f"models_{self.ai_service}.json"),
+            self._fetch_model_entries,
+            ttl=config["DEFAULT"].getfloat(
+                "ModelCatalogTTL", fallback=ChatConfig.DEFAULT_MODEL_CATALOG_TTL
+            ),
+        )
+
+        # The OpenAI client is created on first use (see `client`), so starting
+        # frea does not wait for the SDK to import
+        self._client = None
+        self._async_client = None  # Created on first use by the asyncio engine
+        self._backup_client = None
+        self._async_backup_client = None
+        if self.ai_service not in self.BASE_URLS:
+            # Keep the original error for unsupported service
             print(
-                f"An unexpected error occurred during client initialization for {self.ai_service}: {e}"
+                f"An unexpected error occurred during client initialization for {self.ai_service}: "
+                f"Unsupported AI service: {self.ai_service}"
             )
-            # Decide if you want to raise here or handle differently (e.g., allow running without a client)
-            raise RuntimeError(f"Failed to initialize AI client: {e}") from e
+            raise RuntimeError(f"Failed to initialize AI client: Unsupported AI service: {self.ai_service}")
+
+        # Assign the configured model name to the instance variable 'model'
+        self.model = self.configured_model
 
         # Optional: Verify the configured model exists upon initialization
         # available_models = self.get_models() # Fetch models right away
@@ -84,6 +211,163 @@ class ChatInitializer:
         #          f"Available: {available_models}. Using configured model anyway."
         #      )
 
+    @property
+    def client(self):
+        """
+        The `openai.OpenAI` client for the configured AI service, created on first use.
+        """
+        if self._client is None:
+            import openai
+
+            try:
+                self._client = self.create_client(self.ai_service)
+            # Catch specific API errors during initialization if possible
+            except openai.AuthenticationError as e:
+                print(
+                    f"Authentication Error initializing API client for {self.ai_service}: {e}. Check API Key."
+                )
+                raise ConnectionError(f"Authentication failed for {self.ai_service}") from e
+            except openai.APIConnectionError as e:
+                print(
+                    f"Connection Error initializing API client for {self.ai_service}: {e}. Check API endpoint and network."
+                )
+                raise ConnectionError(f"Could not connect to {self.ai_service} API") from e
+            except Exception as e:
+                # Catch any other unexpected error during initialization
+                print(
+                    f"An unexpected error occurred during client initialization for {self.ai_service}: {e}"
+                )
+                raise RuntimeError(f"Failed to initialize AI client: {e}") from e
+        return self._client
+
+    def warm_up(self):
+        """
+        Imports the API SDK and opens a connection to the endpoint ahead of the
+        first request. Meant to run on a background thread at startup; failures
+        are only logged, since the first real request reports them properly.
+        """
+        try:
+            import openai  # noqa: F401
+
+            services = [self.ai_service] + ([self.backup_service] if self.hedging else [])
+            for service in services:
+                base_url = self.BASE_URLS[service]
+                transport.prewarm(transport.get_http_client(base_url, **self.http_options), base_url)
+        except Exception as e:
+            logging.debug(f"Startup warm-up failed: {e}")
+
+    @property
+    def api_key(self):
+        """The API key for the configured AI service."""
+        return self.service_api_key(self.ai_service)
+
+    def service_api_key(self, ai_service):
+        """
+        Returns the API key for an AI service.
+
+        Args:
+            ai_service (str): "gemini" or "groq".
+
+        Returns:
+            str: The key (possibly empty).
+        """
+        return self.gemini_api_key if ai_service == "gemini" else self.groq_api_key
+
+    def rate_limiter(self, ai_service):
+        """
+        Returns the request pacer shared by every frea process using this provider and key.
+
+        Args:
+            ai_service (str): "gemini" or "groq".
+
+        Returns:
+            RateLimiter: The limiter, or None if rate limiting is off or unavailable.
+        """
+        if not self.rate_limit:
+            return None
+        if ai_service not in self._rate_limiters:
+            rpm, tpm = self.rate_limits[ai_service]
+            try:
+                limiter = RateLimiter(
+                    state_path(self.rate_limit_dir, ai_service, self.service_api_key(ai_service)),
+                    rpm=rpm,
+                    tpm=tpm,
+                    shared_dir=self.rate_limit_dir == default_state_dir(),
+                )
+            except OSError as e:
+                logging.warning(f"Rate limiting disabled for {ai_service}: {e}")
+                limiter = None
+            self._rate_limiters[ai_service] = limiter
+        return self._rate_limiters[ai_service]
+
+    @property
+    def backup_client(self):
+        """
+        The `openai.OpenAI` client for the backup provider (hedging and failover), created on first use.
+        """
+        if self._backup_client is None:
+            self._backup_client = self.create_client(self.backup_service)
+        return self._backup_client
+
+    def create_client(self, ai_service):
+        """
+        Creates an OpenAI-compatible client for an AI service on the shared,
+        pooled HTTP transport.
+
+        Args:
+            ai_service (str): "gemini" or "groq".
+
+        Returns:
+            openai.OpenAI: The client.
+        """
+        # Gemini is reached through Google's OpenAI-compatible endpoint.
+        # Model listing (`client.models.list()`) compatibility depends on Google's implementation.
+        base_url = self.BASE_URLS[ai_service]
+        api_key = self.gemini_api_key if ai_service == "gemini" else self.groq_api_key
+        import openai
+
+        http_client = transport.get_http_client(base_url, **self.http_options)
+        transport.prewarm(http_client, base_url)
+        return openai.OpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+
+    def create_async_client(self, ai_service):
+        """
+        Creates an `openai.AsyncOpenAI` client for an AI service on the shared,
+        pooled async HTTP transport.
+
+        Args:
+            ai_service (str): "gemini" or "groq".
+
+        Returns:
+            openai.AsyncOpenAI: The client.
+        """
+        import openai
+
+        base_url = self.BASE_URLS[ai_service]
+        return openai.AsyncOpenAI(
+            api_key=self.service_api_key(ai_service),
+            base_url=base_url,
+            http_client=transport.get_async_http_client(base_url, **self.http_options),
+        )
+
+    @property
+    def async_client(self):
+        """
+        An `openai.AsyncOpenAI` client for the configured AI service, created on first use.
+        """
+        if self._async_client is None:
+            self._async_client = self.create_async_client(self.ai_service)
+        return self._async_client
+
+    @property
+    def async_backup_client(self):
+        """
+        An `openai.AsyncOpenAI` client for the backup provider, created on first use.
+        """
+        if self._async_backup_client is None:
+            self._async_backup_client = self.create_async_client(self.backup_service)
+        return self._async_backup_client
+
     def initialize_chat(self, chat_history):
         """
         Initializes the chat session with the specified chat history.
@@ -101,9 +385,28 @@ class ChatInitializer:
         # return [initial_prompt] + chat_history if chat_history else [initial_prompt]
         return chat_history
 
-    def get_models(self):
+    def _fetch_model_entries(self):
         """
-        Retrieves available models dynamically from the configured AI service API.
+        Lists the models of the configured AI service from its API.
+
+        Returns:
+            list: Catalogue entries (id plus any reported metadata).
+        """
+        # The response is typically an iterable (like openai.pagination.SyncPage)
+        # containing model objects, each having an 'id' attribute.
+        models_response = self.client.models.list()
+        return [model_entry(model) for model in models_response if hasattr(model, "id")]
+
+    def get_models(self, refresh=False):
+        """
+        Retrieves the available models of the configured AI service.
+
+        The list is served from the on-disk model catalogue and refreshed in
+        the background once it is older than its TTL; the API is only waited
+        on when there is no catalogue yet or `refresh` is set.
+
+        Args:
+            refresh (bool): Fetch the list from the API now.
 
         Returns:
             list: A sorted list of available model names (strings),
@@ -113,31 +416,26 @@ class ChatInitializer:
             print("Warning: AI client is not initialized. Cannot fetch models.")
             return []
 
-        try:
-            # Use the standard OpenAI client method to list models
-            models_response = self.client.models.list()
-
-            # The response is typically an iterable (like openai.pagination.SyncPage)
-            # containing model objects, each having an 'id' attribute.
-            model_ids = [model.id for model in models_response if hasattr(model, "id")]
+        import openai
 
-            # Filter specific model types if necessary (example for Gemini if needed)
-            # if self.ai_service == "gemini":
-            #    model_ids = [m for m in model_ids if m.startswith('gemini-')] # Or other filtering logic
-
-            return sorted(model_ids)  # Return sorted list for consistency
+        try:
+            if refresh:
+                entries = self.model_catalog.refresh()
+            else:
+                entries = self.model_catalog.entries()
+            return sorted(entry["id"] for entry in entries)  # Return sorted list for consistency
 
-        except AuthenticationError:
+        except openai.AuthenticationError:
             print(
                 f"Authentication Error: Failed to fetch models for {self.ai_service}. Check your API key."
             )
             return []
-        except APIConnectionError:
+        except openai.APIConnectionError:
             print(
                 f"Connection Error: Could not connect to {self.ai_service} API to fetch models."
             )
             return []
-        except RateLimitError:
+        except openai.RateLimitError:
             print(
                 f"Rate Limit Error: Exceeded API rate limit for {self.ai_service} when fetching models."
             )
@@ -148,25 +446,108 @@ class ChatInitializer:
             # Returning an empty list signifies failure to retrieve models
             return []
 
-    @lru_cache(maxsize=32)
+    def model_info(self, model=None):
+        """
+        Returns the catalogued metadata of a model, without contacting the API.
+
+        Args:
+            model (str): The model name; defaults to the configured model.
+
+        Returns:
+            dict: The catalogue entry, or an empty dict if unknown.
+        """
+        return self.model_catalog.get(model or self.model) or {}
+
+    def context_window(self, model=None):
+        """
+        Returns a model's context window: the provider-reported value from the
+        model catalogue if known, otherwise the built-in table.
+
+        Args:
+            model (str): The model name; defaults to the configured model.
+
+        Returns:
+            int: The context window in tokens.
+        """
+        model = model or self.model
+        return self.model_info(model).get("context_window") or token_counter.context_window(model)
+
     def query_wikipedia(self, query, sentences=3):
         """
-        Queries Wikipedia for additional information.
+        Queries Wikipedia for additional information, through the shared
+        cached client (see wiki_client).
 
         Args:
             query (str): The query to search for on Wikipedia.
             sentences (int): Number of sentences to return in the summary.
 
         Returns:
-            str: A concise summary limited to `sentences`, or None if page not found.
+            str: A concise summary limited to `sentences`, or None if page not found
+                 or Wikipedia cannot be reached.
+        """
+        try:
+            found = wiki_client.get_client().summary(query, sentences)
+        except Exception as e:
+            logging.warning(f"Wikipedia lookup of {query!r} failed: {e}")
+            return None
+        if found is None:
+            return None
+        result, url = found
+        return f"{result}\n\nRead more: {url}"
+
+    def query_wikipedia_many(self, queries, sentences=3):
+        """
+        Queries Wikipedia for several candidate queries at once; lookups
+        slower than `wiki_deadline` are dropped (see wiki_client.lookup_many).
+
+        Args:
+            queries (list): The queries, most likely first.
+            sentences (int): Number of sentences of each summary.
+
+        Returns:
+            str: The summaries found, in the order of `queries`, or None if none was.
         """
-        wiki_wiki = wikipediaapi.Wikipedia(language="en", user_agent=self.USER_AGENT)
-        page = wiki_wiki.page(query)
-        if not page.exists():
+        try:
+            found = wiki_client.lookup_many(queries, sentences, timeout=self.wiki_deadline)
+        except Exception as e:
+            logging.warning(f"Wikipedia lookups failed: {e}")
             return None
-        summary = page.summary or ""
-        # Split into sentences and limit
-        sentences_list = re.split(r'(?<=[\.!?]) +', summary)
-        selected = sentences_list[:sentences]
-        result = " ".join(selected).strip()
-        return f"{result}\n\nRead more: {page.fullurl}"
+        parts = []
+        urls = set()
+        for query in queries:
+            if not found.get(query) or found[query][1] in urls:
+                continue  # No page, late, or the same page as an earlier query
+            text, url = found[query]
+            urls.add(url)
+            parts.append(f"{text}\nRead more: {url}")
+        return "\n\n".join(parts) or None
+
+    async def query_wikipedia_many_async(self, queries, sentences=3):
+        """
+        Async variant of `query_wikipedia_many`; the lookups run in worker threads.
+
+        Args:
+            queries (list): The queries, most likely first.
+            sentences (int): Number of sentences of each summary.
+
+        Returns:
+            str: The summaries found, or None if none was.
+        """
+        import asyncio
+
+        return await asyncio.to_thread(self.query_wikipedia_many, queries, sentences)
+
+    async def query_wikipedia_async(self, query, sentences=3):
+        """
+        Async variant of `query_wikipedia`; the lookup runs in a worker thread.
+
+        Args:
+            query (str): The query to search for on Wikipedia.
+            sentences (int): Number of sentences to return in the summary.
+
+        Returns:
+            str: A concise summary limited to `sentences`, or None if page not found.
+        """
+        import asyncio
+
+        return await asyncio.to_thread(self.query_wikipedia, query, sentences)
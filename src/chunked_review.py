@@ -0,0 +1,228 @@
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from color import Color
+
+# Indentation depths told apart when choosing where to cut (shallower is better)
+INDENT_LEVELS = 32
+
+CHUNK_PROMPT = (
+    "This is part {part} of {parts} (lines {first}-{last}) of the file {filename}. "
+    "Review this part: point out bugs, risks, unclear code and possible improvements, "
+    "citing line numbers. Only this part is shown, so do not guess about code outside it.\n\n"
+    "```\n{text}\n```"
+)
+COMBINE_PROMPT = (
+    "These are reviews of consecutive parts of the file {filename}. Merge them into one "
+    "review of lines {first}-{last}: keep every distinct finding with its line numbers "
+    "and drop duplicates.\n\n{reviews}"
+)
+REDUCE_PROMPT = (
+    "Please review the following file: {filename}\n\n"
+    "It is too large for one request, so its {parts} parts were reviewed separately. "
+    "Merge these partial reviews into one review of the whole file: remove duplicates, "
+    "order the findings by importance and keep their line numbers.\n\n{reviews}"
+)
+
+
+def split_chunks(text, max_tokens, count):
+    """
+    Splits text into chunks of at most `max_tokens`, cutting at structural
+    boundaries where possible.
+
+    A full chunk is cut within its last half (by tokens) before the line
+    that follows a blank line with the least indentation, i.e. at the start
+    of the outermost block (function, class, section...) found there, else
+    at its end. A single line longer than `max_tokens` is split by characters.
+
+    Args:
+        text (str): The text to split.
+        max_tokens (int): The token budget per chunk.
+        count (callable): Counts the tokens of a string.
+
+    Returns:
+        list: (first line, last line, text) tuples; line numbers are 1-based.
+    """
+    pieces = []  # (line number, text, tokens)
+    for number, line in enumerate(text.splitlines(keepends=True), 1):
+        tokens = count(line)
+        if tokens <= max_tokens:
+            pieces.append((number, line, tokens))
+            continue
+        step = max(1, len(line) * max_tokens // tokens)
+        for start in range(0, len(line), step):
+            part = line[start:start + step]
+            pieces.append((number, part, count(part)))
+
+    def boundary(i):
+        """Scores a cut before piece i; 0 if it is not after a blank line."""
+        if i == 0 or pieces[i][0] == pieces[i - 1][0] or pieces[i - 1][1].strip():
+            return 0
+        line = pieces[i][1]
+        code = line.lstrip()
+        if not code or code[0] in ")]}":
+            return 1  # Blank, or closing a block
+        return 2 + max(0, INDENT_LEVELS - (len(line) - len(code)))
+
+    chunks = []
+    start = 0
+    tokens = 0
+    for i, (_, _, line_tokens) in enumerate(pieces):
+        if tokens + line_tokens > max_tokens and i > start:
+            cut, best, tail = i, 0, 0
+            for j in range(i - 1, start, -1):
+                tail += pieces[j][2]
+                if tail > max_tokens // 2:
+                    break
+                level = boundary(j)
+                if level > best:
+                    cut, best = j, level
+                if best == 2 + INDENT_LEVELS:
+                    break  # Column 0; nothing better to find
+            chunks.append(pieces[start:cut])
+            start = cut
+            tokens = sum(piece[2] for piece in pieces[cut:i])
+            if tokens + line_tokens > max_tokens and start < i:
+                chunks.append(pieces[start:i])
+                start, tokens = i, 0
+        tokens += line_tokens
+    if start < len(pieces):
+        chunks.append(pieces[start:])
+    return [
+        (chunk[0][0], chunk[-1][0], "".join(piece[1] for piece in chunk)) for chunk in chunks
+    ]
+
+
+class ChunkedReview:
+    """
+    Reviews a file too large for one request by map-reduce.
+
+    The file is split into chunks (see `split_chunks`), each chunk is
+    reviewed by its own request, `concurrency` at a time, and the partial
+    reviews are merged into one prompt for the final (reduce) request. If
+    the partial reviews are themselves too long, neighbouring ones are merged
+    first, level by level, until they fit.
+    """
+
+    def __init__(self, complete, count, max_tokens, concurrency=4):
+        """
+        Args:
+            complete (callable): `complete(prompt) -> str`; sends one request.
+            count (callable): Counts the tokens of a string.
+            max_tokens (int): The token budget for a chunk or a merge request.
+            concurrency (int): Requests in flight at once.
+        """
+        self.complete = complete
+        self.count = count
+        self.max_tokens = max_tokens
+        self.concurrency = max(1, concurrency)
+
+    def _run_all(self, prompts, label):
+        """
+        Sends prompts concurrently, printing progress as each one finishes.
+
+        Args:
+            prompts (list): (first line, last line, prompt) tuples.
+            label (str): What a request does, for the progress lines.
+
+        Returns:
+            list: The replies, in the order of `prompts`; None where a request failed.
+        """
+        replies = [None] * len(prompts)
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="frea-review")
+        try:
+            started = time.monotonic()
+            futures = {
+                executor.submit(self.complete, prompt): i for i, (_, _, prompt) in enumerate(prompts)
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                i = futures[future]
+                first, last, _ = prompts[i]
+                try:
+                    replies[i] = future.result()
+                    status = f"{label} in {time.monotonic() - started:.1f}s"
+                except Exception as e:
+                    logging.warning(f"Review of lines {first}-{last} failed: {e}")
+                    status = f"{Color.BRIGHTRED}failed: {e}{Color.ENDC}"
+                print(
+                    f"{Color.LIGHTBLUE}  [{done}/{len(prompts)}] lines {first}-{last}{Color.ENDC} {status}",
+                    flush=True,
+                )
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return replies
+
+    def run(self, filename, content):
+        """
+        Reviews the chunks of a file and returns the prompt for the reduce request.
+
+        Args:
+            filename (str): The file name, as given by the user.
+            content (str): The file content.
+
+        Returns:
+            str: The prompt merging the partial reviews.
+
+        Raises:
+            RuntimeError: If no chunk could be reviewed.
+        """
+        chunks = split_chunks(content, self.max_tokens, self.count)
+        print(
+            f"{Color.BRIGHTYELLOW}Reviewing {filename} in {len(chunks)} parts "
+            f"({self.concurrency} at a time)...{Color.ENDC}"
+        )
+        replies = self._run_all(
+            [
+                (first, last, CHUNK_PROMPT.format(
+                    part=part, parts=len(chunks), first=first, last=last, filename=filename, text=text
+                ))
+                for part, (first, last, text) in enumerate(chunks, 1)
+            ],
+            "reviewed",
+        )
+        if not any(replies):
+            raise RuntimeError("no part of the file could be reviewed")
+        reviews = [
+            (first, last, reply or "(This part could not be reviewed.)")
+            for (first, last, _), reply in zip(chunks, replies)
+        ]
+
+        # Merge neighbouring reviews until they fit in one request
+        while len(reviews) > 1 and self._tokens(reviews) > self.max_tokens:
+            groups = [[]]
+            for review in reviews:
+                if groups[-1] and self._tokens(groups[-1] + [review]) > self.max_tokens:
+                    groups.append([])
+                groups[-1].append(review)
+            pending = [group for group in groups if len(group) > 1]  # Singletons are kept as they are
+            if not pending:
+                break  # Every review is too long on its own; send them as they are
+            print(f"{Color.BRIGHTYELLOW}Merging {len(reviews)} partial reviews...{Color.ENDC}")
+            merged = iter(self._run_all(
+                [
+                    (group[0][0], group[-1][1], COMBINE_PROMPT.format(
+                        filename=filename, first=group[0][0], last=group[-1][1],
+                        reviews=self._format(group),
+                    ))
+                    for group in pending
+                ],
+                "merged",
+            ))
+            merged_reviews = []
+            for group in groups:
+                reply = next(merged) if len(group) > 1 else None
+                if reply:
+                    merged_reviews.append((group[0][0], group[-1][1], reply))
+                else:
+                    merged_reviews.extend(group)  # A singleton, or reviews the merge failed on
+            if len(merged_reviews) >= len(reviews):
+                break  # No merge went through; another round would repeat this one
+            reviews = merged_reviews
+        return REDUCE_PROMPT.format(filename=filename, parts=len(chunks), reviews=self._format(reviews))
+
+    @staticmethod
+    def _format(reviews):
+        return "\n\n".join(f"### Lines {first}-{last}\n{text}" for first, last, text in reviews)
+
+    def _tokens(self, reviews):
+        return self.count(self._format(reviews))
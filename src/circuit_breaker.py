@@ -0,0 +1,138 @@
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request to a provider whose circuit is open."""
+
+    def __init__(self, ai_service, retry_in):
+        super().__init__(
+            f"{ai_service} is failing; requests are paused for {retry_in:.0f}s (circuit open)"
+        )
+        self.ai_service = ai_service
+        self.retry_in = retry_in
+
+
+def is_outage(error):
+    """
+    True if an API error means the provider is unhealthy (unreachable, timing
+    out or failing with 5xx), rather than rejecting this particular request.
+
+    Args:
+        error (Exception): The error raised by the OpenAI SDK, or by its
+            transport while a stream is read.
+
+    Returns:
+        bool: Whether the error should count against the provider's circuit.
+    """
+    import httpx
+    import openai
+
+    # Includes timeouts, and connections dropped mid-stream
+    if isinstance(error, (openai.APIConnectionError, httpx.TransportError, OSError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+class CircuitBreaker:
+    """
+    Health of one provider as a closed / open / half-open circuit.
+
+    Closed: requests flow. After `failure_threshold` outages in a row the
+    circuit opens and requests fail fast (or fail over) for `cooldown`
+    seconds. Then a single probe is let through (half-open): success closes
+    the circuit; failure opens it again with the cooldown doubled, up to
+    `max_cooldown`.
+    """
+
+    def __init__(self, ai_service, failure_threshold=3, cooldown=30.0, max_cooldown=300.0):
+        """
+        Args:
+            ai_service (str): The provider this circuit guards.
+            failure_threshold (int): Consecutive outages that open the circuit.
+            cooldown (float): Seconds the circuit stays open before a probe.
+            max_cooldown (float): Upper bound for the doubled cooldown.
+        """
+        self.ai_service = ai_service
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    def retry_in(self):
+        """Seconds until the open circuit lets a probe through."""
+        return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def allow_request(self, as_probe=True):
+        """
+        Decides whether a request may be sent to the provider now.
+
+        Args:
+            as_probe (bool): Once the cooldown is over, let this request
+                through as the half-open probe.
+
+        Returns:
+            bool: True if the request may be sent.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if as_probe and self._claim_probe():
+                return True
+            return False
+
+    def claim_probe(self):
+        """
+        Claims the half-open probe for a separate health check, if it is due.
+
+        Returns:
+            bool: True if the caller should probe the provider now.
+        """
+        with self._lock:
+            return self._claim_probe()
+
+    def _claim_probe(self):
+        if self.state == OPEN and self.retry_in() == 0:
+            self.state = HALF_OPEN
+            return True
+        return False
+
+    def record_success(self):
+        """Records a request the provider handled (even if it rejected it)."""
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.cooldown = self.base_cooldown
+
+    def record_failure(self):
+        """Records an outage; opens the circuit at the threshold or after a failed probe."""
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            elif self.failures < self.failure_threshold or self.state == OPEN:
+                return
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self.times_opened += 1
+
+    def record(self, error=None):
+        """
+        Records the outcome of a request.
+
+        Args:
+            error (Exception): The error it raised, or None on success.
+        """
+        if error is not None and is_outage(error):
+            self.record_failure()
+        else:
+            self.record_success()
@@ -0,0 +1,157 @@
+import os
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from grep_engine import BINARY_SNIFF, iter_paths
+
+READ_WORKERS = 8  # Files read (and counted) at once
+# Files above this many bytes per token of budget cannot fit and are not read
+MAX_BYTES_PER_TOKEN = 16
+# Orders the files can be packed in, most important first
+ORDERS = {
+    "given": lambda f: f["rank"],  # The order of the paths in the command
+    "newest": lambda f: (-f["mtime_ns"], f["rank"]),  # Recently changed first
+    "smallest": lambda f: (f["size"], f["rank"]),  # As many files as possible
+    "name": lambda f: f["path"],
+}
+
+
+def collect_files(patterns):
+    """
+    Lists the files named by paths, folders and globs, once each.
+
+    Args:
+        patterns (list): Paths, folders or globs (see `grep_engine.iter_paths`).
+
+    Returns:
+        tuple: The files as dicts with `path`, `size`, `mtime_ns` and `rank`
+               (their position in the listing), and the patterns matching nothing.
+    """
+    files = []
+    seen = set()
+    unmatched = []
+    for pattern in patterns:
+        matched = False
+        try:
+            for path, size, mtime_ns in iter_paths(os.path.expanduser(pattern)):
+                matched = True
+                key = os.path.realpath(path)
+                if key not in seen:
+                    seen.add(key)
+                    files.append({"path": path, "size": size, "mtime_ns": mtime_ns, "rank": len(files)})
+        except FileNotFoundError:
+            pass
+        if not matched:
+            unmatched.append(pattern)
+    return files, unmatched
+
+
+def _read(file, count, max_bytes):
+    """Reads one file and counts its tokens, or sets `skipped` to the reason it cannot be sent."""
+    if file["size"] > max_bytes:
+        file["skipped"] = "too large"
+        return file
+    if not file["size"]:
+        file["skipped"] = "empty"
+        return file
+    try:
+        with open(file["path"], "rb") as f:
+            data = f.read()
+    except OSError as e:
+        file["skipped"] = f"unreadable ({e.strerror or e})"
+        return file
+    if b"\0" in data[:BINARY_SNIFF]:
+        file["skipped"] = "binary"
+        return file
+    try:
+        file["text"] = data.decode("utf-8")
+    except UnicodeDecodeError:
+        file["skipped"] = "binary (not UTF-8)"
+        return file
+    file["digest"] = hashlib.blake2b(data, digest_size=16).digest()
+    file["tokens"] = count(file["text"])
+    return file
+
+
+def read_files(files, count, budget):
+    """
+    Reads files concurrently, skipping binary ones and ones that cannot fit.
+
+    Args:
+        files (list): File dicts from `collect_files`; updated in place with
+            `text`, `tokens` and `digest`, or `skipped`.
+        count (callable): Counts the tokens of a string.
+        budget (int): The token budget of the request.
+    """
+    max_bytes = budget * MAX_BYTES_PER_TOKEN
+    with ThreadPoolExecutor(max_workers=READ_WORKERS, thread_name_prefix="frea-send") as executor:
+        for _ in executor.map(lambda file: _read(file, count, max_bytes), files):
+            pass
+
+
+def pack_files(files, budget, order="given", overhead=None):
+    """
+    Chooses which files go into one request: in priority order, every file
+    that still fits in the budget. Files with the same content as one
+    already chosen are left out as duplicates.
+
+    Args:
+        files (list): Read file dicts (see `read_files`).
+        budget (int): The token budget.
+        order (str): A key of `ORDERS`.
+        overhead (callable): Tokens a file adds besides its text (its header).
+
+    Returns:
+        tuple: The files to send, and (path, reason) pairs for the rest.
+    """
+    chosen = []
+    left_out = []
+    digests = {}
+    used = 0
+    for file in sorted(files, key=ORDERS[order]):
+        if "skipped" in file:
+            left_out.append((file["path"], file["skipped"]))
+            continue
+        if file["digest"] in digests:
+            left_out.append((file["path"], f"same content as {digests[file['digest']]}"))
+            continue
+        tokens = file["tokens"] + (overhead(file) if overhead else 0)
+        if used + tokens > budget:
+            left_out.append((file["path"], f"does not fit ({file['tokens']} tokens)"))
+            continue
+        used += tokens
+        digests[file["digest"]] = file["path"]
+        chosen.append(file)
+    logging.info(f"send: packed {len(chosen)} files ({used} tokens), left out {len(left_out)}")
+    return chosen, left_out
+
+
+def file_header(file):
+    """The line introducing a file in the prompt."""
+    return f"### {file['path']}\n"
+
+
+def format_prompt(chosen, left_out):
+    """
+    Builds the review prompt for a set of files.
+
+    Args:
+        chosen (list): The files to send.
+        left_out (list): (path, reason) pairs of files not sent.
+
+    Returns:
+        str: The prompt.
+    """
+    parts = [f"Please review the following {plural(len(chosen), 'file')}:"]
+    for file in chosen:
+        parts.append(f"{file_header(file)}```\n{file['text'].rstrip()}\n```")
+    if left_out:
+        parts.append(
+            "These files were not included:\n"
+            + "\n".join(f"- {path}: {reason}" for path, reason in left_out)
+        )
+    return "\n\n".join(parts)
+
+
+def plural(n, noun):
+    return f"{n} {noun}" if n == 1 else f"{n} {noun}s"
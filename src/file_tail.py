@@ -0,0 +1,193 @@
+import os
+import sys
+import time
+import select
+import logging
+
+BLOCK_SIZE = 64 * 1024  # Bytes read per step when scanning backwards
+READ_SIZE = 64 * 1024  # Bytes read per step when following
+POLL_INTERVAL = 0.25  # Seconds between checks without inotify
+# With inotify, how often to check anyway for rotation, truncation or missed events
+WATCH_INTERVAL = 1.0
+
+# inotify event masks (see inotify(7))
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_MOVE_SELF = 0x800
+IN_DELETE_SELF = 0x400
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+
+def _decode(line):
+    return line.decode("utf-8", "replace").rstrip()
+
+
+def _last_lines(f, end, n, block_size=BLOCK_SIZE):
+    """Reads backwards from offset `end` of binary file `f` until it has `n` lines."""
+    if n <= 0:
+        return []
+    chunks = []
+    newlines = 0
+    pos = end
+    # n + 1 newlines guarantee n complete lines, even after a final newline
+    while pos > 0 and newlines <= n:
+        step = min(block_size, pos)
+        pos -= step
+        f.seek(pos)
+        chunk = f.read(step)
+        newlines += chunk.count(b"\n")
+        chunks.append(chunk)
+    lines = b"".join(reversed(chunks)).split(b"\n")
+    if lines and not lines[-1]:
+        lines.pop()  # The final newline ends the last line
+    return [_decode(line) for line in lines[-n:]]
+
+
+def read_last_lines(path, n, block_size=BLOCK_SIZE):
+    """
+    Returns the last lines of a file by reading blocks backwards from its
+    end, so only the tail of the file is read however large it is.
+
+    Args:
+        path (str): The file.
+        n (int): The number of lines.
+        block_size (int): Bytes read per step.
+
+    Returns:
+        list: The last `n` lines, without line endings.
+    """
+    with open(path, "rb") as f:
+        return _last_lines(f, f.seek(0, os.SEEK_END), n, block_size)
+
+
+class _Inotify:
+    """Wakes a follower as soon as its file changes (Linux inotify, through libc)."""
+
+    def __init__(self, libc, fd):
+        self._libc = libc
+        self.fd = fd
+        self.wd = -1
+
+    @classmethod
+    def open(cls, path):
+        """Returns a watcher for `path`, or None where inotify is unavailable."""
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            import ctypes
+            import ctypes.util
+
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError) as e:
+            logging.debug(f"inotify unavailable: {e}")
+            return None
+        if fd < 0:
+            return None
+        watcher = cls(libc, fd)
+        if not watcher.watch(path):
+            watcher.close()
+            return None
+        return watcher
+
+    def watch(self, path):
+        """Watches `path` (again, e.g. after the file was rotated)."""
+        if self.wd >= 0:
+            self._libc.inotify_rm_watch(self.fd, self.wd)
+        self.wd = self._libc.inotify_add_watch(
+            self.fd, os.fsencode(path), IN_MODIFY | IN_ATTRIB | IN_MOVE_SELF | IN_DELETE_SELF
+        )
+        return self.wd >= 0
+
+    def wait(self, timeout):
+        """Waits up to `timeout` seconds for a change; returns True if one happened."""
+        ready, _, _ = select.select([self.fd], [], [], max(0.0, timeout))
+        if not ready:
+            return False
+        try:
+            while os.read(self.fd, 4096):  # Drain; the events themselves are not needed
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+def follow_lines(path, max_seconds=None, max_lines=None, last_lines=0, poll_interval=POLL_INTERVAL):
+    """
+    Yields lines appended to a file, like `tail -f`.
+
+    Waits on inotify where available and polls otherwise. A file that is
+    truncated is read again from its start; a file that is replaced (log
+    rotation) is reopened by name once the old one has been read to the end.
+
+    Args:
+        path (str): The file.
+        max_seconds (float): Stop after this long; None to follow until closed.
+        max_lines (int): Stop after this many new lines; None for no limit.
+        last_lines (int): First yield this many existing lines from the end,
+            so nothing appended in between is missed.
+        poll_interval (float): Seconds between checks without inotify.
+
+    Yields:
+        str: Each line, without its line ending. A last line without a
+             newline is yielded when the time cap is reached.
+    """
+    deadline = None if max_seconds is None else time.monotonic() + max_seconds
+    f = open(path, "rb")
+    end = f.seek(0, os.SEEK_END)
+    identity = (os.fstat(f.fileno()).st_ino, os.fstat(f.fileno()).st_dev)
+    watcher = _Inotify.open(path)
+    partial = b""
+    emitted = 0
+    try:
+        yield from _last_lines(f, end, last_lines)
+        f.seek(end)
+        while max_lines is None or emitted < max_lines:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            chunk = f.read(READ_SIZE)
+            if chunk:
+                *lines, partial = (partial + chunk).split(b"\n")
+                for line in lines[:None if max_lines is None else max_lines - emitted]:
+                    yield _decode(line)
+                    emitted += 1
+                continue
+            try:
+                current = os.stat(path)
+            except FileNotFoundError:
+                current = None  # Rotated away; the new file may not exist yet
+            if current is not None and (current.st_ino, current.st_dev) != identity:
+                if partial:
+                    yield _decode(partial)
+                    emitted += 1
+                    partial = b""
+                f.close()
+                f = open(path, "rb")
+                identity = (current.st_ino, current.st_dev)
+                if watcher:
+                    watcher.watch(path)
+                continue
+            if current is not None and current.st_size < f.tell():
+                f.seek(0)  # Truncated
+                partial = b""
+                continue
+            timeout = WATCH_INTERVAL if watcher else poll_interval
+            if remaining is not None:
+                timeout = min(timeout, remaining)
+            if watcher:
+                watcher.wait(timeout)
+            else:
+                time.sleep(timeout)
+        else:
+            return  # Line cap reached; what is left of the file is not wanted
+        if partial:
+            yield _decode(partial)
+    finally:
+        f.close()
+        if watcher:
+            watcher.close()
@@ -0,0 +1,530 @@
+import os
+import re
+import glob
+import mmap
+import logging
+import itertools
+import threading
+import multiprocessing
+from functools import lru_cache
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+DEFAULT_MAX_RESULTS = 200
+# Bytes sniffed for a NUL byte to tell binary files apart
+BINARY_SNIFF = 8192
+# Files at least this large are searched through mmap instead of being read
+MMAP_THRESHOLD = 1 << 20
+# Files larger than this are split into parts searched by different workers
+SPLIT_THRESHOLD = 64 << 20
+PART_SIZE = 16 << 20
+# Small files are searched in batches of this many files or bytes per worker task
+BATCH_FILES = 128
+BATCH_BYTES = 8 << 20
+# Matched lines are cut to this many characters (minified files have huge lines)
+MAX_LINE_CHARS = 500
+WORKERS = min(os.cpu_count() or 1, 8)
+
+IGNORE_FILES = (".gitignore", ".ignore", ".freaignore")
+SKIPPED_DIRS = {".git", ".hg", ".svn"}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _glob_regex(glob):
+    """Translates a gitignore glob into a regular expression ("*" stops at "/", "**" does not)."""
+    out = []
+    i = 0
+    while i < len(glob):
+        if glob.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if glob.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        c = glob[i]
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[" and glob.find("]", i + 2) != -1:
+            end = glob.find("]", i + 2)
+            body = glob[i + 1:end].replace("\\", "\\\\")
+            out.append("[" + ("^" + body[1:] if body.startswith("!") else body) + "]")
+            i = end
+        elif c == "\\" and i + 1 < len(glob):
+            i += 1
+            out.append(re.escape(glob[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+class IgnoreRules:
+    """
+    The patterns of the ignore files in one folder (`.gitignore`, `.ignore`,
+    `.freaignore`), with gitignore semantics: `#` comments, `!` negation,
+    a trailing `/` for folders only, and patterns containing a `/` anchored
+    to the folder.
+    """
+
+    def __init__(self, base, lines):
+        """
+        Args:
+            base (str): The folder holding the ignore files.
+            lines (iterable): The pattern lines.
+        """
+        self.base = base
+        self.rules = []  # (regex, negate, dirs_only)
+        for line in lines:
+            line = line.rstrip("\r\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dirs_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            anchored = "/" in line
+            regex = _glob_regex(line.lstrip("/"))
+            if not anchored:
+                regex = "(?:.*/)?" + regex
+            try:
+                self.rules.append((re.compile(regex), negate, dirs_only))
+            except re.error:
+                continue
+
+    @classmethod
+    def load(cls, folder):
+        """
+        Reads the ignore files of a folder.
+
+        Returns:
+            IgnoreRules: The rules, or None if the folder has no ignore file.
+        """
+        lines = []
+        for name in IGNORE_FILES:
+            try:
+                with open(os.path.join(folder, name), "r", encoding="utf-8", errors="replace") as f:
+                    lines.extend(f)
+            except OSError:
+                continue
+        rules = cls(folder, lines)
+        return rules if rules.rules else None
+
+    def match(self, path, is_dir):
+        """
+        Returns True if the path is ignored, False if a `!` rule re-includes
+        it, and None if no rule applies.
+        """
+        relative = os.path.relpath(path, self.base).replace(os.sep, "/")
+        result = None
+        for regex, negate, dirs_only in self.rules:
+            if (is_dir or not dirs_only) and regex.fullmatch(relative):
+                result = not negate
+        return result
+
+
+def _is_ignored(rules, path, is_dir):
+    ignored = False
+    for rule in rules:  # Deeper ignore files override shallower ones
+        decision = rule.match(path, is_dir)
+        if decision is not None:
+            ignored = decision
+    return ignored
+
+
+def iter_files(path):
+    """
+    Walks a folder in sorted order, skipping VCS folders and whatever its
+    ignore files exclude. Symlinked folders are not followed.
+
+    Args:
+        path (str): A folder, or a single file.
+
+    Yields:
+        tuple: (file path, size in bytes, modification time in nanoseconds).
+
+    Raises:
+        FileNotFoundError: If the path does not exist.
+    """
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        yield path, stat.st_size, stat.st_mtime_ns
+        return
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"No such file or directory: {path}")
+    stack = [(path, [])]
+    while stack:
+        folder, rules = stack.pop()
+        own = IgnoreRules.load(folder)
+        if own:
+            rules = rules + [own]
+        try:
+            with os.scandir(folder) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            continue
+        subfolders = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if is_dir and entry.name in SKIPPED_DIRS:
+                    continue
+                if rules and _is_ignored(rules, entry.path, is_dir):
+                    continue
+                if is_dir:
+                    subfolders.append(entry.path)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    yield entry.path, stat.st_size, stat.st_mtime_ns
+            except OSError:
+                continue
+        stack.extend((subfolder, rules) for subfolder in reversed(subfolders))
+
+
+
+def iter_paths(pattern):
+    """
+    Like `iter_files`, for a file, a folder or a glob ("*" within a folder,
+    "**" across folders). A glob is matched against the files under its
+    fixed leading folder, so ignored files are skipped for globs too; a
+    folder the glob matches contributes all its files.
+
+    Args:
+        pattern (str): The path or glob.
+
+    Yields:
+        tuple: (file path, size in bytes, modification time in nanoseconds).
+
+    Raises:
+        FileNotFoundError: If a plain path does not exist.
+    """
+    if not glob.has_magic(pattern):
+        yield from iter_files(pattern)
+        return
+    parts = pattern.replace(os.sep, "/").split("/")
+    fixed = list(itertools.takewhile(lambda part: not glob.has_magic(part), parts))
+    base = "/".join(fixed) or ("/" if fixed else ".")
+    if not os.path.isdir(base):
+        return
+    regex = re.compile(_glob_regex("/".join(parts[len(fixed):])))
+    for file_path, size, mtime_ns in iter_files(base):
+        relative = file_path[len(base):].lstrip(os.sep).replace(os.sep, "/")
+        names = relative.split("/")
+        if any(regex.fullmatch("/".join(names[:i])) for i in range(1, len(names) + 1)):
+            yield file_path, size, mtime_ns
+
+@lru_cache(maxsize=32)
+def _compile(pattern, flags):
+    """Compiles a pattern once per process."""
+    return re.compile(pattern, flags)
+
+
+def _count_newlines(data, start, end):
+    if isinstance(data, bytes):
+        return data.count(b"\n", start, end)
+    return data[start:end].count(b"\n")  # mmap has no count()
+
+
+def _line_at(data, start, size):
+    """Returns the end of the line starting at `start` and its text."""
+    end = data.find(b"\n", start)
+    if end == -1:
+        end = size
+    text = data[start:end].decode("utf-8", "replace").rstrip("\r")
+    if len(text) > MAX_LINE_CHARS:
+        text = text[:MAX_LINE_CHARS] + " …"
+    return end, text
+
+
+def search_buffer(regex, data, start=0, end=None, context=0, limit=DEFAULT_MAX_RESULTS):
+    """
+    Finds the lines of a buffer that match a compiled bytes pattern.
+
+    Instead of running the pattern once per line, it searches the whole
+    buffer and jumps to the next line after each hit, so regions without
+    matches are scanned at regex speed. Only lines starting in
+    [start, end) are reported, which lets several workers share a file.
+
+    Args:
+        regex (re.Pattern): Pattern compiled from bytes with re.MULTILINE.
+        data (bytes | mmap.mmap): The file content.
+        start (int): First byte of the part to search.
+        end (int): End of the part; None for the whole buffer.
+        context (int): Lines of context around each match.
+        limit (int): Stop after this many matching lines.
+
+    Returns:
+        list: (line number relative to `start`, 0-based, text, is_match) tuples.
+    """
+    size = len(data)
+    end = size if end is None else min(end, size)
+    if start > 0 and data[start - 1:start] != b"\n":
+        start_line = data.find(b"\n", start)
+        if start_line == -1:
+            return []
+        start_line += 1  # The line in progress belongs to the previous part
+    else:
+        start_line = start
+    if start_line >= end:
+        return []
+    # Patterns cannot run past the last line owned by this part
+    endpos = data.find(b"\n", end - 1)
+    endpos = size if endpos == -1 else endpos
+
+    hits = []
+    matches = 0
+    pos = start_line
+    counted, line_no = start, 0  # Newlines between `start` and `counted`
+    floor = 0  # Context never reaches above this offset (the last reported line)
+    while matches < limit and pos <= endpos:
+        match = regex.search(data, pos, endpos)
+        if match is None:
+            break
+        line_start = data.rfind(b"\n", 0, match.start()) + 1
+        if line_start >= end:
+            break
+        line_no += _count_newlines(data, counted, line_start)
+        counted = line_start
+
+        before = []
+        above = line_start
+        while len(before) < context and above > floor:
+            above = data.rfind(b"\n", 0, above - 1) + 1
+            before.append(above)
+        for distance in range(len(before), 0, -1):
+            hits.append((line_no - distance, _line_at(data, before[distance - 1], size)[1], False))
+
+        line_end, text = _line_at(data, line_start, size)
+        hits.append((line_no, text, True))
+        matches += 1
+        after = line_no
+        while after - line_no < context and line_end < size:
+            following = line_end + 1
+            following_end = data.find(b"\n", following)
+            following_end = size if following_end == -1 else following_end
+            if following >= size or regex.search(data, following, following_end):
+                break  # The next match reports it, with its own context
+            after += 1
+            line_end, text = _line_at(data, following, size)
+            hits.append((after, text, False))
+        floor = pos = line_end + 1
+    return hits
+
+
+def _search_part(regex, path, index, count, context, limit):
+    """Searches one file, or one part of a split file. Returns (newlines, hits)."""
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if not size:
+                return 0, []
+            data = None
+            if size >= MMAP_THRESHOLD:
+                try:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except (OSError, ValueError):
+                    data = None
+            if data is None:
+                data = f.read()
+    except OSError:
+        return 0, []
+    try:
+        if b"\0" in data[:BINARY_SNIFF]:
+            return 0, []  # Binary file
+        if count == 1:
+            return 0, search_buffer(regex, data, context=context, limit=limit)
+        start = index * PART_SIZE
+        end = min(start + PART_SIZE, size)
+        if start >= size:
+            return 0, []
+        return _count_newlines(data, start, end), search_buffer(regex, data, start, end, context, limit)
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+
+
+def _search_task(pattern, flags, parts, context, limit):
+    """
+    Worker entry point: searches a batch of files or file parts.
+
+    Returns:
+        list: (path, index, count, newlines, hits) for every part with hits
+              and for every part of a split file.
+    """
+    regex = _compile(pattern, flags)
+    results = []
+    for path, index, count in parts:
+        newlines, hits = _search_part(regex, path, index, count, context, limit)
+        if hits or count > 1:
+            results.append((path, index, count, newlines, hits))
+    return results
+
+
+def _make_tasks(files):
+    """Groups small files into batches and splits large ones into parts."""
+    batch, batch_bytes = [], 0
+    for path, size, _ in files:
+        if size > SPLIT_THRESHOLD:
+            count = -(-size // PART_SIZE)
+            for index in range(count):
+                yield [(path, index, count)]
+            continue
+        batch.append((path, 0, 1))
+        batch_bytes += size
+        if len(batch) >= BATCH_FILES or batch_bytes >= BATCH_BYTES:
+            yield batch
+            batch, batch_bytes = [], 0
+    if batch:
+        yield batch
+
+
+def get_pool():
+    """Returns the shared worker processes, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Never fork: frea runs helper threads, and forking them is unsafe
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(
+                max_workers=WORKERS, mp_context=multiprocessing.get_context(method)
+            )
+        return _pool
+
+
+def reset_pool():
+    """Discards the worker processes, e.g. after one of them died."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _run_tasks(tasks, pattern, flags, context, limit):
+    """
+    Runs search tasks, yielding each task's results as soon as it finishes.
+
+    A search that fits one task runs in this process; otherwise the tasks go
+    to the worker processes, a bounded number at a time so walking a huge
+    tree does not queue it all up front. If the workers cannot be used,
+    the search continues in this process.
+    """
+    tasks = iter(tasks)
+    head = list(itertools.islice(tasks, 2))
+    if len(head) < 2:
+        for task in head:
+            yield _search_task(pattern, flags, task, context, limit)
+        return
+    tasks = itertools.chain(head, tasks)
+
+    pending = {}
+    try:
+        pool = get_pool()
+        while True:
+            for task in itertools.islice(tasks, max(0, WORKERS * 2 - len(pending))):
+                try:
+                    future = pool.submit(_search_task, pattern, flags, task, context, limit)
+                except BaseException:
+                    tasks = itertools.chain([task], tasks)
+                    raise
+                pending[future] = task
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = pending.pop(future)
+                yield future.result()
+    except (BrokenProcessPool, OSError, NotImplementedError) as e:
+        logging.warning(f"grep: worker processes unavailable ({e}); searching in-process")
+        reset_pool()
+        for task in itertools.chain(pending.values(), tasks):
+            yield _search_task(pattern, flags, task, context, limit)
+        pending.clear()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+class _PartMerger:
+    """Puts the parts of split files back in order and numbers their lines."""
+
+    def __init__(self):
+        self.files = {}
+
+    def add(self, path, index, count, newlines, hits):
+        if count == 1:
+            for line_no, text, is_match in hits:
+                yield path, line_no + 1, text, is_match
+            return
+        state = self.files.setdefault(path, {"next": 0, "offset": 1, "last": 0, "ready": {}})
+        state["ready"][index] = (newlines, hits)
+        while state["next"] in state["ready"]:
+            newlines, hits = state["ready"].pop(state["next"])
+            for line_no, text, is_match in hits:
+                line_no += state["offset"]
+                if line_no > state["last"]:  # Context shared with the previous part
+                    state["last"] = line_no
+                    yield path, line_no, text, is_match
+            state["offset"] += newlines
+            state["next"] += 1
+        if state["next"] == count:
+            del self.files[path]
+
+
+def iter_grep(
+    pattern, path=".", max_results=DEFAULT_MAX_RESULTS, context=0, ignore_case=False, index=None
+):
+    """
+    Searches files for lines matching a regular expression, in parallel.
+
+    The pattern is compiled once (per worker), binary files and ignored
+    paths are skipped, large files are searched through mmap and split
+    across worker processes, and lines are yielded as they are found.
+    Files are reported in completion order; lines of a file stay in order.
+
+    The pattern runs on raw bytes (UTF-8), so case-insensitive matching and
+    classes like \\w only cover ASCII letters.
+
+    Args:
+        pattern (str): The regular expression.
+        path (str): The folder or file to search.
+        max_results (int): Matching lines to find before stopping.
+        context (int): Lines of context to show around each match.
+        ignore_case (bool): Match case-insensitively.
+        index (TrigramIndex): Narrows the files to search, if given.
+
+    Yields:
+        tuple: (path, line number, text, is_match); context lines have is_match False.
+
+    Raises:
+        re.error: If the pattern is invalid.
+        FileNotFoundError: If the path does not exist.
+    """
+    flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+    raw = pattern.encode("utf-8")
+    _compile(raw, flags)  # Fail on a bad pattern before any work
+    max_results = max(1, max_results)
+    context = max(0, context)
+    merger = _PartMerger()
+    files = index.candidates(raw, flags, path) if index else iter_files(path)
+    runs = _run_tasks(_make_tasks(files), raw, flags, context, max_results)
+    found = 0
+    try:
+        for results in runs:
+            for part in results:
+                for line in merger.add(*part):
+                    if line[3]:
+                        if found >= max_results:
+                            return
+                        found += 1
+                    yield line
+    finally:
+        runs.close()
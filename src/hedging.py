@@ -0,0 +1,260 @@
+import inspect
+import logging
+import math
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+def _has_payload(chunk):
+    """True if a streamed chunk carries reply content or tool calls (not just the role)."""
+    choices = getattr(chunk, "choices", None)
+    if not choices:
+        return False
+    delta = choices[0].delta
+    return bool(getattr(delta, "content", None) or getattr(delta, "tool_calls", None))
+
+
+class PrefetchedStream:
+    """
+    A completion stream whose leading chunks were already read.
+
+    Iterating yields the buffered chunks, then the rest of the stream.
+    """
+
+    def __init__(self, buffered, stream, source=None):
+        self.buffered = buffered
+        self.stream = stream
+        self.source = stream if source is None else source
+
+    def __iter__(self):
+        yield from self.buffered
+        yield from self.stream
+
+    async def __aiter__(self):
+        for chunk in self.buffered:
+            yield chunk
+        async for chunk in self.stream:
+            yield chunk
+
+    def close(self):
+        """
+        Closes the underlying stream (and its HTTP response). For async
+        streams this returns an awaitable.
+        """
+        return close_stream(self.source)
+
+
+def close_stream(stream):
+    """
+    Closes a completion stream: an SDK stream, a generator or an async
+    generator. For async streams the returned awaitable must be awaited.
+    """
+    close = getattr(stream, "aclose", None) or getattr(stream, "close", None)
+    return close() if close else None
+
+
+def prefetch_stream(stream):
+    """
+    Reads a stream up to its first chunk with content, so the request
+    counts as answered only when the model actually starts replying.
+
+    Args:
+        stream: The iterator returned by `chat.completions.create(stream=True)`.
+
+    Returns:
+        PrefetchedStream: The stream, replayable from the start.
+    """
+    buffered = []
+    iterator = iter(stream)
+    for chunk in iterator:
+        buffered.append(chunk)
+        if _has_payload(chunk):
+            break
+    return PrefetchedStream(buffered, iterator, source=stream)
+
+
+async def prefetch_stream_async(stream):
+    """Async variant of `prefetch_stream`."""
+    buffered = []
+    iterator = stream.__aiter__()
+    async for chunk in iterator:
+        buffered.append(chunk)
+        if _has_payload(chunk):
+            break
+    return PrefetchedStream(buffered, iterator, source=stream)
+
+
+def close_response(response):
+    """Closes a losing stream so its connection goes back to the pool."""
+    try:
+        if isinstance(response, PrefetchedStream):
+            response.close()
+    except Exception as e:
+        logging.debug(f"Closing abandoned hedge response failed: {e}")
+
+
+async def close_response_async(response):
+    """Async variant of `close_response`."""
+    try:
+        if isinstance(response, PrefetchedStream):
+            result = response.close()
+            if inspect.isawaitable(result):
+                await result
+    except Exception as e:
+        logging.debug(f"Closing abandoned hedge response failed: {e}")
+
+
+class HedgedRequester:
+    """
+    Sends a request to the primary provider and, if it has not answered
+    after a delay, a backup request to the secondary provider. The first
+    answer wins; the other request is cancelled or, if it is already on the
+    wire, closed as soon as it returns.
+
+    The delay is either fixed or, in auto mode, the p90 of the primary's
+    recent latencies, so only the slow tail is hedged. A primary that fails
+    before the delay triggers the backup at once.
+    """
+
+    def __init__(self, delay=None, initial_delay=2.0, quantile=0.9, window=100, min_samples=5):
+        """
+        Args:
+            delay (float): Fixed seconds before the backup is sent; None for auto.
+            initial_delay (float): Delay used in auto mode until enough latencies are known.
+            quantile (float): Latency quantile used as the delay in auto mode.
+            window (int): Number of recent primary latencies kept.
+            min_samples (int): Latencies needed before the quantile is trusted.
+        """
+        self.delay = delay
+        self.initial_delay = initial_delay
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.hedged = 0
+        self.backup_wins = 0
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="frea-hedge")
+
+    def current_delay(self):
+        """
+        Returns the seconds to wait for the primary before sending the backup.
+        """
+        if self.delay is not None:
+            return self.delay
+        samples = sorted(self.latencies)
+        if len(samples) < self.min_samples:
+            return self.initial_delay
+        return samples[max(0, math.ceil(self.quantile * len(samples)) - 1)]
+
+    def _record(self, start, failed):
+        if not failed:
+            self.latencies.append(time.perf_counter() - start)
+
+    def _won(self, backup):
+        if backup:
+            self.backup_wins += 1
+            logging.info("Hedged request: the backup provider answered first")
+        return backup
+
+    def run(self, primary, backup, discard=None):
+        """
+        Runs a hedged request on worker threads.
+
+        Args:
+            primary (callable): Sends the request to the primary provider and returns its answer.
+            backup (callable): Sends the request to the backup provider.
+            discard (callable): Receives a losing answer that arrived too late, to release it.
+
+        Returns:
+            tuple: The winning answer and whether it came from the backup.
+
+        Raises:
+            Exception: The primary's error if both requests fail.
+        """
+        self.requests += 1
+        start = time.perf_counter()
+        first = self._executor.submit(primary)
+        first.add_done_callback(lambda f: self._record(start, f.cancelled() or f.exception()))
+        done, _ = wait([first], timeout=self.current_delay())
+        if done and first.exception() is None:
+            return first.result(), False
+
+        self.hedged += 1
+        second = self._executor.submit(backup)
+        pending = {second} if done else {first, second}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            answered = [f for f in (first, second) if f in done and f.exception() is None]
+            if answered:
+                winner = answered[0]
+                for loser in (first, second):
+                    if loser is not winner and not loser.cancel() and discard:
+                        loser.add_done_callback(
+                            lambda f: not f.cancelled() and f.exception() is None and discard(f.result())
+                        )
+                return winner.result(), self._won(winner is second)
+        if first.exception() is not None:
+            raise first.exception()
+        raise second.exception()
+
+    async def run_async(self, primary, backup, discard=None):
+        """
+        Runs a hedged request as asyncio tasks; the losing task is cancelled.
+
+        Args:
+            primary (callable): Returns a coroutine sending the request to the primary provider.
+            backup (callable): Returns a coroutine sending it to the backup provider.
+            discard (callable): Async; receives a losing answer that completed at the same time.
+
+        Returns:
+            tuple: The winning answer and whether it came from the backup.
+        """
+        import asyncio  # Only the --async engine needs it; keep it off the startup path
+
+        self.requests += 1
+        start = time.perf_counter()
+        first = asyncio.create_task(primary())
+        done, _ = await asyncio.wait({first}, timeout=self.current_delay())
+        if done and first.exception() is None:
+            self._record(start, False)
+            return first.result(), False
+
+        self.hedged += 1
+        second = asyncio.create_task(backup())
+        pending = {second} if done else {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                if first in done:
+                    self._record(start, first.exception() is not None)
+                answered = [task for task in (first, second) if task in done and task.exception() is None]
+                if answered:
+                    for loser in answered[1:]:
+                        if discard:
+                            await discard(loser.result())
+                    return answered[0].result(), self._won(answered[0] is second)
+        finally:
+            if first in pending:
+                # A cancelled primary took at least this long; keep it in the
+                # window so the delay does not drift below the real tail
+                self._record(start, False)
+            for task in pending:
+                task.cancel()
+        if first.exception() is not None:
+            raise first.exception()
+        raise second.exception()
+
+    def stats(self):
+        """
+        Returns hedging statistics.
+
+        Returns:
+            dict: Request, hedge and backup-win counts and the current delay.
+        """
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "backup_wins": self.backup_wins,
+            "delay": self.current_delay(),
+        }
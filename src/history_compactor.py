@@ -0,0 +1,72 @@
+import logging
+import threading
+
+
+class HistoryCompactor:
+    """
+    Folds old user/assistant pairs into a rolling summary on a background thread.
+
+    Once the raw (unsummarized) history passes `trigger_ratio` of the token
+    budget, the oldest pairs are summarized together with the previous
+    summary until about `target_ratio` of the budget remains raw. The current
+    turn never waits for this: requests use whatever summary is ready, and
+    truncation still applies if compaction falls behind.
+    """
+
+    def __init__(self, history, summarize, trigger_ratio=0.75, target_ratio=0.5):
+        """
+        Args:
+            history (ChatHistory): The history to compact.
+            summarize (callable): `summarize(previous_summary, messages) -> str`.
+            trigger_ratio (float): Fraction of the budget that starts a compaction.
+            target_ratio (float): Fraction of the budget left raw after compaction.
+        """
+        self.history = history
+        self.summarize = summarize
+        self.trigger_ratio = trigger_ratio
+        self.target_ratio = target_ratio
+        self._thread = None
+
+    @property
+    def running(self):
+        """True while a compaction is in progress."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def maybe_compact(self, budget):
+        """
+        Starts a background compaction if the raw history is close to `budget`.
+
+        Args:
+            budget (int): The token budget for the history.
+
+        Returns:
+            bool: True if a compaction was started.
+        """
+        if self.running:
+            return False
+        history = self.history
+        raw_tokens = history.total_tokens - history.tokens_between(0, history.summarized_upto)
+        if raw_tokens <= budget * self.trigger_ratio:
+            return False
+        start, end = history.compaction_range(int(budget * self.target_ratio))
+        if end <= start:
+            return False
+
+        messages = history.messages[start:end]
+        self._thread = threading.Thread(
+            target=self._compact,
+            args=(history.summary, messages, end, history.generation),
+            daemon=True,
+        )
+        self._thread.start()
+        return True
+
+    def _compact(self, previous_summary, messages, upto, generation):
+        try:
+            summary = self.summarize(previous_summary, messages)
+        except Exception as e:
+            # Leave the history as is; the next turn retries
+            logging.warning(f"History compaction failed: {e}")
+            return
+        if summary and self.history.set_summary(summary.strip(), upto, generation):
+            logging.info(f"Compacted {len(messages)} messages into the history summary")
@@ -0,0 +1,127 @@
+import os
+import mmap
+import bisect
+import threading
+from array import array
+from collections import OrderedDict
+
+BLOCK_SIZE = 64 * 1024  # Bytes per index entry
+MAX_OPEN_FILES = 16  # Indexed (mmap'd) files kept open, least recently used evicted
+
+_cache = OrderedDict()  # Real path -> LineIndex
+_lock = threading.Lock()
+
+
+class LineIndex:
+    """
+    Finds lines of a memory-mapped file by number without reading it all.
+
+    The index holds the number of newlines before each 64 KiB block, so it
+    costs 8 bytes per block; a line is found by bisecting the blocks and
+    scanning within one of them. Reading a range costs O(range), not O(file).
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): The file to index.
+        """
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self.mtime_ns = stat.st_mtime_ns
+            self.size = stat.st_size
+            # mmap cannot map an empty file
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self.block_newlines = array("Q", [0])  # Newlines before block i
+        total = 0
+        for start in range(0, self.size, BLOCK_SIZE):
+            total += self.data[start:start + BLOCK_SIZE].count(b"\n")
+            self.block_newlines.append(total)
+        # A last line without a newline still counts
+        self.line_count = total + (1 if self.size and self.data[-1:] != b"\n" else 0)
+
+    def is_current(self, stat):
+        """True if the file has not changed since it was indexed."""
+        return stat.st_mtime_ns == self.mtime_ns and stat.st_size == self.size
+
+    def offset(self, line):
+        """
+        Returns the byte offset where a line starts.
+
+        Args:
+            line (int): The 0-based line number.
+
+        Returns:
+            int: The offset, or the file size for lines past the end.
+        """
+        if line <= 0:
+            return 0
+        if line > self.block_newlines[-1]:
+            return self.size
+        # The block holding the line-th newline
+        block = bisect.bisect_left(self.block_newlines, line) - 1
+        pos = block * BLOCK_SIZE
+        for _ in range(line - self.block_newlines[block]):
+            pos = self.data.find(b"\n", pos) + 1
+        return pos
+
+    def read(self, start, end, max_bytes=None):
+        """
+        Returns the bytes of lines `start` to `end` (0-based, end exclusive).
+
+        Args:
+            start (int): The first line.
+            end (int): The line after the last.
+            max_bytes (int): Stop at the last whole line within this many
+                bytes (or inside the first line if that alone is longer).
+
+        Returns:
+            bytes: The lines, with their line endings.
+        """
+        first = self.offset(start)
+        last = self.offset(end)
+        if max_bytes is not None and last - first > max_bytes:
+            cut = self.data.rfind(b"\n", first, first + max_bytes)
+            last = cut + 1 if cut >= 0 else first + max_bytes
+        return self.data[first:last]
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+
+def read_lines(path, start, count, max_bytes=None):
+    """
+    Reads a range of lines through the cached index of the file, rebuilding
+    the index if the file changed since.
+
+    Args:
+        path (str): The file.
+        start (int): The first line (1-based).
+        count (int): The number of lines.
+        max_bytes (int): Return fewer lines rather than more bytes than this.
+
+    Returns:
+        tuple: (list of lines without line endings, total number of lines).
+    """
+    key = os.path.realpath(path)
+    stat = os.stat(key)
+    with _lock:
+        index = _cache.pop(key, None)
+        if index is not None and not index.is_current(stat):
+            index.close()
+            index = None
+        if index is None:
+            index = LineIndex(key)
+        _cache[key] = index  # Most recently used last
+        while len(_cache) > MAX_OPEN_FILES:
+            _cache.popitem(last=False)[1].close()
+        # Read under the lock so an eviction cannot close the map mid-read
+        first = max(0, start - 1)
+        data = index.read(first, first + max(0, count), max_bytes)
+        total = index.line_count
+    lines = data.decode("utf-8", "replace").split("\n")
+    if lines and not lines[-1]:
+        lines.pop()  # The newline ending the range
+    return [line.rstrip("\r") for line in lines], total
+
@@ -1,9 +1,9 @@
 import sys
+import argparse
 import threading
 import logging
 import time
 import re
-import readline  # Import the readline library
 from logging.handlers import RotatingFileHandler
 from color import Color
 from chat_initializer import ChatInitializer
@@ -13,40 +13,76 @@ from utils import (
     run_subprocess,
     loading_animation,
     set_stop_loading,
+    StreamPrinter,
     cursor_hide,
     cursor_show,
 )
-import openai
 import configparser
 from printer import save_log, print_log
+from chat_history import ChatHistory
+from session_journal import SessionJournal, latest_session
+from history_compactor import HistoryCompactor
+from response_cache import ResponseCache
+from similarity_cache import SimilarityCache
+from token_counter import get_token_counter
 import atexit
 import os  # Added to handle file commands
+import shutil
 import agent_tools as tools
+import wiki_client
 import json
-
-# Configure logging with RotatingFileHandler
-log_handler = RotatingFileHandler(
-    "./logs/error.log", maxBytes=0.5 * 1024 * 1024, backupCount=3
-)
-log_handler.setLevel(logging.INFO)
-log_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
-logging.getLogger().addHandler(log_handler)
+from tool_runner import TOOLS, run_tool_calls
+from tool_registry import TOOL_SCHEMAS
+from hedging import HedgedRequester, prefetch_stream, close_response
+from circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN
+
+# Configure logging with RotatingFileHandler. This module also runs a second
+# time as `main` when async_chat imports it under `python main.py --async`,
+# so the handler is added only once.
+LOG_FILE = os.path.abspath("./logs/error.log")
+if not any(
+    isinstance(handler, RotatingFileHandler) and handler.baseFilename == LOG_FILE
+    for handler in logging.getLogger().handlers
+):
+    log_handler = RotatingFileHandler(LOG_FILE, maxBytes=0.5 * 1024 * 1024, backupCount=3)
+    log_handler.setLevel(logging.INFO)
+    log_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    logging.getLogger().addHandler(log_handler)
 logging.getLogger().setLevel(logging.INFO)
 
 
 class AIChat:
-    def __init__(self):
+    def __init__(self, resume=None):
         """
         Initializes the AIChat application by loading configuration and setting up the chat session.
+
+        Args:
+            resume (str): A session to continue (see `open_journal`); None starts a new one.
         """
         self.initializer = ChatInitializer()
         self.gemini_api_key = self.initializer.gemini_api_key
         self.groq_api_key = self.initializer.groq_api_key
         self.ai_service = self.initializer.ai_service
         self.model = self.initializer.model
-        self.chat_history = []
+        self.chat_history = ChatHistory(get_token_counter(self.ai_service, self.model))
         self.loading_style = self.initializer.loading_style
         self.instruction = self.initializer.instruction
+        self.stream_responses = self.initializer.stream_responses
+        tools.MAX_READ_BYTES = int(self.initializer.read_limit_kb * 1024)
+        self.turn_metrics = []  # Per-turn latency records for the stats command
+        self._system_tokens = (None, 0)  # (cache key, token count) of the system prompt
+        self.compactor = HistoryCompactor(self.chat_history, self.summarize_history)
+        self.response_cache = self._open_response_cache()
+        self.similarity_cache = self._open_similarity_cache()
+        self.search_index = self._open_search_index()
+        self.hedger = self._create_hedger()
+        self.circuits = {}  # Provider -> CircuitBreaker
+        self.failovers = 0  # Requests sent to the backup provider because of an open circuit
+        self.bypass_cache = False  # Set for turns flagged with ChatConfig.FRESH_FLAG
+        self.last_response_cacheable = False  # True when the last answer used no tools
+        self.file_prompt = False  # True when the prompt was built from files (send)
+        self.similarity_turn = False  # True when this turn may use the similarity cache
+        self.journal = self.open_journal(resume)
 
         # Register cleanup function
         atexit.register(self.cleanup)
@@ -55,7 +91,134 @@ class AIChat:
         """
         Cleans up resources when the application exits.
         """
-        pass  # No cleanup needed for OpenAI client
+        if self.response_cache:
+            self.response_cache.close()
+        if self.similarity_cache:
+            self.similarity_cache.close()
+        if self.search_index:
+            self.search_index.close()
+        if self.journal:
+            self.journal.close()
+            if self.journal.appended:
+                print(
+                    f"{Color.LIGHTBLUE}Session saved as {self.journal.session}; "
+                    f"continue it with --resume {self.journal.session}{Color.ENDC}"
+                )
+
+    def open_journal(self, resume=None):
+        """
+        Opens the session journal, loading the last turns of a resumed session
+        into the chat history.
+
+        Args:
+            resume (str): The session to continue, or "last" for the most
+                recent one; None starts a new session.
+
+        Returns:
+            SessionJournal: The journal new messages are written to, or None
+                            if journaling is off.
+        """
+        journal = None
+        if resume:
+            session = latest_session(ChatConfig.SESSIONS_FOLDER) if resume == "last" else resume
+            try:
+                if session is None:
+                    raise FileNotFoundError("no saved sessions")
+                journal = SessionJournal(ChatConfig.SESSIONS_FOLDER, session)
+                messages = journal.last_turns(self.initializer.resume_turns)
+            except (OSError, ValueError) as e:
+                print(f"{Color.BRIGHTRED}Could not resume {resume}: {e}{Color.ENDC}")
+                journal = None
+            else:
+                for message in messages:
+                    self.chat_history.append(message)
+                print(
+                    f"{Color.LIGHTBLUE}Resumed session {session} "
+                    f"({sum(m.get('role') == 'user' for m in messages)} turns loaded){Color.ENDC}"
+                )
+        if not self.initializer.journal:
+            if journal:
+                journal.close()
+            return None
+        journal = journal or SessionJournal(ChatConfig.SESSIONS_FOLDER)
+        self.chat_history.journal = journal
+        return journal
+
+    def _create_hedger(self):
+        """
+        Creates the hedged-request runner if hedging is enabled in the config.
+
+        Returns:
+            HedgedRequester: The runner, or None if hedging is off.
+        """
+        if not self.initializer.hedging:
+            return None
+        return HedgedRequester(
+            delay=self.initializer.hedge_delay, initial_delay=ChatConfig.HEDGE_INITIAL_DELAY
+        )
+
+    def _open_similarity_cache(self):
+        """
+        Opens the near-duplicate prompt cache if it is enabled in the config.
+
+        Returns:
+            SimilarityCache: The cache, or None if disabled or unavailable.
+        """
+        if not self.initializer.similarity_cache:
+            return None
+        try:
+            return SimilarityCache(
+                os.path.join(ChatConfig.CACHE_FOLDER, "similar.sqlite"),
+                threshold=self.initializer.similarity_threshold,
+            )
+        except Exception as e:
+            logging.error(f"Could not open similarity cache: {e}")
+            return None
+
+    def _open_search_index(self):
+        """
+        Opens the workspace trigram index for grep if it is enabled in the config.
+
+        Returns:
+            TrigramIndex: The index, or None if disabled or unavailable.
+        """
+        if not self.initializer.search_index:
+            return None
+        import hashlib
+        import search_index  # Deferred: pulls in the grep engine
+
+        root = self.initializer.search_index_root
+        digest = hashlib.sha256(root.encode("utf-8")).hexdigest()[:12]
+        try:
+            index = search_index.TrigramIndex(
+                root,
+                os.path.join(ChatConfig.CACHE_FOLDER, f"search_index_{digest}.sqlite"),
+                max_bytes=int(self.initializer.search_index_max_mb * 1024 * 1024),
+            )
+        except Exception as e:
+            logging.error(f"Could not open search index: {e}")
+            return None
+        search_index.activate(index)
+        return index
+
+    def _open_response_cache(self):
+        """
+        Opens the on-disk response cache if it is enabled in the config.
+
+        Returns:
+            ResponseCache: The cache, or None if disabled or unavailable.
+        """
+        if not self.initializer.response_cache:
+            return None
+        try:
+            return ResponseCache(
+                os.path.join(ChatConfig.CACHE_FOLDER, "responses.sqlite"),
+                max_bytes=int(self.initializer.response_cache_max_mb * 1024 * 1024),
+                ttl=self.initializer.response_cache_ttl,
+            )
+        except Exception as e:
+            logging.error(f"Could not open response cache: {e}")
+            return None
 
     def generate_chat(self):
         """
@@ -66,93 +229,16 @@ class AIChat:
             print(f"{Color.BRIGHTRED}Failed to initialize chat. Exiting...{Color.ENDC}")
             return
 
-        user_input = ""
-        multiline_mode = False
+        # Load the API client while the user types the first prompt
+        threading.Thread(target=self.initializer.warm_up, daemon=True).start()
 
         while True:
             try:
-                # Multiline input handling
-                if multiline_mode:
-                    pass
-                    print(f"{Color.AQUA}╰─❯❯ {Color.ENDC}", end="")
-                else:
-                    print(f"{Color.AQUA}╭─ master \n╰─❯❯ {Color.ENDC}", end="")
-
-                # Use readline for input with history navigation
-                user_input_line = input()
-
-                if user_input_line.endswith("\\"):
-                    user_input += user_input_line.rstrip("\\") + "\n"
-                    multiline_mode = True
-                    continue
-                else:
-                    user_input += user_input_line
-
-                # Handle special commands (e.g., exit, reset, clear, etc.)
-                if self.handle_special_commands(user_input):
-                    user_input = ""
-                    multiline_mode = False
-                    continue
-
-                # Handle empty input
-                if not user_input:
-                    print(
-                        f"\n{Color.BRIGHTYELLOW}\n╭─ 𝑓rea \n╰─❯❯ {Color.ENDC}{Color.LIGHTRED}Please enter your command/prompt{Color.ENDC}"
-                    )
-                    user_input = ""
-                    multiline_mode = False
-                    continue
-
-                # Handle send file commands (e.g., send <file> or /send <file>)
-                if user_input.strip().lower().startswith("send ") or user_input.strip().startswith("/send "):
-                    parts = user_input.strip().split(maxsplit=1)
-                    filename = parts[1] if len(parts) > 1 else None
-                    if not filename:
-                        print(f"{Color.BRIGHTRED}Usage: send <file_path>{Color.ENDC}")
-                        user_input = ""
-                        multiline_mode = False
-                        continue
-                    filepath = os.path.expanduser(filename)
-                    if not os.path.exists(filepath):
-                        print(f"{Color.BRIGHTRED}File not found: {filename}{Color.ENDC}")
-                        user_input = ""
-                        multiline_mode = False
-                        continue
-                    try:
-                        with open(filepath, "r", encoding="utf-8") as f:
-                            content = f.read()
-                    except Exception as e:
-                        print(f"{Color.BRIGHTRED}Error reading file: {e}{Color.ENDC}")
-                        user_input = ""
-                        multiline_mode = False
-                        continue
-                    prompt = f"Please review the following file: {filename}\n\n{content}"
-                    self.process_user_input(chat, prompt)
-                    user_input = ""
-                    multiline_mode = False
-                    continue
-
-                # Handle subprocess commands (e.g., run ls or /ls)
-                if user_input.strip().lower().startswith(
-                    "run "
-                ) or user_input.strip().startswith("/"):
-                    command = (
-                        user_input[1:].strip()
-                        if user_input.strip().startswith("/")
-                        else user_input[4:].strip()
-                    )
-                    print(
-                        f"{Color.BRIGHTYELLOW}\n╭─ 𝑓rea ─────────────────────────╮\n╰─❯❯ {Color.ENDC}{Color.LIGHTRED}Executing master Command{Color.ENDC}{Color.BRIGHTYELLOW} ❮❮─╯{Color.ENDC}"
-                    )
-                    run_subprocess(command)
-                    user_input = ""
-                    multiline_mode = False
-                    print("\n")
-                else:
+                user_input = self.read_user_input()
+                prompt = self.route_user_input(user_input)
+                if prompt is not None:
                     # Process user input and get AI response
-                    self.process_user_input(chat, user_input)
-                    user_input = ""
-                    multiline_mode = False
+                    self.process_user_input(chat, prompt)
 
             except KeyboardInterrupt:
                 print("\nKeyboard Interrupt")
@@ -165,6 +251,97 @@ class AIChat:
                 )
                 break
 
+    def read_user_input(self):
+        """
+        Reads one (possibly multi-line) prompt from the terminal.
+
+        Lines ending with a backslash continue on the next line.
+
+        Returns:
+            str: The complete user input.
+        """
+        import readline  # noqa: F401  Enables line editing and history for input()
+
+        user_input = ""
+        multiline_mode = False
+        while True:
+            # Multiline input handling
+            if multiline_mode:
+                print(f"{Color.AQUA}╰─❯❯ {Color.ENDC}", end="")
+            else:
+                print(f"{Color.AQUA}╭─ master \n╰─❯❯ {Color.ENDC}", end="")
+
+            # Use readline for input with history navigation
+            user_input_line = input()
+
+            if user_input_line.endswith("\\"):
+                user_input += user_input_line.rstrip("\\") + "\n"
+                multiline_mode = True
+                continue
+            return user_input + user_input_line
+
+    def route_user_input(self, user_input):
+        """
+        Handles local commands (special commands, send, run) and decides what goes to the model.
+
+        Args:
+            user_input (str): The user input to route.
+
+        Returns:
+            str: The prompt to send to the AI model, or None if the input was handled locally.
+        """
+        self.file_prompt = False
+        # Handle special commands (e.g., exit, reset, clear, etc.)
+        if self.handle_special_commands(user_input):
+            return None
+
+        # Handle empty input
+        if not user_input:
+            print(
+                f"\n{Color.BRIGHTYELLOW}\n╭─ 𝑓rea \n╰─❯❯ {Color.ENDC}{Color.LIGHTRED}Please enter your command/prompt{Color.ENDC}"
+            )
+            return None
+
+        # Handle send file commands (e.g., send <file> or /send <file>)
+        if user_input.strip().lower().startswith("send ") or user_input.strip().startswith("/send "):
+            parts = user_input.strip().split(maxsplit=1)
+            filename = parts[1] if len(parts) > 1 else None
+            if not filename:
+                print(f"{Color.BRIGHTRED}Usage: send <file_path> | send <paths|folders|globs> [--order ...]{Color.ENDC}")
+                return None
+            filepath = os.path.expanduser(filename)
+            self.file_prompt = True  # File contents change; never answer them from the similarity cache
+            if not os.path.isfile(filepath):
+                return self.send_files(filename)
+            try:
+                with open(filepath, "r", encoding="utf-8") as f:
+                    content = f.read()
+            except Exception as e:
+                print(f"{Color.BRIGHTRED}Error reading file: {e}{Color.ENDC}")
+                return None
+            chunk_tokens = self.review_chunk_tokens()
+            if get_token_counter(self.ai_service, self.model).count(content) > chunk_tokens:
+                return self.review_in_chunks(filename, content, chunk_tokens)
+            return f"Please review the following file: {filename}\n\n{content}"
+
+        # Handle subprocess commands (e.g., run ls or /ls)
+        if user_input.strip().lower().startswith(
+            "run "
+        ) or user_input.strip().startswith("/"):
+            command = (
+                user_input[1:].strip()
+                if user_input.strip().startswith("/")
+                else user_input[4:].strip()
+            )
+            print(
+                f"{Color.BRIGHTYELLOW}\n╭─ 𝑓rea ─────────────────────────╮\n╰─❯❯ {Color.ENDC}{Color.LIGHTRED}Executing master Command{Color.ENDC}{Color.BRIGHTYELLOW} ❮❮─╯{Color.ENDC}"
+            )
+            run_subprocess(command)
+            print("\n")
+            return None
+
+        return user_input
+
     def handle_special_commands(self, user_input):
         """
         Handles special commands like exit, reset, clear, etc.
@@ -189,12 +366,25 @@ class AIChat:
         elif lower.startswith("ls"):
             parts = stripped.split(maxsplit=1)
             path = parts[1] if len(parts) > 1 else '.'
-            res = tools.ls(path)
+            try:
+                res = tools.list_dir(path, color=True)
+            except Exception as e:
+                res = f"ls error: {e}"
             if res: print(res)
             return True
         elif lower.startswith("cat "):
-            res = tools.cat(stripped.split(maxsplit=1)[1])
-            print(res)
+            path = stripped.split(maxsplit=1)[1]
+            if os.path.isfile(path) and os.path.getsize(path) > tools.MAX_READ_BYTES:
+                self._page_file(path)
+            else:
+                print(tools.cat(path))
+            return True
+        elif lower.startswith("lines "):
+            parts = stripped.split()
+            path = parts[1] if len(parts) > 1 else ''
+            start = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else 1
+            n = int(parts[3]) if len(parts) > 3 and parts[3].isdigit() else 50
+            print(tools.read_lines(path, start, n))
             return True
         elif lower.startswith("head "):
             parts = stripped.split()
@@ -204,18 +394,50 @@ class AIChat:
             print(res)
             return True
         elif lower.startswith("tail "):
-            parts = stripped.split()
-            path = parts[1] if len(parts) > 1 else ''
-            n = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else 10
-            res = tools.tail(path, n)
-            print(res)
+            parts = stripped.split()[1:]
+            follow = parts[:1] == ["-f"]
+            if follow:
+                parts = parts[1:]
+            path = parts[0] if parts else ''
+            n = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 10
+            if not follow:
+                print(tools.tail(path, n))
+                return True
+            from file_tail import follow_lines
+
+            try:
+                for line in follow_lines(path, last_lines=n):
+                    print(line, flush=True)
+            except KeyboardInterrupt:
+                print()  # Ctrl+C ends following, not the session
+            except Exception as e:
+                print(f"tail error: {e}")
             return True
         elif lower.startswith("grep "):
-            parts = stripped.split(maxsplit=2)
-            pattern = parts[1] if len(parts) > 1 else ''
-            path = parts[2] if len(parts) > 2 else '.'
-            res = tools.grep(pattern, path)
-            print(res)
+            options = {"max_results": 200, "context_lines": 0, "ignore_case": False}
+            rest = stripped.split(maxsplit=1)[1]
+            while rest.startswith("-"):
+                flag, _, rest = rest.partition(" ")
+                if flag == "-i":
+                    options["ignore_case"] = True
+                elif flag in ("-C", "-m"):
+                    value, _, rest = rest.lstrip().partition(" ")
+                    if not value.isdigit():
+                        print(f"grep: {flag} needs a number")
+                        return True
+                    options["context_lines" if flag == "-C" else "max_results"] = int(value)
+                else:
+                    rest = f"{flag} {rest}"  # A pattern starting with "-"
+                    break
+                rest = rest.lstrip()
+            parts = rest.split(maxsplit=1)
+            pattern = parts[0] if parts else ''
+            path = parts[1] if len(parts) > 1 else '.'
+            try:
+                for line in tools.grep_lines(pattern, path, color=True, **options):
+                    print(line, flush=True)
+            except Exception as e:
+                print(f"grep error: {e}")
             return True
         elif lower.startswith("write "):
             parts = stripped.split(maxsplit=2)
@@ -273,6 +495,10 @@ class AIChat:
             self._handle_model_command()
         elif command == ChatConfig.SERVICE_COMMAND:
             self._handle_change_ai_service()
+        elif command == ChatConfig.STATS_COMMAND:
+            self._handle_stats_command()
+        elif command.split()[:1] == [ChatConfig.INDEX_COMMAND]:
+            self._handle_index_command(command.split()[1:])
         else:
             return False
         return True
@@ -291,7 +517,10 @@ class AIChat:
         )
         time.sleep(0.5)
         ChatConfig.clear_screen()
-        self.chat_history = []
+        self.chat_history.clear()
+        if self.journal:
+            self.journal.close()
+            self.journal = self.open_journal()  # A reset starts a new session
         self.initialize_chat()
 
     def _handle_clear_command(self):
@@ -312,13 +541,28 @@ class AIChat:
         self.instruction_file = config["DEFAULT"]["InstructionFile"]
         self.model = config["DEFAULT"]["AIModel"]
         self.initializer = ChatInitializer()  # Reinitialize with new config
+        self.stream_responses = self.initializer.stream_responses
+        tools.MAX_READ_BYTES = int(self.initializer.read_limit_kb * 1024)
+        if self.response_cache:
+            self.response_cache.close()
+        self.response_cache = self._open_response_cache()
+        if self.similarity_cache:
+            self.similarity_cache.close()
+        self.similarity_cache = self._open_similarity_cache()
+        if self.search_index:
+            import search_index
+
+            search_index.activate(None)
+            self.search_index.close()
+        self.search_index = self._open_search_index()
+        self.hedger = self._create_hedger()
         self.instruction = ChatConfig.chat_instruction(self.instruction_file)
         self.initialize_chat()
 
     def _handle_save_command(self):
         """Handles the save command."""
         file_name = input("Enter the file name to save: ")
-        save_log(file_name, self.chat_history)
+        save_log(file_name, self.chat_history.to_list())
 
     def _handle_print_command(self):
         """Handles the print command."""
@@ -349,6 +593,139 @@ class AIChat:
         except Exception as e:
             print(f"{Color.BRIGHTRED}Error exporting code blocks: {e}{Color.ENDC}")
 
+    def _handle_stats_command(self):
+        """Handles the stats command: shows response timings for this session."""
+        if not self.turn_metrics:
+            print(f"{Color.BRIGHTYELLOW}No responses recorded yet.{Color.ENDC}")
+            return
+        last = self.turn_metrics[-1]
+        ttfts = [m["ttft"] for m in self.turn_metrics if m["ttft"] is not None]
+        totals = [m["total"] for m in self.turn_metrics]
+        print(f"\n{Color.BRIGHTGREEN}Response timings:{Color.ENDC}")
+        print(f"  turns:              {len(self.turn_metrics)}")
+        if last["ttft"] is not None:
+            print(f"  last first token:   {last['ttft']:.2f}s")
+        mode = "cached" if last.get("cached") else "streamed" if last["streamed"] else "buffered"
+        print(f"  last total:         {last['total']:.2f}s ({mode})")
+        if ttfts:
+            print(f"  avg first token:    {sum(ttfts) / len(ttfts):.2f}s")
+        print(f"  avg total:          {sum(totals) / len(totals):.2f}s")
+        if self.chat_history.summarized_upto:
+            print(f"  summarized messages: {self.chat_history.summarized_upto}")
+        if self.similarity_cache:
+            print(
+                f"  similarity cache:   {self.similarity_cache.hits} hits / "
+                f"{self.similarity_cache.misses} misses"
+            )
+        if self.response_cache:
+            stats = self.response_cache.stats()
+            print(
+                f"  response cache:     {stats['hits']} hits / {stats['misses']} misses "
+                f"(all processes: {stats['total_hits']} / {stats['total_misses']}, "
+                f"{stats['entries']} entries, {stats['bytes'] / 1024:.0f} KiB)"
+            )
+        limiter = self.initializer.rate_limiter(self.ai_service)
+        if limiter:
+            stats = limiter.stats()
+            limits = ", ".join(
+                f"{stats[name]:.0f}/{stats[unit]:.0f} {unit.upper()}"
+                for name, unit in (("requests", "rpm"), ("tokens", "tpm"))
+                if stats[unit]
+            )
+            print(
+                f"  rate limit:         {limits or 'limits not known yet'} available, "
+                f"waited {stats['waited']:.1f}s"
+                + (f", paused {stats['blocked_for']:.0f}s more" if stats["blocked_for"] else "")
+            )
+        if self.hedger:
+            stats = self.hedger.stats()
+            won = stats["backup_wins"] / stats["hedged"] if stats["hedged"] else 0
+            print(
+                f"  hedging:            backup sent for {stats['hedged']}/{stats['requests']} "
+                f"requests, won {stats['backup_wins']} ({won:.0%}), "
+                f"delay {stats['delay']:.2f}s ({self.initializer.backup_service})"
+            )
+        if self.circuits or self.failovers:
+            states = ", ".join(
+                f"{service} {breaker.state}"
+                + (f" ({breaker.retry_in():.0f}s)" if breaker.state == OPEN else "")
+                for service, breaker in self.circuits.items()
+            )
+            print(f"  circuits:           {states}; {self.failovers} requests failed over")
+
+    def _page_file(self, path):
+        """
+        Prints a file above the read limit one screen at a time, reading only
+        the lines shown (see line_index).
+
+        Args:
+            path (str): The file.
+        """
+        from line_index import read_lines  # Deferred: only paging needs it
+
+        page = max(5, shutil.get_terminal_size().lines - 2)
+        start = 1
+        try:
+            while True:
+                lines, total = read_lines(path, start, page, tools.MAX_READ_BYTES)
+                for line in lines:
+                    print(line)
+                start += len(lines)
+                if not lines or start > total:
+                    return
+                answer = input(
+                    f"{Color.BRIGHTYELLOW}-- line {start - 1} of {total}; Enter for more, q to stop --{Color.ENDC} "
+                )
+                if answer.strip().lower() == "q":
+                    return
+        except KeyboardInterrupt:
+            print()
+        except Exception as e:
+            print(f"cat error: {e}")
+
+    def _handle_index_command(self, args):
+        """
+        Handles the index command: shows the search index status, or updates
+        (`index update`) or clears (`index clear`) it.
+        """
+        if not self.search_index:
+            print(
+                f"{Color.BRIGHTYELLOW}The search index is off; set SearchIndex = yes in "
+                f"{ChatConfig.CONFIG_FILE} to enable it.{Color.ENDC}"
+            )
+            return
+        action = args[0] if args else "status"
+        if action == "update":
+            start = time.perf_counter()
+            changed = self.search_index.update()
+            print(
+                f"{Color.BRIGHTGREEN}Indexed {changed} changed files in "
+                f"{time.perf_counter() - start:.2f}s.{Color.ENDC}"
+            )
+        elif action == "clear":
+            self.search_index.clear()
+            print(f"{Color.BRIGHTGREEN}Search index cleared.{Color.ENDC}")
+        elif action != "status":
+            print(f"{Color.BRIGHTYELLOW}Usage: {ChatConfig.INDEX_COMMAND} [status|update|clear]{Color.ENDC}")
+            return
+        status = self.search_index.status()
+        print(f"\n{Color.BRIGHTGREEN}Search index:{Color.ENDC}")
+        print(f"  root:               {status['root']}")
+        print(
+            f"  files:              {status['indexed']} indexed, {status['skipped']} always searched, "
+            f"{status['binary']} binary"
+        )
+        print(
+            f"  size:               {status['bytes'] / 1048576:.1f} / "
+            f"{status['max_bytes'] / 1048576:.0f} MiB"
+        )
+        last = status["last_search"]
+        if last:
+            print(
+                f"  last search:        {last['candidates']}/{last['files']} files searched, "
+                f"{last['reindexed']} reindexed, lookup {last['seconds'] * 1000:.0f} ms"
+            )
+
     def _handle_model_command(self):
         """Handles the model command."""
         if self.change_model():
@@ -388,6 +765,7 @@ class AIChat:
 
         # Reinitialize initializer for new service
         self.initializer = ChatInitializer()
+        self.hedger = self._create_hedger()  # The backup provider changed too
 
         # Model selection for chosen provider
         models = self.initializer.get_models() or []
@@ -497,39 +875,22 @@ class AIChat:
             )
             time.sleep(1)
             ChatConfig.clear_screen()
-            self.chat_history = self.chat_history or []
             self.initialize_chat()
             return True
         return False
 
-    def extract_wikipedia_query(self, user_input):
+    def extract_wikipedia_queries(self, user_input):
         """
-        Extracts the Wikipedia query from the user input based on the specified rules.
+        Extracts the candidate Wikipedia queries from the user input (see
+        wiki_client.candidate_queries).
 
         Args:
             user_input (str): The user input to parse.
 
         Returns:
-            str: The extracted Wikipedia query, or None if no valid query is found.
+            list: The candidate queries, most likely first; empty if there are none.
         """
-        # Rule 1: Check for up to three phrases enclosed in double quotes
-        quoted_phrases = re.findall(r'"(.*?)"', user_input)
-        if quoted_phrases:
-            # Use the first quoted phrase as the query
-            return quoted_phrases[0]
-
-        # Rule 2: Check for text enclosed in backticks
-        backtick_phrases = re.findall(r"`(.*?)`", user_input)
-        if backtick_phrases:
-            # Use the first backtick phrase as the query
-            return backtick_phrases[0]
-
-        # Rule 3: Use the last two words of the prompt if no quotes or backticks are found
-        words = user_input.split()
-        if len(words) >= 2:
-            return " ".join(words[-2:])
-
-        return None
+        return wiki_client.candidate_queries(user_input, ChatConfig.WIKI_MAX_QUERIES)
 
     def process_user_input(self, chat, user_input):
         """
@@ -539,15 +900,21 @@ class AIChat:
             chat: The chat session.
             user_input (str): The user input to process.
         """
+        user_input = self.apply_fresh_flag(user_input)
         user_prompt = user_input
 
+        # Near-identical prompts are answered from the similarity cache
+        cached = self.similar_response(user_prompt)
+        if cached is not None:
+            self._print_cached_turn(user_prompt, cached)
+            return
+
         # Check if the user wants to use Wikipedia
         if "-wiki" in user_input.lower():
-            # Extract the Wikipedia query from the user input
-            query = self.extract_wikipedia_query(user_input)
-            if query:
-                # Query Wikipedia for additional information
-                wiki_info = self.initializer.query_wikipedia(query)
+            # Look all candidate queries up at once; late ones are dropped
+            queries = self.extract_wikipedia_queries(user_input)
+            if queries:
+                wiki_info = self.initializer.query_wikipedia_many(queries)
                 if wiki_info:
                     # Append Wikipedia information to the user input
                     user_input += f"\n\nHere's some additional information from Wikipedia:\n{wiki_info}"
@@ -559,65 +926,290 @@ class AIChat:
         # Append user input and AI response to chat history
         self.chat_history.append({"role": "user", "content": user_prompt})
         self.chat_history.append({"role": "assistant", "content": response_text})
+        self.remember_response(user_prompt, response_text)
+        self.compact_history()
 
-    def truncate_chat_history(self, chat_history, max_tokens=2048):
+    def apply_fresh_flag(self, user_input):
         """
-        Truncates the chat history to stay within the token limit.
+        Detects the per-turn cache bypass flag and removes it from the input.
 
         Args:
-            chat_history (list): The chat history to truncate.
-            max_tokens (int): The maximum number of tokens allowed.
+            user_input (str): The user input.
 
         Returns:
-            list: The truncated chat history.
+            str: The input without the flag.
         """
-        # Calculate the total token count (this is a simplified example)
-        total_tokens = sum(len(message["content"].split()) for message in chat_history)
+        pattern = rf"(?i)(^|\s){re.escape(ChatConfig.FRESH_FLAG)}(?=\s|$)"
+        self.bypass_cache = re.search(pattern, user_input) is not None
+        if self.bypass_cache:
+            user_input = re.sub(pattern, " ", user_input).strip()
+        return user_input
 
-        # Remove older messages until the token count is within the limit
-        while total_tokens > max_tokens and len(chat_history) > 1:
-            removed_message = chat_history.pop(
-                1
-            )  # Remove the oldest user-assistant pair
-            total_tokens -= len(removed_message["content"].split())
+    def _similarity_namespace(self):
+        return SimilarityCache.namespace(self.ai_service, self.model, self.instruction)
 
-        return chat_history
+    def similar_response(self, user_prompt):
+        """
+        Looks up a cached answer to a near-identical prompt.
 
-    def send_message_to_ai(self, chat, user_input):
+        Only the first turn of a conversation is looked up (and later stored):
+        the cache is keyed by the prompt alone, and the answer to a follow-up
+        depends on the conversation before it. Prompts built from files
+        (`send`) are never cached either.
+
+        Args:
+            user_prompt (str): The user prompt.
+
+        Returns:
+            str: The cached answer, or None.
         """
-        Sends a message to the AI model and returns the response.
+        self.similarity_turn = bool(
+            self.similarity_cache
+            and not self.file_prompt
+            and not len(self.chat_history)
+            and not self.chat_history.summary
+        )
+        if not self.similarity_turn or self.bypass_cache:
+            return None
+        return self.similarity_cache.lookup(self._similarity_namespace(), user_prompt)
+
+    def remember_response(self, user_prompt, response_text):
+        """
+        Stores a plain (tool-free) answer to a first turn in the similarity cache.
 
         Args:
-            chat: The chat session.
-            user_input (str): The user input to send.
+            user_prompt (str): The user prompt.
+            response_text (str): The model's answer.
+        """
+        if self.similarity_turn and self.last_response_cacheable:
+            self.similarity_cache.add(self._similarity_namespace(), user_prompt, response_text)
+
+    def _print_cached_turn(self, user_prompt, response_text):
+        """Prints a cached answer and records the turn like a model response."""
+        turn_start = time.perf_counter()
+        print()  # blank line before frea prompt
+        print(f"{Color.LIGHTPURPLE}╭─ 𝑓rea\n╰─❯❯ {Color.ENDC}{response_text}")
+        print()  # blank line after AI response
+        self.chat_history.append({"role": "user", "content": user_prompt})
+        self.chat_history.append({"role": "assistant", "content": response_text})
+        self._record_turn_metrics(turn_start, [time.perf_counter()], False, cached=True)
+
+    def send_files(self, args):
+        """
+        Packs the files named by paths, folders and globs into one review
+        prompt under a token budget (see file_bundle), and lists the files
+        that were left out.
+
+        Args:
+            args (str): The send arguments; `--order <order>` sets which
+                files are packed first.
 
         Returns:
-            str: The AI model's response.
+            str: The prompt, or None if nothing can be sent.
         """
-        # Get the generation config and safety settings from ChatConfig
-        generation_config = ChatConfig.generation_config()
+        import shlex
+        import file_bundle  # Deferred: only multi-file sends need it
 
-        # Prepare the messages for the API request
+        try:
+            words = shlex.split(args)
+        except ValueError as e:
+            print(f"{Color.BRIGHTRED}send: {e}{Color.ENDC}")
+            return None
+        order = self.initializer.send_order
+        patterns = []
+        words = iter(words)
+        for word in words:
+            if word == "--order":
+                order = next(words, "")
+            else:
+                patterns.append(word)
+        if order not in file_bundle.ORDERS:
+            print(
+                f"{Color.BRIGHTRED}send: unknown order {order!r}; use one of: "
+                f"{', '.join(file_bundle.ORDERS)}{Color.ENDC}"
+            )
+            return None
+
+        files, unmatched = file_bundle.collect_files(patterns)
+        for pattern in unmatched:
+            print(f"{Color.BRIGHTRED}No files found: {pattern}{Color.ENDC}")
+        if not files:
+            return None
+        counter = get_token_counter(self.ai_service, self.model)
+        budget = min(
+            self.initializer.send_max_tokens,
+            self.history_budget() - ChatConfig.REVIEW_RESERVED_TOKENS,
+        )
+        file_bundle.read_files(files, counter.count, budget)
+        chosen, left_out = file_bundle.pack_files(
+            files, budget, order, lambda file: counter.count(file_bundle.file_header(file)) + 8
+        )
+        if chosen:
+            tokens = sum(file["tokens"] for file in chosen)
+            print(
+                f"{Color.BRIGHTYELLOW}Sending {file_bundle.plural(len(chosen), 'file')} "
+                f"({tokens} tokens).{Color.ENDC}"
+            )
+        if left_out:
+            print(f"{Color.BRIGHTYELLOW}Left out {file_bundle.plural(len(left_out), 'file')}:{Color.ENDC}")
+            for path, reason in left_out:
+                print(f"  {Color.LIGHTBLUE}{path}{Color.ENDC} {reason}")
+        if not chosen:
+            return None
+        return file_bundle.format_prompt(chosen, left_out)
+
+    def review_chunk_tokens(self):
+        """
+        Returns the token budget for one chunk of a chunked file review: the
+        configured size, reduced if the model's context window is smaller.
+        """
+        reserved = ChatConfig.generation_config().get("max_output_tokens", 2048)
+        reserved += ChatConfig.REVIEW_RESERVED_TOKENS
+        window = self.initializer.context_window(self.model) - reserved
+        return max(256, min(self.initializer.review_chunk_tokens, window))
+
+    def review_in_chunks(self, filename, content, chunk_tokens):
+        """
+        Reviews the parts of a large file concurrently (see chunked_review) and
+        returns the prompt that merges the partial reviews; that final request
+        is sent as the normal turn.
+
+        Args:
+            filename (str): The file name, as given by the user.
+            content (str): The file content.
+            chunk_tokens (int): The token budget per chunk.
+
+        Returns:
+            str: The prompt for the merging request, or None if the review failed.
+        """
+        from chunked_review import ChunkedReview  # Deferred: only large reviews need it
+
+        counter = get_token_counter(self.ai_service, self.model)
+        review = ChunkedReview(
+            self.review_completion, counter.count, chunk_tokens, self.initializer.review_concurrency
+        )
+        try:
+            return review.run(filename, content)
+        except KeyboardInterrupt:
+            print(f"\n{Color.BRIGHTRED}Review cancelled.{Color.ENDC}")
+        except Exception as e:
+            logging.error(f"Chunked review of {filename} failed: {e}")
+            print(f"{Color.BRIGHTRED}Review failed: {e}{Color.ENDC}")
+        return None
+
+    def review_completion(self, prompt):
+        """
+        Sends one request of a chunked review, without history or tools.
+
+        Runs on the review's worker threads; requests are paced by the rate
+        limiter and go through the circuit breakers like any other.
+
+        Args:
+            prompt (str): The chunk or merge prompt.
+
+        Returns:
+            str: The model's reply.
+        """
         messages = [
-            {"role": "system", "content": self.instruction}
-        ]  # System instruction
+            {"role": "system", "content": "You are a careful reviewer of code and documents."},
+            {"role": "user", "content": prompt},
+        ]
+        response, _ = self._send_completion(messages, False, tools=False)
+        return (response.choices[0].message.content or "").strip()
 
-        # Truncate the chat history to avoid exceeding token limits
-        truncated_history = self.truncate_chat_history(self.chat_history.copy())
-        messages.extend(truncated_history)  # Add the truncated chat history
+    def compact_history(self):
+        """
+        Starts a background compaction of old turns if the history is nearing its budget.
+        """
+        if self.initializer.compact_history:
+            self.compactor.maybe_compact(self.history_budget())
 
-        messages.append({"role": "user", "content": user_input})
+    def summarize_history(self, previous_summary, messages):
+        """
+        Asks the model to fold old turns into the rolling conversation summary.
+
+        Runs on the compactor's background thread.
+
+        Args:
+            previous_summary (str): The current summary, possibly empty.
+            messages (list): The user/assistant messages to fold in.
+
+        Returns:
+            str: The updated summary.
+        """
+        transcript = "\n\n".join(f"{m['role'].upper()}: {m['content']}" for m in messages)
+        prompt = (
+            "Update the summary of this conversation with the new turns below. "
+            "Keep facts, decisions, names, file paths, code identifiers, errors and "
+            "open questions; drop pleasantries. Reply with the summary only.\n\n"
+            f"Current summary:\n{previous_summary or '(none)'}\n\nNew turns:\n{transcript}"
+        )
+        messages = [
+            {"role": "system", "content": "You summarize conversations for later reference."},
+            {"role": "user", "content": prompt},
+        ]
+        # Paced and sent through the circuit breakers like any other request
+        response, _ = self._send_completion(
+            messages,
+            False,
+            tools=False,
+            overrides={"max_tokens": ChatConfig.COMPACTION_MAX_TOKENS, "temperature": 0.1},
+        )
+        return response.choices[0].message.content
+
+    def truncate_chat_history(self, chat_history, max_tokens=None):
+        """
+        Truncates the chat history to stay within the token limit.
 
-        # Inject tool usage instructions into the system prompt
-        tool_instructions = """
+        Args:
+            chat_history (ChatHistory): The chat history to truncate.
+            max_tokens (int): The maximum number of tokens allowed. Defaults to
+                the model's context window minus the reserved output tokens.
+
+        Returns:
+            list: The newest messages that fit within the limit.
+        """
+        if max_tokens is None:
+            max_tokens = self.history_budget()
+        return chat_history.window(max_tokens)
+
+    def history_budget(self, user_input=""):
+        """
+        Returns how many tokens of history fit in the model's context window.
+
+        The window is reduced by the reserved output tokens, the system prompt
+        and the pending user input.
+
+        Args:
+            user_input (str): The user input about to be sent.
+
+        Returns:
+            int: The token budget for the chat history.
+        """
+        # Count tokens with the tokenizer of the (possibly new) provider/model
+        counter = get_token_counter(self.ai_service, self.model)
+        self.chat_history.set_counter(counter)
+        system_prompt = self.system_prompt()
+        if self._system_tokens[0] != (system_prompt, counter):
+            tokens = counter.count_message({"content": system_prompt})
+            if self.initializer.native_tools:
+                tokens += counter.count(json.dumps(TOOL_SCHEMAS))
+            self._system_tokens = ((system_prompt, counter), tokens)
+        reserved = ChatConfig.generation_config().get("max_output_tokens", 2048)
+        reserved += self._system_tokens[1] + counter.count_message({"content": user_input})
+        reserved += self.chat_history.summary_tokens
+        return max(0, self.initializer.context_window(self.model) - reserved)
+
+    TOOL_INSTRUCTIONS = """
 You have access to these tools:
-- wiki(query: string, sentences: int)
+- wiki(query: string, sentences: int)  (several topics: "a | b | c")
 - calc(expression: string)
 - ls(path: string)
 - cat(file_path: string)
 - head(file_path: string, lines: int)
-- tail(file_path: string, lines: int)
-- grep(pattern: string, path: string)
+- read_lines(file_path: string, start_line: int, line_count: int)
+- tail(file_path: string, lines: int, follow: bool, follow_seconds: float, follow_max_lines: int)
+- grep(pattern: string, path: string, max_results: int, context_lines: int, ignore_case: bool)
 - write_file(file_path: string, content: string)
 - append_file(file_path: string, content: string)
 - delete_file(file_path: string)
@@ -626,80 +1218,582 @@ You have access to these tools:
 
 When you want to use a tool, reply with only JSON:
 {"tool":"<name>","args":{...}}
-and nothing else.
+and nothing else. To run several independent tools at once, reply with a JSON list:
+[{"tool":"<name>","args":{...}}, {"tool":"<name>","args":{...}}]
+You will get every tool's output back and can call more tools before answering.
 """
-        messages[0]["content"] += "\n" + tool_instructions
+
+    def system_prompt(self):
+        """
+        Returns the system prompt; the text tool protocol is included only
+        when native function calling is off.
+        """
+        if self.initializer.native_tools:
+            return self.instruction
+        return self.instruction + "\n" + self.TOOL_INSTRUCTIONS
+
+    def build_messages(self, user_input):
+        """
+        Builds the message list for an API request: system prompt, truncated history and the new input.
+
+        Args:
+            user_input (str): The user input to send.
+
+        Returns:
+            list: The messages for `chat.completions.create`.
+        """
+        messages = [{"role": "system", "content": self.system_prompt()}]
+
+        # Rolling summary of compacted turns goes at the head of the history
+        summary = self.chat_history.summary_message()
+        if summary:
+            messages.append(summary)
+
+        # Truncate the chat history to avoid exceeding token limits
+        truncated_history = self.truncate_chat_history(
+            self.chat_history, self.history_budget(user_input)
+        )
+        messages.extend(truncated_history)  # Add the truncated chat history
+
+        messages.append({"role": "user", "content": user_input})
+        return messages
+
+    def completion_kwargs(self, messages, stream=False, tools=True):
+        """
+        Returns the keyword arguments for a `chat.completions.create` call.
+
+        Args:
+            messages (list): The messages to send.
+            stream (bool): Whether to request a streamed response.
+            tools (bool): Offer the tools to the model (with native tools on).
+
+        Returns:
+            dict: The request arguments.
+        """
+        # Get the generation config from ChatConfig
+        generation_config = ChatConfig.generation_config()
+        kwargs = {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": generation_config.get("max_output_tokens", 2048),
+            "temperature": generation_config.get("temperature", 0.25),
+            "top_p": generation_config.get("top_p", 0.65),
+            "stream": stream,
+        }
+        if tools and self.initializer.native_tools:
+            kwargs["tools"] = TOOL_SCHEMAS
+        return kwargs
+
+    @staticmethod
+    def parse_tool_calls(output):
+        """
+        Detects JSON tool calls in a model reply (text tool protocol).
+
+        A reply may hold one call object, a list of them, or `{"tools": [...]}`.
+
+        Args:
+            output (str): The model reply.
+
+        Returns:
+            list: (name, args, None) tuples; empty if the reply is not a tool call.
+        """
+        try:
+            # strip markdown fences or any wrapping and extract the JSON object or list
+            match = re.search(r"[\[{].*[\]}]", output, re.DOTALL)
+            payload = match.group() if match else output
+            data = json.loads(payload)
+        except json.JSONDecodeError:
+            return []
+        if isinstance(data, dict):
+            data = data["tools"] if isinstance(data.get("tools"), list) else [data]
+        if not isinstance(data, list):
+            return []
+        calls = []
+        for call in data:
+            if not isinstance(call, dict):
+                return []
+            name = call.get("tool")
+            args = call.get("args") or {}
+            if name not in TOOLS or not isinstance(args, dict):
+                return []
+            calls.append((name, args, None))
+        return calls
+
+    @staticmethod
+    def decode_native_tool_calls(native_calls):
+        """
+        Converts structured `tool_calls` from the API into (name, args, id) tuples.
+
+        Args:
+            native_calls (list): {"id", "name", "arguments"} dicts.
+
+        Returns:
+            list: (name, args, id) tuples.
+        """
+        calls = []
+        for call in native_calls:
+            try:
+                args = json.loads(call["arguments"] or "{}")
+            except json.JSONDecodeError:
+                logging.warning(f"Invalid arguments for tool {call['name']}: {call['arguments']}")
+                args = {}
+            calls.append((call["name"], args if isinstance(args, dict) else {}, call["id"]))
+        return calls
+
+    def get_tool_calls(self, output, native_calls):
+        """
+        Returns the tool calls of a reply: the structured `tool_calls` when
+        native function calling is on, otherwise calls parsed from the text.
+
+        Args:
+            output (str): The reply text.
+            native_calls (list): The structured tool calls of the reply.
+
+        Returns:
+            list: (name, args, id) tuples.
+        """
+        if self.initializer.native_tools:
+            return self.decode_native_tool_calls(native_calls)
+        return self.parse_tool_calls(output)
+
+    def _create_completion(self, messages, stream, max_retries=3):
+        """
+        Requests a completion, retrying failed calls with exponential backoff.
+
+        Gives up at once when every usable provider's circuit is open, and
+        skips the backoff when the next attempt fails over to the backup provider.
+
+        Args:
+            messages (list): The messages to send.
+            stream (bool): Whether to request a streamed response.
+            max_retries (int): The number of attempts before giving up.
+
+        Returns:
+            tuple: The completion (or a stream of chunks) and the provider that answered.
+        """
+        import openai
+
+        for attempt in range(max_retries):
+            try:
+                return self._send_completion(messages, stream)
+            except (openai.OpenAIError, CircuitOpenError) as e:
+                logging.warning(f"API request failed ({attempt+1}/{max_retries}): {e}")
+                if attempt == max_retries - 1 or isinstance(e, CircuitOpenError):
+                    raise
+                if self.initializer.failover and self.circuit(self.ai_service).state != CLOSED:
+                    continue  # The next attempt goes to the backup provider
+                time.sleep(2 ** attempt)
+
+    def circuit(self, ai_service):
+        """
+        Returns the circuit breaker tracking a provider's health.
+
+        Args:
+            ai_service (str): "gemini" or "groq".
+
+        Returns:
+            CircuitBreaker: The provider's breaker (kept across reconfiguration).
+        """
+        if ai_service not in self.circuits:
+            self.circuits[ai_service] = CircuitBreaker(
+                ai_service,
+                failure_threshold=self.initializer.circuit_failures,
+                cooldown=self.initializer.circuit_cooldown,
+            )
+        return self.circuits[ai_service]
+
+    def _client_for(self, ai_service):
+        """Returns the sync client of the configured or the backup provider."""
+        if ai_service == self.ai_service:
+            return self.initializer.client
+        return self.initializer.backup_client
+
+    def _backup_kwargs(self, kwargs):
+        """Returns request arguments for the backup provider."""
+        return dict(kwargs, model=self.initializer.backup_model)
+
+    def _start_probe(self, ai_service):
+        """Checks in the background whether a provider whose circuit is open has recovered."""
+        threading.Thread(target=self._probe, args=(ai_service,), daemon=True).start()
+
+    def _probe(self, ai_service):
+        """
+        Probes a provider by listing its models, which costs no tokens, and
+        closes or reopens its circuit accordingly.
+        """
+        breaker = self.circuit(ai_service)
+        try:
+            self._client_for(ai_service).models.list()
+        except Exception as e:
+            logging.info(f"Probe of {ai_service} failed: {e}")
+            breaker.record(e)
+            return
+        logging.info(f"Probe of {ai_service} succeeded; closing its circuit")
+        breaker.record_success()
+
+    def _send_to(self, ai_service, kwargs, checked=False):
+        """
+        Sends a request to one provider through its circuit breaker.
+
+        Args:
+            ai_service (str): The provider.
+            kwargs (dict): The `chat.completions.create` arguments.
+            checked (bool): The caller already got `allow_request()` for it.
+
+        Returns:
+            The completion, or a stream of chunks.
+
+        Raises:
+            CircuitOpenError: If the provider's circuit is open.
+        """
+        breaker = self.circuit(ai_service)
+        if not checked and not breaker.allow_request():
+            raise CircuitOpenError(ai_service, breaker.retry_in())
+        try:
+            response = self._paced_create(ai_service, self._client_for(ai_service), kwargs)
+        except Exception as e:
+            breaker.record(e)
+            raise
+        breaker.record_success()
+        return response
+
+    def _send_completion(self, messages, stream, tools=True, overrides=None):
+        """
+        Sends one completion request to a healthy provider, hedged against the
+        backup provider if enabled.
+
+        While the configured provider's circuit is open, requests fail over to
+        the backup provider and the configured one is probed in the background.
+
+        Args:
+            messages (list): The messages to send.
+            stream (bool): Whether to request a streamed response.
+            tools (bool): Offer the tools to the model.
+            overrides (dict): Request arguments replacing the generation config.
+
+        Returns:
+            tuple: The completion (or a stream of chunks) and the provider
+                   that answered: the configured one, or the backup after a
+                   failover or a won hedge.
+        """
+        kwargs = dict(self.completion_kwargs(messages, stream, tools), **(overrides or {}))
+        primary = self.circuit(self.ai_service)
+        if not primary.allow_request(as_probe=not self.initializer.failover):
+            if not self.initializer.failover:
+                raise CircuitOpenError(self.ai_service, primary.retry_in())
+            if primary.claim_probe():
+                self._start_probe(self.ai_service)
+            self.failovers += 1
+            backup = self.initializer.backup_service
+            return self._send_to(backup, self._backup_kwargs(kwargs)), backup
+        if not self.hedger:
+            return self._send_to(self.ai_service, kwargs, checked=True), self.ai_service
+
+        def send(ai_service, request, checked=False):
+            response = self._send_to(ai_service, request, checked)
+            if not stream:
+                return response
+            try:
+                # A stream has answered once its first content arrives
+                return prefetch_stream(response)
+            except Exception:
+                response.close()
+                raise
+
+        response, from_backup = self.hedger.run(
+            lambda: send(self.ai_service, kwargs, checked=True),
+            lambda: send(self.initializer.backup_service, self._backup_kwargs(kwargs)),
+            discard=close_response,
+        )
+        return response, self.initializer.backup_service if from_backup else self.ai_service
+
+    def estimate_request_tokens(self, kwargs):
+        """
+        Estimates the tokens a request counts against a tokens-per-minute limit:
+        its messages and tool schemas plus the maximum output.
+
+        Args:
+            kwargs (dict): The `chat.completions.create` arguments.
+
+        Returns:
+            int: The estimated token count.
+        """
+        counter = get_token_counter(self.ai_service, self.model)
+        tokens = sum(counter.count_message(message) for message in kwargs["messages"])
+        if kwargs.get("tools"):
+            tokens += counter.count(json.dumps(kwargs["tools"]))
+        return tokens + kwargs.get("max_tokens", 0)
+
+    def _paced_create(self, ai_service, client, kwargs):
+        """
+        Sends a request once the provider's rate limiter allows it, and feeds
+        the limiter the response's rate limit headers and token usage.
+
+        Args:
+            ai_service (str): The provider the client belongs to.
+            client (openai.OpenAI): The client to send with.
+            kwargs (dict): The `chat.completions.create` arguments.
+
+        Returns:
+            The completion, or a stream of chunks.
+        """
+        limiter = self.initializer.rate_limiter(ai_service)
+        if limiter is None:
+            return client.chat.completions.create(**kwargs)
+        import openai
+
+        estimate = self.estimate_request_tokens(kwargs)
+        reserved = limiter.acquire(estimate)
+        try:
+            raw = client.chat.completions.with_raw_response.create(**kwargs)
+        except openai.APIStatusError as e:
+            limiter.observe(e.response.headers)
+            limiter.settle(reserved, 0)  # Rejected requests use no tokens
+            raise
+        limiter.observe(raw.headers)
+        response = raw.parse()
+        if kwargs.get("stream"):
+            return self._metered_stream(response, limiter, estimate, reserved, kwargs)
+        usage = getattr(response, "usage", None)
+        if getattr(usage, "total_tokens", None):
+            limiter.settle(reserved, usage.total_tokens)
+        return response
+
+    def _metered_stream(self, stream, limiter, estimate, reserved, kwargs):
+        """
+        Passes a stream through and settles its token reservation when it ends.
+
+        Uses the usage the provider reports in the stream if any, otherwise
+        counts the streamed text.
+        """
+        pieces = []
+        usage = None
+        try:
+            for chunk in stream:
+                usage = getattr(chunk, "usage", None) or usage
+                if chunk.choices:
+                    delta = chunk.choices[0].delta
+                    pieces.append(delta.content or "")
+                    for call in getattr(delta, "tool_calls", None) or ():
+                        pieces.append(getattr(call.function, "arguments", None) or "")
+                yield chunk
+        finally:
+            stream.close()
+            used = getattr(usage, "total_tokens", None)
+            if not used:
+                counter = get_token_counter(self.ai_service, self.model)
+                used = estimate - kwargs.get("max_tokens", 0) + counter.count("".join(pieces))
+            limiter.settle(reserved, used)
+
+    def _read_response(self, response, stream, on_first_chunk=None):
+        """
+        Reads a completion, printing it as it streams in.
+
+        Args:
+            response: The completion, or a stream of chunks.
+            stream (bool): Whether `response` is a stream.
+            on_first_chunk (callable): Called once the first content is available.
+
+        Returns:
+            tuple: The response text, whether it was printed, and the native
+                   tool calls as {"id", "name", "arguments"} dicts.
+        """
+        if stream:
+            return self._read_stream(response, on_first_chunk=on_first_chunk)
+        if on_first_chunk:
+            on_first_chunk()
+        message = response.choices[0].message
+        native_calls = [
+            {"id": call.id, "name": call.function.name, "arguments": call.function.arguments}
+            for call in message.tool_calls or []
+        ]
+        return (message.content or "").strip(), False, native_calls
+
+    def append_tool_results(self, messages, output, tool_calls, results):
+        """
+        Appends a tool-calling reply and the tool outputs to the request messages.
+
+        Args:
+            messages (list): The request messages.
+            output (str): The model reply containing the tool calls.
+            tool_calls (list): (name, args, id) tuples.
+            results (list): The output of each call.
+        """
+        if not self.initializer.native_tools:
+            messages.append({"role": "assistant", "content": output})
+            for (name, _, _), result in zip(tool_calls, results):
+                messages.append({"role": "function", "name": name, "content": result})
+            return
+        messages.append(
+            {
+                "role": "assistant",
+                "content": output or None,
+                "tool_calls": [
+                    {
+                        "id": call_id,
+                        "type": "function",
+                        "function": {"name": name, "arguments": json.dumps(args)},
+                    }
+                    for name, args, call_id in tool_calls
+                ],
+            }
+        )
+        for (_, _, call_id), result in zip(tool_calls, results):
+            messages.append({"role": "tool", "tool_call_id": call_id, "content": result})
+
+    def send_message_to_ai(self, chat, user_input):
+        """
+        Sends a message to the AI model and returns the response.
+
+        Tool calls in the reply are run and their output sent back to the
+        model, for up to `MaxToolRounds` rounds.
+
+        Args:
+            chat: The chat session.
+            user_input (str): The user input to send.
+
+        Returns:
+            str: The AI model's response.
+        """
+        import httpx
+        import openai
+
+        messages = self.build_messages(user_input)
+        turn_start = time.perf_counter()
+        self.last_response_cacheable = False
+
+        # Identical requests are answered from the response cache
+        cache_key = self.response_cache_key(messages)
+        cached = self.response_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            self.last_response_cacheable = True
+            print(cached)
+            self._record_turn_metrics(turn_start, [time.perf_counter()], False, cached=True)
+            return cached
 
         # Call model and spinner
+        stream = self.stream_responses
+        first_token_at = []
         set_stop_loading(False)
         spinner = threading.Thread(target=loading_animation, args=(self.loading_style,), daemon=True)
         spinner.start()
-        # Retry mechanism for API call
+
+        def stop_spinner():
+            # Called once, when the first token (or the whole reply) is available
+            if not first_token_at:
+                first_token_at.append(time.perf_counter())
+                set_stop_loading(True)
+                spinner.join()
+
         max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                response = self.initializer.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    max_tokens=generation_config.get("max_output_tokens", 2048),
-                    temperature=generation_config.get("temperature", 0.25),
-                    top_p=generation_config.get("top_p", 0.65),
-                )
-                break
-            except openai.error.OpenAIError as e:
-                logging.warning(f"API request failed ({attempt+1}/{max_retries}): {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
-                    continue
-                else:
-                    set_stop_loading(True)
-                    spinner.join()
-                    return f"Error calling AI API after {max_retries} attempts: {e}"
-        set_stop_loading(True)
-        spinner.join()
-        output = response.choices[0].message.content.strip()
-
-        # Detect and run tool if model returned JSON
         try:
-            # strip markdown fences or any wrapping and extract JSON object
-            match = re.search(r"\{.*\}", output, re.DOTALL)
-            payload = match.group() if match else output
-            call = json.loads(payload)
-            name = call.get("tool")
-            args = call.get("args", {})
-            if name and hasattr(tools, name):
-                result = getattr(tools, name)(**args)
-                # Provide tool output back to model for final answer
-                messages.append({"role": "assistant", "content": output})
-                messages.append({"role": "function", "name": name, "content": result})
-                # Retry mechanism for follow-up API call
-                max_retries = 3
-                for attempt in range(max_retries):
-                    try:
-                        follow = self.initializer.client.chat.completions.create(
-                            model=self.model,
-                            messages=messages,
-                            max_tokens=generation_config.get("max_output_tokens", 2048),
-                            temperature=generation_config.get("temperature", 0.25),
-                            top_p=generation_config.get("top_p", 0.65),
-                        )
-                        break
-                    except openai.error.OpenAIError as e:
-                        logging.warning(f"Follow-up API request failed ({attempt+1}/{max_retries}): {e}")
-                        if attempt < max_retries - 1:
-                            time.sleep(2 ** attempt)
-                            continue
-                        else:
-                            return f"Error calling AI API after tool result: {e}"
-                final = follow.choices[0].message.content
-                print(final)
-                return final
-        except (json.JSONDecodeError, AttributeError):
-            pass
-        # Otherwise, just return model output
-        print(output)
+            response, answered_by = self._create_completion(messages, stream, max_retries)
+        except CircuitOpenError as e:
+            stop_spinner()
+            return f"Error calling AI API: {e}"
+        except openai.OpenAIError as e:
+            stop_spinner()
+            return f"Error calling AI API after {max_retries} attempts: {e}"
+        try:
+            output, printed, native_calls = self._read_response(
+                response, stream, on_first_chunk=stop_spinner
+            )
+        except (openai.OpenAIError, httpx.HTTPError) as e:
+            # The connection can also fail after the request went through, mid-stream
+            stop_spinner()
+            self.circuit(answered_by).record(e)
+            return f"Error reading AI response: {e}"
+        stop_spinner()  # Empty stream
+
+        # Run tool calls and hand their output back to the model, within the step budget
+        tool_calls = self.get_tool_calls(output, native_calls)
+        used_tools = bool(tool_calls)
+        rounds = 0
+        while tool_calls and rounds < self.initializer.max_tool_rounds:
+            rounds += 1
+            results = run_tool_calls(tool_calls, self.initializer.tool_workers)
+            self.append_tool_results(messages, output, tool_calls, results)
+            try:
+                follow, follow_by = self._create_completion(messages, stream, max_retries)
+            except (openai.OpenAIError, CircuitOpenError) as e:
+                return f"Error calling AI API after tool result: {e}"
+            try:
+                output, printed, native_calls = self._read_response(follow, stream)
+            except (openai.OpenAIError, httpx.HTTPError) as e:
+                self.circuit(follow_by).record(e)
+                return f"Error reading AI response after tool result: {e}"
+            tool_calls = self.get_tool_calls(output, native_calls)
+        if tool_calls:
+            print(
+                f"{Color.BRIGHTYELLOW}Stopped after {rounds} tool rounds (MaxToolRounds).{Color.ENDC}"
+            )
+
+        if not printed:
+            print(output)
+        # The key names the configured provider; a backup's answer is not cached under it
+        if cache_key and not used_tools and answered_by == self.ai_service:
+            self.response_cache.put(cache_key, output)
+        self.last_response_cacheable = not used_tools
+        self._record_turn_metrics(turn_start, first_token_at, stream)
         return output
 
+    def response_cache_key(self, messages):
+        """
+        Returns the response cache key for a request, or None if caching is off.
+
+        The key covers the provider, model, generation parameters and the
+        final message list.
+
+        Args:
+            messages (list): The messages about to be sent.
+
+        Returns:
+            str: The cache key, or None.
+        """
+        if not self.response_cache or self.bypass_cache:
+            return None
+        return ResponseCache.make_key(self.ai_service, self.completion_kwargs(messages))
+
+    def _read_stream(self, stream, on_first_chunk=None):
+        """
+        Prints a streamed completion as its chunks arrive and collects the full text.
+
+        Args:
+            stream: The iterator returned by `chat.completions.create(stream=True)`.
+            on_first_chunk (callable): Called once, when the first content chunk
+                arrives and before it is printed (it stops the spinner).
+
+        Returns:
+            tuple: The full response text, whether it was printed, and the native tool calls.
+        """
+        printer = StreamPrinter(hold_tool_json=not self.initializer.native_tools)
+        for chunk in stream:
+            if on_first_chunk and printer.has_payload(chunk):
+                on_first_chunk()
+                on_first_chunk = None
+            printer.feed_chunk(chunk)
+        return printer.finish()
+
+    def _record_turn_metrics(self, turn_start, first_token_at, streamed, cached=False):
+        """
+        Records time-to-first-token and total time for the current turn.
+
+        Args:
+            turn_start (float): `time.perf_counter()` value when the request was sent.
+            first_token_at (list): Holds the `perf_counter()` value of the first token, if any.
+            streamed (bool): Whether the response was streamed.
+            cached (bool): Whether the response came from the response cache.
+        """
+        total = time.perf_counter() - turn_start
+        ttft = first_token_at[0] - turn_start if first_token_at else None
+        self.turn_metrics.append(
+            {"ttft": ttft, "total": total, "streamed": streamed, "cached": cached}
+        )
+        logging.info(
+            f"Turn timing: model={self.model} streamed={streamed} cached={cached} "
+            f"ttft={'n/a' if ttft is None else f'{ttft:.3f}s'} total={total:.3f}s"
+        )
+
     def format_response_as_markdown(self, response_text):
         """
         Formats the response text using Markdown structure.
@@ -721,8 +1815,7 @@ and nothing else.
             Chat: The initialized chat session.
         """
         logging.debug("Initializing chat session")
-        self.chat_history = self.chat_history or []
-        logging.debug(f"Chat history: {self.chat_history}")
+        logging.debug(f"Chat history: {self.chat_history.to_list()}")
         chat = self.initializer.initialize_chat(self.chat_history)
         if chat is None:
             logging.error("Chat initialization returned None")
@@ -754,6 +1847,65 @@ and nothing else.
             print(f"{Color.BRIGHTRED}Error saving chat history: {e}{Color.ENDC}")
 
 
+def parse_args(argv=None):
+    """
+    Parses command line arguments.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="frea - freak robotic entity with amusement")
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="run the chat loop on the asyncio engine",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="answer the prompts of a JSONL file ('-' for stdin) without the REPL",
+    )
+    parser.add_argument(
+        "--output",
+        metavar="FILE",
+        help="write batch results to this JSONL file instead of stdout",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=ChatConfig.DEFAULT_BATCH_CONCURRENCY,
+        help=f"prompts answered at once in batch mode (default: {ChatConfig.DEFAULT_BATCH_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--resume",
+        nargs="?",
+        const="last",
+        metavar="SESSION",
+        help="continue a chat session (default: the last one) and load its last turns; "
+        "with --batch, continue an interrupted batch, skipping items already answered in --output",
+    )
+    parser.add_argument(
+        "--build-wiki-index",
+        action="store_true",
+        help="build the title index of the offline Wikipedia dump (WikiDump) and exit",
+    )
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    chat_app = AIChat()
-    chat_app.generate_chat()
+    args = parse_args()
+    if args.build_wiki_index:
+        ChatInitializer()  # Reads the dump settings from config.ini
+        sys.exit(wiki_client.build_offline_index())
+    elif args.batch:
+        from batch import run_batch
+
+        sys.exit(run_batch(args.batch, args.output, args.concurrency, bool(args.resume)))
+    elif args.use_async:
+        from async_chat import AsyncAIChat
+
+        AsyncAIChat(resume=args.resume).run()
+    else:
+        chat_app = AIChat(resume=args.resume)
+        chat_app.generate_chat()
@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import logging
+import threading
+
+# Metadata fields providers report on model objects, mapped to our names
+_METADATA_FIELDS = {
+    "context_window": "context_window",
+    "input_token_limit": "context_window",
+    "max_completion_tokens": "max_output_tokens",
+    "output_token_limit": "max_output_tokens",
+    "max_output_tokens": "max_output_tokens",
+    "owned_by": "owned_by",
+}
+
+
+def model_entry(model):
+    """
+    Converts a model object from `client.models.list()` into a catalogue entry.
+
+    Args:
+        model: The model object (it must have an `id`).
+
+    Returns:
+        dict: `{"id": ...}` plus whatever metadata the provider reported.
+    """
+    data = model.model_dump() if hasattr(model, "model_dump") else dict(vars(model))
+    entry = {"id": model.id}
+    for field, name in _METADATA_FIELDS.items():
+        if data.get(field) is not None and name not in entry:
+            entry[name] = data[field]
+    return entry
+
+
+class ModelCatalog:
+    """
+    On-disk catalogue of a provider's models with per-model metadata.
+
+    The menu is served from the cached file at once; when the file is older
+    than `ttl` it is refreshed on a background thread. Only when no catalogue
+    exists yet does a lookup wait for the provider.
+    """
+
+    def __init__(self, path, fetch, ttl=24 * 3600):
+        """
+        Args:
+            path (str): The JSON file holding the catalogue.
+            fetch (callable): Returns a list of catalogue entries from the provider.
+            ttl (float): Seconds before the catalogue is refreshed.
+        """
+        self.path = path
+        self.fetch = fetch
+        self.ttl = ttl
+        self._data = None
+        self._refreshing = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._data is None and os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable model catalogue {self.path}: {e}")
+        return self._data
+
+    def _save(self, entries):
+        data = {"fetched_at": time.time(), "models": entries}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp_path, self.path)  # Atomic, so readers never see a partial file
+        self._data = data
+
+    @property
+    def stale(self):
+        """True if the catalogue is missing or older than the TTL."""
+        data = self._load()
+        return data is None or time.time() - data.get("fetched_at", 0) > self.ttl
+
+    def refresh(self):
+        """
+        Fetches the model list from the provider and saves it.
+
+        Returns:
+            list: The catalogue entries.
+        """
+        entries = sorted(self.fetch(), key=lambda entry: entry["id"])
+        with self._lock:
+            self._save(entries)
+        return entries
+
+    def refresh_in_background(self):
+        """Starts a background refresh unless one is already running."""
+        with self._lock:
+            if self._refreshing is not None and self._refreshing.is_alive():
+                return
+            self._refreshing = threading.Thread(target=self._background_refresh, daemon=True)
+            self._refreshing.start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logging.warning(f"Background model catalogue refresh failed: {e}")
+
+    def entries(self):
+        """
+        Returns the catalogue entries, refreshing stale ones in the background.
+
+        Returns:
+            list: The entries; fetched synchronously only if nothing is cached.
+        """
+        data = self._load()
+        if data is None:
+            return self.refresh()
+        if self.stale:
+            self.refresh_in_background()
+        return data["models"]
+
+    def get(self, model):
+        """
+        Returns the cached metadata of a model without contacting the provider.
+
+        Args:
+            model (str): The model id, with or without a `models/` prefix.
+
+        Returns:
+            dict: The entry, or None if the model is not in the catalogue.
+        """
+        data = self._load()
+        if not data:
+            return None
+        name = model.split("/")[-1]
+        for entry in data["models"]:
+            if entry["id"] == model or entry["id"].split("/")[-1] == name:
+                return entry
+        return None
@@ -0,0 +1,315 @@
+import os
+import re
+import json
+import stat
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: limits are shared between threads, not processes
+    fcntl = None
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def default_state_dir():
+    """
+    Returns the host-wide folder for limiter state: shared memory where available,
+    so every frea process on the machine sees the same buckets. The folder is
+    shared by all users like /tmp; each state file belongs to one user.
+    """
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "frea-ratelimit")
+
+
+def state_path(state_dir, ai_service, api_key):
+    """
+    Returns the state file of a provider/key pair. The key itself is never
+    written anywhere; the file is named after a hash of it.
+    """
+    digest = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(state_dir, f"{ai_service}-{digest}.json")
+
+
+def parse_duration(value):
+    """
+    Parses a rate limit reset or Retry-After value into seconds.
+
+    Accepts plain seconds ("2", "0.5") and Go-style durations ("6ms", "7.66s", "2m59.56s").
+
+    Args:
+        value (str): The header value.
+
+    Returns:
+        float: Seconds, or None if the value is not understood.
+    """
+    value = (value or "").strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts or "".join(n + u for n, u in parts) != value:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+class RateLimiter:
+    """
+    Client-side token buckets for one provider/API key, one counting requests
+    per minute and one counting tokens per minute.
+
+    Bucket levels live in a small JSON file guarded by an exclusive file lock,
+    so all frea processes using the same key pace themselves together instead
+    of bursting into 429s. Limits can be configured; otherwise they are learned
+    from `x-ratelimit-*` response headers, and `Retry-After` pauses every
+    process until the provider accepts requests again. A limit of 0 means
+    unknown and is not enforced.
+
+    The state file is never followed through a symlink and must be a regular
+    file owned by the current user; otherwise the buckets are kept in this
+    process only.
+    """
+
+    def __init__(self, path, rpm=0, tpm=0, max_wait=120.0, shared_dir=False):
+        """
+        Args:
+            path (str): The shared state file.
+            rpm (int): Requests per minute; 0 to rely on learned limits.
+            tpm (int): Tokens per minute; 0 to rely on learned limits.
+            max_wait (float): Longest single pause, so a bogus header cannot stall frea.
+            shared_dir (bool): The file's folder is the host-wide default
+                (see `default_state_dir`), to be made writable by every user.
+        """
+        self.path = path
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_wait = max_wait
+        self.waited = 0.0  # Seconds this process spent waiting for the buckets
+        self._lock = threading.Lock()
+        self._local_state = None  # The buckets, when the state file cannot be used
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        if shared_dir:
+            try:
+                os.chmod(directory, 0o1777)  # Shared by every user, like /tmp
+            except OSError:
+                pass  # Created by another user, who made it shared
+
+    def _open_state(self):
+        """Opens the state file, or returns None if it is unsafe or unusable."""
+        if self._local_state is not None:
+            return None
+        reason = None
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT | getattr(os, "O_NOFOLLOW", 0), 0o600)
+        except OSError as e:  # Among others ELOOP: a symlink planted in the folder
+            reason = str(e)
+        else:
+            info = os.fstat(fd)
+            if not stat.S_ISREG(info.st_mode):
+                reason = "not a regular file"
+            elif hasattr(os, "getuid") and info.st_uid != os.getuid():
+                reason = f"owned by another user (uid {info.st_uid})"
+            if reason is None:
+                return fd
+            os.close(fd)
+        logging.warning(f"Rate limiter state {self.path} not used ({reason}); pacing this process only")
+        self._local_state = {}
+        return None
+
+    @contextmanager
+    def _state(self):
+        """Yields the shared state, locked, and writes it back afterwards."""
+        with self._lock:
+            fd = self._open_state()
+            if fd is None:
+                yield self._local_state
+                return
+            try:
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                raw = b""
+                while True:
+                    chunk = os.read(fd, 65536)
+                    if not chunk:
+                        break
+                    raw += chunk
+                try:
+                    state = json.loads(raw) if raw else {}
+                except ValueError:
+                    state = {}  # Torn or foreign file: start over
+                yield state
+                data = json.dumps(state).encode("utf-8")
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.write(fd, data)
+                os.ftruncate(fd, len(data))
+            finally:
+                os.close(fd)  # Also releases the flock
+
+    def _limits(self, state):
+        return self.rpm or state.get("learned_rpm", 0), self.tpm or state.get("learned_tpm", 0)
+
+    def _refill(self, state, now):
+        rpm, tpm = self._limits(state)
+        elapsed = max(0.0, now - state.get("updated", now))
+        state["requests"] = min(rpm, state.get("requests", rpm) + rpm * elapsed / 60)
+        state["tokens"] = min(tpm, state.get("tokens", tpm) + tpm * elapsed / 60)
+        state["updated"] = now
+        return rpm, tpm
+
+    def reserve(self, tokens):
+        """
+        Takes one request and `tokens` tokens from the buckets if both have room.
+
+        Args:
+            tokens (int): Estimated tokens of the request (prompt plus output).
+
+        Returns:
+            tuple: (seconds to wait before trying again, 0 if reserved;
+                    tokens taken from the bucket, 0 while the limit is unknown).
+        """
+        now = time.time()
+        with self._state() as state:
+            rpm, tpm = self._refill(state, now)
+            wait = state.get("blocked_until", 0) - now
+            if rpm and state["requests"] < 1:
+                wait = max(wait, (1 - state["requests"]) * 60 / rpm)
+            # A request larger than the bucket waits for a full bucket
+            needed = min(tokens, tpm)
+            if tpm and state["tokens"] < needed:
+                wait = max(wait, (needed - state["tokens"]) * 60 / tpm)
+            if wait > 0:
+                return min(wait, self.max_wait), 0
+            if rpm:
+                state["requests"] -= 1
+            if tpm:
+                state["tokens"] -= tokens
+            return 0.0, tokens if tpm else 0
+
+    def acquire(self, tokens):
+        """
+        Blocks until the request fits the limits, then reserves it.
+
+        Args:
+            tokens (int): Estimated tokens of the request.
+
+        Returns:
+            int: The tokens reserved, to pass to `settle`.
+        """
+        while True:
+            wait, reserved = self.reserve(tokens)
+            if not wait:
+                return reserved
+            logging.info(f"Rate limit: waiting {wait:.2f}s ({os.path.basename(self.path)})")
+            self.waited += wait
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens):
+        """Async variant of `acquire`; waits without blocking the event loop."""
+        import asyncio
+
+        while True:
+            wait, reserved = self.reserve(tokens)
+            if not wait:
+                return reserved
+            logging.info(f"Rate limit: waiting {wait:.2f}s ({os.path.basename(self.path)})")
+            self.waited += wait
+            await asyncio.sleep(wait)
+
+    def settle(self, reserved, used):
+        """
+        Corrects the token bucket once the real usage of a request is known.
+
+        Args:
+            reserved (int): Tokens reserved by `acquire`.
+            used (int): Tokens the request actually consumed.
+        """
+        if reserved == used:
+            return
+        with self._state() as state:
+            _, tpm = self._refill(state, time.time())
+            if tpm:
+                state["tokens"] = min(tpm, state["tokens"] + reserved - used)
+
+    def observe(self, headers):
+        """
+        Learns from the rate limit headers of a response (including 429s).
+
+        Args:
+            headers (Mapping): The HTTP response headers (case-insensitive).
+        """
+        def number(name):
+            try:
+                return float(headers.get(name))
+            except (TypeError, ValueError):
+                return None
+
+        retry_after = number("retry-after-ms")
+        retry_after = retry_after / 1000 if retry_after is not None else parse_duration(
+            headers.get("retry-after")
+        )
+        limit_requests = number("x-ratelimit-limit-requests")
+        limit_tokens = number("x-ratelimit-limit-tokens")
+        remaining_requests = number("x-ratelimit-remaining-requests")
+        remaining_tokens = number("x-ratelimit-remaining-tokens")
+        if all(
+            value is None
+            for value in (retry_after, limit_tokens, remaining_requests, remaining_tokens)
+        ):
+            return
+
+        now = time.time()
+        with self._state() as state:
+            rpm, tpm = self._refill(state, now)
+            if limit_tokens:
+                state["learned_tpm"] = limit_tokens
+            if limit_requests and state.get("learned_rpm") is None:
+                # Some providers report a daily request limit here; it is only
+                # used as an upper bound until a per-minute limit is configured
+                state["learned_rpm"] = limit_requests
+            new_rpm, new_tpm = self._limits(state)
+            # A limit learned just now starts with a full bucket (the remaining
+            # headers below correct it)
+            if new_rpm and not rpm:
+                state["requests"] = new_rpm
+            if new_tpm and not tpm:
+                state["tokens"] = new_tpm
+            blocked_until = state.get("blocked_until", 0)
+            if retry_after is not None:
+                blocked_until = max(blocked_until, now + min(retry_after, self.max_wait))
+            if remaining_tokens is not None:
+                state["tokens"] = min(state["tokens"], remaining_tokens)
+                reset = parse_duration(headers.get("x-ratelimit-reset-tokens"))
+                if remaining_tokens <= 0 and reset:
+                    blocked_until = max(blocked_until, now + min(reset, self.max_wait))
+            if remaining_requests is not None:
+                state["requests"] = min(state["requests"], remaining_requests)
+                reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+                if remaining_requests <= 0 and reset:
+                    blocked_until = max(blocked_until, now + min(reset, self.max_wait))
+            state["blocked_until"] = blocked_until
+
+    def stats(self):
+        """
+        Returns the current limits and bucket levels.
+
+        Returns:
+            dict: Effective RPM/TPM limits, available requests/tokens and seconds waited.
+        """
+        with self._state() as state:
+            rpm, tpm = self._refill(state, time.time())
+            return {
+                "rpm": rpm,
+                "tpm": tpm,
+                "requests": state["requests"],
+                "tokens": state["tokens"],
+                "blocked_for": max(0.0, state.get("blocked_until", 0) - time.time()),
+                "waited": self.waited,
+            }
@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+
+class ResponseCache:
+    """
+    On-disk cache of model responses keyed by a hash of the full request.
+
+    Entries live in a SQLite database in WAL mode, so several frea processes
+    on one host can read and write it at the same time. The cache is bounded
+    by total size and entry age; when it grows too large the least recently
+    used entries are evicted. Hit and miss counters are kept in the database
+    (shared by all processes) and per process.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS entries (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        last_access REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+    CREATE TABLE IF NOT EXISTS counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    );
+    """
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, ttl=7 * 24 * 3600):
+        """
+        Args:
+            path (str): The SQLite database file.
+            max_bytes (int): The maximum total size of cached responses.
+            ttl (float): Seconds before an entry expires; 0 keeps entries until evicted.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+
+    @staticmethod
+    def make_key(provider, request):
+        """
+        Hashes a request into a cache key.
+
+        Args:
+            provider (str): The AI service name.
+            request (dict): The `chat.completions.create` arguments (model, parameters, messages).
+
+        Returns:
+            str: The hex digest identifying the request.
+        """
+        request = {k: v for k, v in request.items() if k != "stream"}
+        payload = json.dumps([provider, request], sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _count(self, name):
+        self._conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def get(self, key):
+        """
+        Looks up a cached response.
+
+        Args:
+            key (str): The key from `make_key`.
+
+        Returns:
+            str: The cached response, or None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT value, created_at FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+                if row and self.ttl and now - row[1] > self.ttl:
+                    self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    row = None
+                if row:
+                    self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+                    self._count("hits")
+                    self.hits += 1
+                    return row[0]
+                self._count("misses")
+                self.misses += 1
+            except sqlite3.Error as e:
+                logging.warning(f"Response cache lookup failed: {e}")
+        return None
+
+    def put(self, key, value):
+        """
+        Stores a response and evicts expired and least recently used entries.
+
+        Args:
+            key (str): The key from `make_key`.
+            value (str): The response text.
+        """
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO entries (key, value, size, created_at, last_access) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (key, value, size, now, now),
+                    )
+                    self._evict(now)
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            except sqlite3.Error as e:
+                logging.warning(f"Response cache store failed: {e}")
+
+    def _evict(self, now):
+        if self.ttl:
+            self._conn.execute("DELETE FROM entries WHERE created_at < ?", (now - self.ttl,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        while total > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM entries ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def stats(self):
+        """
+        Returns cache statistics.
+
+        Returns:
+            dict: Entry count and size, plus hit/miss counters for this process
+                  (`hits`, `misses`) and for all processes (`total_hits`, `total_misses`).
+        """
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            counters = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "total_hits": counters.get("hits", 0),
+            "total_misses": counters.get("misses", 0),
+        }
+
+    def close(self):
+        """Closes the database connection."""
+        with self._lock:
+            self._conn.close()
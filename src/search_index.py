@@ -0,0 +1,429 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+from grep_engine import BINARY_SNIFF, get_pool, iter_files, reset_pool
+
+# Files larger than this, or with more distinct trigrams, are not indexed;
+# they stay candidates for every search
+MAX_FILE_BYTES = 16 << 20
+MAX_FILE_TRIGRAMS = 50000
+# Changed files are indexed by the worker processes when there are at least this many
+PARALLEL_THRESHOLD = 64
+BATCH_FILES = 64
+# Trigrams of one literal looked up at once
+MAX_QUERY_TRIGRAMS = 16
+
+INDEXED = "indexed"
+BINARY = "binary"
+SKIPPED = "skipped"  # Too large, too varied, or over the index size limit
+
+_active = None
+
+
+def activate(index):
+    """Makes `index` (or None) the index `grep` consults."""
+    global _active
+    _active = index
+
+
+def index_for(path):
+    """
+    Returns the active index if it covers `path`.
+
+    Args:
+        path (str): The folder or file about to be searched.
+
+    Returns:
+        TrigramIndex: The index, or None.
+    """
+    index = _active
+    if index is None:
+        return None
+    relative = os.path.relpath(os.path.abspath(path), index.root)
+    if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+        return None
+    return index
+
+
+def trigrams(data):
+    """Returns the distinct byte trigrams of `data`, case-folded (ASCII), as integers."""
+    data = data.lower()
+    grams = {data[i:i + 3] for i in range(len(data) - 2)}
+    return {int.from_bytes(gram, "big") for gram in grams}
+
+
+def _sequence_query(items):
+    """Builds the trigram query of a parsed regex sequence (see `regex_query`)."""
+    parts = []
+    run = bytearray()
+
+    def flush():
+        if len(run) >= 3:
+            parts.append(("all", frozenset(trigrams(bytes(run)))))
+        run.clear()
+
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            run.append(av)
+            continue
+        flush()
+        query = None
+        if op is sre_parse.SUBPATTERN:
+            query = _sequence_query(av[-1])
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) or op.name == "POSSESSIVE_REPEAT":
+            low, _, body = av
+            if low >= 1:  # The body occurs at least once
+                query = _sequence_query(body)
+        elif op.name == "ATOMIC_GROUP":
+            query = _sequence_query(av)
+        elif op is sre_parse.BRANCH:
+            alternatives = [_sequence_query(branch) for branch in av[1]]
+            if all(alternative is not None for alternative in alternatives):
+                query = ("any", alternatives)
+        if query is not None:
+            parts.append(query)
+    flush()
+    if not parts:
+        return None
+    return parts[0] if len(parts) == 1 else ("and", parts)
+
+
+def regex_query(pattern, flags=0):
+    """
+    Derives the trigrams a file must contain to possibly match a regex.
+
+    Literal runs of three or more characters become required trigrams,
+    alternations become "any of", and everything else (classes, optional
+    parts, wildcards) adds no requirement, so the query can only
+    over-approximate the matching files, never miss one.
+
+    Args:
+        pattern (bytes): The regex, as given to `grep_engine.iter_grep`.
+        flags (int): The regex flags.
+
+    Returns:
+        tuple: ("all", trigrams) / ("and", queries) / ("any", queries),
+               or None when every file is a candidate.
+    """
+    try:
+        return _sequence_query(sre_parse.parse(pattern, flags))
+    except Exception as e:  # Unknown constructs: no filtering
+        logging.debug(f"Search index: cannot plan {pattern!r}: {e}")
+        return None
+
+
+def _index_file(path):
+    """Reads one file and returns (state, trigrams)."""
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size > MAX_FILE_BYTES:
+                return SKIPPED, ()
+            data = f.read()
+    except OSError:
+        return SKIPPED, ()
+    if b"\0" in data[:BINARY_SNIFF]:
+        return BINARY, ()
+    grams = trigrams(data)
+    if len(grams) > MAX_FILE_TRIGRAMS:
+        return SKIPPED, ()
+    return INDEXED, sorted(grams)
+
+
+def _index_files(paths):
+    """Worker entry point: indexes a batch of files."""
+    return [_index_file(path) for path in paths]
+
+
+class TrigramIndex:
+    """
+    Persistent trigram index of the files under a workspace root.
+
+    Before a search, the files under the searched path are compared with
+    the index by modification time and size, and only changed files are
+    re-read. The regex is then turned into required trigrams, and only
+    files containing them (plus files too large to index) are searched.
+    The index lives in a SQLite database in WAL mode, shared by every frea
+    process using the same root, and stops growing at `max_bytes`: files
+    beyond the limit are simply always searched.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS files (
+        id INTEGER PRIMARY KEY,
+        path TEXT NOT NULL UNIQUE,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        state TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS postings (
+        trigram INTEGER NOT NULL,
+        file_id INTEGER NOT NULL,
+        PRIMARY KEY (trigram, file_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS postings_file ON postings (file_id);
+    """
+
+    def __init__(self, root, path, max_bytes=200 * 1024 * 1024):
+        """
+        Args:
+            root (str): The workspace folder covered by the index.
+            path (str): The SQLite database file.
+            max_bytes (int): The maximum size of the database.
+        """
+        self.root = os.path.abspath(root)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.last_search = None  # Stats of the last search, for `status`
+        # The database may live inside the root; never index it
+        own = self._key(path)
+        self._own_keys = {own + suffix for suffix in ("", "-wal", "-shm", "-journal")}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+
+    def _key(self, path):
+        return os.path.relpath(os.path.abspath(path), self.root).replace(os.sep, "/")
+
+    def _walk(self, path):
+        """
+        Walks `path` like grep does.
+
+        Returns:
+            dict: {path: (key relative to the root, size, mtime_ns)}, in walk order.
+        """
+        base = self._key(path)
+        walked = {}
+        for file_path, size, mtime_ns in iter_files(path):
+            # Walked paths extend `path`, so their keys extend its key (no relpath per file)
+            tail = file_path[len(path):].lstrip(os.sep).replace(os.sep, "/")
+            key = tail if base == "." else f"{base}/{tail}" if tail else base
+            if key not in self._own_keys:
+                walked[file_path] = (key, size, mtime_ns)
+        return walked
+
+    def _known(self, prefix):
+        """Returns {relative path: (id, size, mtime_ns, state)} under a relative prefix."""
+        if prefix == ".":
+            rows = self._conn.execute("SELECT path, id, size, mtime_ns, state FROM files")
+        else:
+            # "0" sorts right after "/", so this is every path below the prefix folder
+            rows = self._conn.execute(
+                "SELECT path, id, size, mtime_ns, state FROM files "
+                "WHERE path = ? OR (path >= ? AND path < ?)",
+                (prefix, prefix + "/", prefix + "0"),
+            )
+        return {row[0]: row[1:] for row in rows}
+
+    def _used_bytes(self):
+        page_size = self._conn.execute("PRAGMA page_size").fetchone()[0]
+        pages = self._conn.execute("PRAGMA page_count").fetchone()[0]
+        free = self._conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return (pages - free) * page_size
+
+    def _read_changed(self, paths):
+        """Indexes changed files, on the worker processes when there are many."""
+        batches = [paths[i:i + BATCH_FILES] for i in range(0, len(paths), BATCH_FILES)]
+        if len(paths) < PARALLEL_THRESHOLD:
+            for batch in batches:
+                yield batch, _index_files(batch)
+            return
+        try:
+            pool = get_pool()
+            for batch, results in zip(batches, pool.map(_index_files, batches)):
+                yield batch, results
+        except Exception as e:
+            logging.warning(f"Search index: worker processes unavailable ({e}); indexing in-process")
+            reset_pool()
+            for batch in batches:
+                yield batch, _index_files(batch)
+
+    def _store(self, changed, known, walked):
+        """Writes the state and trigrams of changed files."""
+        full = self._used_bytes() >= self.max_bytes
+        for batch, results in self._read_changed(changed):
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for path, (state, grams) in zip(batch, results):
+                    key = walked[path][0]
+                    if key in known:
+                        self._conn.execute("DELETE FROM postings WHERE file_id = ?", (known[key][0],))
+                    if state == INDEXED and full:
+                        state, grams = SKIPPED, ()
+                    _, size, mtime_ns = walked[path]
+                    if key in known:
+                        file_id = known[key][0]
+                        self._conn.execute(
+                            "UPDATE files SET size = ?, mtime_ns = ?, state = ? WHERE id = ?",
+                            (size, mtime_ns, state, file_id),
+                        )
+                    else:
+                        file_id = self._conn.execute(
+                            "INSERT INTO files (path, size, mtime_ns, state) VALUES (?, ?, ?, ?)",
+                            (key, size, mtime_ns, state),
+                        ).lastrowid
+                    known[key] = (file_id, size, mtime_ns, state)
+                    self._conn.executemany(
+                        "INSERT INTO postings (trigram, file_id) VALUES (?, ?)",
+                        ((gram, file_id) for gram in grams),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            full = full or self._used_bytes() >= self.max_bytes
+
+    def refresh(self, path):
+        """
+        Brings the index up to date for the files under `path`.
+
+        Args:
+            path (str): A folder or file inside the root.
+
+        Returns:
+            tuple: The walked files ({path: (key, size, mtime_ns)}), their index
+                   rows ({key: (id, size, mtime_ns, state)}) and the number of
+                   files (re)indexed.
+        """
+        walked = self._walk(path)
+        known = self._known(self._key(path))
+        changed = [
+            file_path
+            for file_path, (key, size, mtime_ns) in walked.items()
+            if key not in known or known[key][1:3] != (size, mtime_ns)
+        ]
+        removed = set(known) - {key for key, _, _ in walked.values()}
+        if removed:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for key in removed:
+                    file_id = known.pop(key)[0]
+                    self._conn.execute("DELETE FROM postings WHERE file_id = ?", (file_id,))
+                    self._conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if changed:
+            self._store(changed, known, walked)
+        return walked, known, len(changed)
+
+    def update(self, path=None):
+        """
+        Brings the index up to date without searching.
+
+        Args:
+            path (str): The folder to update; None for the whole root.
+
+        Returns:
+            int: The number of files (re)indexed.
+        """
+        with self._lock:
+            return self.refresh(path or self.root)[2]
+
+    def _matching(self, query):
+        """Returns the ids of indexed files satisfying a query, or None for all files."""
+        if query is None:
+            return None
+        kind, value = query
+        if kind == "all":
+            # Any subset still over-approximates; keep the statement small
+            grams = sorted(value)[:MAX_QUERY_TRIGRAMS]
+            marks = ",".join("?" * len(grams))
+            return {
+                row[0]
+                for row in self._conn.execute(
+                    f"SELECT file_id FROM postings WHERE trigram IN ({marks}) "
+                    f"GROUP BY file_id HAVING COUNT(*) = ?",
+                    grams + [len(grams)],
+                )
+            }
+        results = [self._matching(part) for part in value]
+        if kind == "any":
+            if any(result is None for result in results):
+                return None
+            return set().union(*results)
+        results = [result for result in results if result is not None]
+        if not results:
+            return None
+        return set.intersection(*sorted(results, key=len))
+
+    def candidates(self, pattern, flags, path):
+        """
+        Updates the index and returns the files under `path` that may match.
+
+        Args:
+            pattern (bytes): The regex.
+            flags (int): The regex flags.
+            path (str): The folder or file to search.
+
+        Returns:
+            list: (path, size, mtime_ns) of the files to search, in walk order.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            walked, known, changed = self.refresh(path)
+            matching = self._matching(regex_query(pattern, flags))
+        selected = []
+        for file_path, (key, size, mtime_ns) in walked.items():
+            file_id, _, _, state = known[key]
+            if state == SKIPPED or (
+                state == INDEXED and (matching is None or file_id in matching)
+            ):
+                selected.append((file_path, size, mtime_ns))
+        self.last_search = {
+            "files": len(walked),
+            "candidates": len(selected),
+            "reindexed": changed,
+            "seconds": time.perf_counter() - start,
+        }
+        return selected
+
+    def clear(self):
+        """Drops every entry; the next search rebuilds the index."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM postings")
+                self._conn.execute("DELETE FROM files")
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("VACUUM")
+
+    def status(self):
+        """
+        Returns the index statistics.
+
+        Returns:
+            dict: Root, file counts per state, database size and the last search.
+        """
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT state, COUNT(*) FROM files GROUP BY state"))
+            used = self._used_bytes()
+        return {
+            "root": self.root,
+            "path": self.path,
+            "indexed": counts.get(INDEXED, 0),
+            "binary": counts.get(BINARY, 0),
+            "skipped": counts.get(SKIPPED, 0),
+            "bytes": used,
+            "max_bytes": self.max_bytes,
+            "last_search": self.last_search,
+        }
+
+    def close(self):
+        """Closes the database connection."""
+        with self._lock:
+            self._conn.close()
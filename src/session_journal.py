@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import struct
+import logging
+import threading
+import itertools
+
+JOURNAL_SUFFIX = ".jsonl"
+INDEX_SUFFIX = ".idx"
+# An index entry: the byte offset in the journal where a turn (a user message) starts
+INDEX_ENTRY = struct.Struct("<Q")
+SYNC_INTERVAL = 1.0  # Seconds before written messages are fsynced, at most
+READ_SIZE = 64 * 1024
+
+_session_numbers = itertools.count()  # Sessions started by this process
+
+
+def new_session_id():
+    """A session name from the start time, unique per process and per session in it."""
+    number = next(_session_numbers)
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}" + (f"-{number}" if number else "")
+
+
+def latest_session(folder):
+    """
+    Returns the most recently written session in a folder.
+
+    Args:
+        folder (str): The sessions folder.
+
+    Returns:
+        str: The session name, or None if there are no sessions.
+    """
+    try:
+        names = [name for name in os.listdir(folder) if name.endswith(JOURNAL_SUFFIX)]
+    except FileNotFoundError:
+        return None
+    if not names:
+        return None
+    newest = max(names, key=lambda name: os.path.getmtime(os.path.join(folder, name)))
+    return newest[: -len(JOURNAL_SUFFIX)]
+
+
+class SessionJournal:
+    """
+    Append-only JSONL journal of a chat session, with a sidecar turn index.
+
+    Each message is written to `<session>.jsonl` as one JSON line and flushed
+    when it is appended, so a crash or Ctrl+C loses nothing written before
+    it; a background thread fsyncs the writes in batches, at most
+    `sync_interval` seconds later. The sidecar `<session>.idx` holds the
+    byte offset of every turn (every user message) in 8 bytes, so the last N
+    turns of a session of any size are found by reading 8 bytes and parsing
+    only those turns.
+
+    The files are created with the first message. A torn last line (from a
+    crash mid-write) and index entries missing or past the end of the
+    journal are repaired when the session is opened again.
+    """
+
+    def __init__(self, folder, session=None, sync_interval=SYNC_INTERVAL):
+        """
+        Args:
+            folder (str): The sessions folder.
+            session (str): The session to continue; None starts a new one.
+            sync_interval (float): Seconds before written messages are fsynced.
+        """
+        self.folder = folder
+        self.session = session or new_session_id()
+        self.path = os.path.join(folder, self.session + JOURNAL_SUFFIX)
+        self.index_path = os.path.join(folder, self.session + INDEX_SUFFIX)
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._journal = None
+        self._index = None
+        self._dirty = False
+        self._closed = threading.Event()
+        self.appended = 0  # Messages written since the journal was opened
+
+    def exists(self):
+        """True if the session has been written to."""
+        return os.path.exists(self.path)
+
+    def _open(self):
+        """Opens (and if need be repairs) the journal and index for appending; under the lock."""
+        os.makedirs(self.folder, exist_ok=True)
+        journal = open(self.path, "ab")
+        index = open(self.index_path, "ab")
+        try:
+            self._repair(journal, index)
+        except BaseException:
+            journal.close()
+            index.close()
+            raise
+        self._journal, self._index = journal, index
+        threading.Thread(target=self._sync_loop, name="frea-journal", daemon=True).start()
+
+    def _repair(self, journal, index):
+        """Cuts a torn last line off the journal and brings the index in line with it."""
+        size = journal.seek(0, os.SEEK_END)
+        end = self._last_newline(size) + 1
+        if end < size:
+            logging.warning(f"Session journal {self.path}: dropped a torn record of {size - end} bytes")
+            journal.truncate(end)
+            journal.seek(end)
+            size = end
+        entries = index.seek(0, os.SEEK_END) // INDEX_ENTRY.size
+        # Entries past the journal (its torn tail) are dropped
+        while entries and self._read_offsets(entries - 1, entries)[0] >= size:
+            entries -= 1
+        offsets = self._read_offsets(entries - 1, entries) if entries else []
+        index.truncate(entries * INDEX_ENTRY.size)
+        index.seek(entries * INDEX_ENTRY.size)
+        # Turns written after the index's last entry (a crash between the two writes)
+        scan_from = offsets[-1] if offsets else 0
+        with open(self.path, "rb") as f:
+            f.seek(scan_from)
+            offset = scan_from
+            for line in f:
+                if offset != scan_from or not offsets:
+                    if self._is_turn(line):
+                        index.write(INDEX_ENTRY.pack(offset))
+                offset += len(line)
+        index.flush()
+
+    def _last_newline(self, size):
+        """The offset of the last newline in the journal, or -1."""
+        with open(self.path, "rb") as f:
+            end = size
+            while end > 0:
+                start = max(0, end - READ_SIZE)
+                f.seek(start)
+                found = f.read(end - start).rfind(b"\n")
+                if found >= 0:
+                    return start + found
+                end = start
+        return -1
+
+    def _read_offsets(self, first, last):
+        """Returns index entries first..last-1."""
+        if last <= first:
+            return []
+        with open(self.index_path, "rb") as f:
+            f.seek(first * INDEX_ENTRY.size)
+            data = f.read((last - first) * INDEX_ENTRY.size)
+        return [entry[0] for entry in INDEX_ENTRY.iter_unpack(data)]
+
+    @staticmethod
+    def _is_turn(line):
+        try:
+            return json.loads(line).get("role") == "user"
+        except (ValueError, AttributeError):
+            return False
+
+    def append(self, message):
+        """
+        Writes a message to the journal.
+
+        Args:
+            message (dict): The chat message.
+        """
+        line = json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n"
+        with self._lock:
+            if self._closed.is_set():
+                return
+            try:
+                if self._journal is None:
+                    self._open()
+                offset = self._journal.tell()
+                self._journal.write(line)
+                self._journal.flush()  # Into the OS: safe from a crash of frea itself
+                if message.get("role") == "user":
+                    self._index.write(INDEX_ENTRY.pack(offset))
+                    self._index.flush()
+                self._dirty = True
+                self.appended += 1
+            except OSError as e:
+                logging.error(f"Could not write session journal {self.path}: {e}")
+
+    def _sync_loop(self):
+        while not self._closed.wait(self.sync_interval):
+            self.sync()
+
+    def sync(self):
+        """Forces written messages to disk."""
+        with self._lock:
+            if not self._dirty or self._journal is None:
+                return
+            try:
+                os.fsync(self._journal.fileno())
+                os.fsync(self._index.fileno())
+                self._dirty = False
+            except OSError as e:
+                logging.error(f"Could not sync session journal {self.path}: {e}")
+
+    def last_turns(self, turns):
+        """
+        Reads the last turns of the session.
+
+        Args:
+            turns (int): The number of turns (user messages and their replies).
+
+        Returns:
+            list: The messages, oldest first. A last user message that got
+                  no reply is left out.
+
+        Raises:
+            FileNotFoundError: If the session does not exist.
+        """
+        if not self.exists():
+            raise FileNotFoundError(f"no session {self.session!r} in {self.folder}")
+        with self._lock:
+            if self._journal is None:
+                self._open()  # Repairs the files before they are read
+            self._journal.flush()
+            entries = os.path.getsize(self.index_path) // INDEX_ENTRY.size
+            offsets = self._read_offsets(max(0, entries - turns), entries) if turns > 0 else []
+        if not offsets:
+            return []
+        messages = []
+        with open(self.path, "rb") as f:
+            f.seek(offsets[0])
+            for line in f:
+                try:
+                    messages.append(json.loads(line))
+                except ValueError:
+                    logging.warning(f"Session journal {self.path}: skipped an unreadable record")
+        if messages and messages[-1].get("role") == "user":
+            messages.pop()
+        return messages
+
+    def close(self):
+        """Syncs and closes the journal."""
+        self.sync()
+        with self._lock:
+            self._closed.set()
+            for f in (self._journal, self._index):
+                if f is not None:
+                    f.close()
+            self._journal = self._index = None
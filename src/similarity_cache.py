@@ -0,0 +1,260 @@
+import os
+import re
+import time
+import struct
+import sqlite3
+import hashlib
+import logging
+import threading
+
+_SPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCT_RE = re.compile(r"[\s?!.。？！]+$")
+
+
+def normalize_prompt(text):
+    """
+    Normalizes a prompt so trivial variations compare equal.
+
+    Lowercases, collapses whitespace and drops trailing punctuation.
+
+    Args:
+        text (str): The prompt.
+
+    Returns:
+        str: The normalized prompt.
+    """
+    text = _SPACE_RE.sub(" ", text.lower()).strip()
+    return _TRAILING_PUNCT_RE.sub("", text)
+
+
+def _stable_hash(data):
+    return int.from_bytes(hashlib.blake2b(data.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class MinHasher:
+    """
+    MinHash signatures over character shingles.
+
+    Signatures are deterministic across processes, so they can be stored on
+    disk and compared with signatures computed later.
+    """
+
+    def __init__(self, num_perm=64, shingle_size=3, seed=1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        # One random 64-bit XOR mask per permutation, derived from a fixed seed
+        self._masks = [
+            struct.unpack("<Q", hashlib.blake2b(f"{seed}:{i}".encode(), digest_size=8).digest())[0]
+            for i in range(num_perm)
+        ]
+
+    def shingles(self, text):
+        """Returns the set of character shingles of a (normalized) text."""
+        k = self.shingle_size
+        if len(text) <= k:
+            return {text}
+        return {text[i:i + k] for i in range(len(text) - k + 1)}
+
+    def signature(self, text):
+        """
+        Computes the MinHash signature of a normalized text.
+
+        Args:
+            text (str): The normalized text.
+
+        Returns:
+            tuple: `num_perm` 64-bit integers.
+        """
+        hashes = [_stable_hash(s) for s in self.shingles(text)]
+        return tuple(min([h ^ mask for h in hashes]) for mask in self._masks)
+
+    @staticmethod
+    def similarity(sig_a, sig_b):
+        """Estimates the Jaccard similarity of two signatures."""
+        return sum(x == y for x, y in zip(sig_a, sig_b)) / len(sig_a)
+
+
+class SimilarityCache:
+    """
+    Cache of answers to near-identical prompts, backed by a banded LSH index.
+
+    Each namespace (provider, model and system instruction) has its own index.
+    A prompt's MinHash signature is split into bands; prompts sharing any band
+    are candidates, and a candidate is a hit when its estimated similarity
+    reaches `threshold`. Entries are persisted in SQLite and loaded into
+    memory on first use of a namespace, so lookups are dictionary probes and
+    need no network or embedding service.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS prompts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        namespace TEXT NOT NULL,
+        prompt TEXT NOT NULL,
+        signature BLOB NOT NULL,
+        response TEXT NOT NULL,
+        created_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS prompts_namespace ON prompts (namespace);
+    """
+
+    def __init__(
+        self, path, threshold=0.85, num_perm=64, bands=16, max_entries=5000, min_length=12,
+        max_length=1000,
+    ):
+        """
+        Args:
+            path (str): The SQLite database file.
+            threshold (float): Minimum estimated Jaccard similarity for a hit.
+            num_perm (int): MinHash signature length.
+            bands (int): Number of LSH bands; `num_perm` must be divisible by it.
+            max_entries (int): Entries kept per namespace; the oldest are evicted.
+            min_length (int): Shorter (normalized) prompts are never cached.
+            max_length (int): Longer (normalized) prompts are never cached; they
+                are usually pasted content, and shingling them is slow.
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.path = path
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        self.min_length = min_length
+        self.max_length = max_length
+        self.hasher = MinHasher(num_perm)
+        self.hits = 0
+        self.misses = 0
+        self._indexes = {}  # namespace -> (exact, buckets, entries)
+        self._evicted = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+
+    @staticmethod
+    def namespace(provider, model, instruction):
+        """
+        Returns the namespace for a provider, model and system instruction.
+        """
+        return hashlib.sha256(f"{provider}\0{model}\0{instruction}".encode("utf-8")).hexdigest()
+
+    def _band_keys(self, signature):
+        r = self.rows
+        return [(i, signature[i * r:(i + 1) * r]) for i in range(self.bands)]
+
+    def _index(self, namespace):
+        index = self._indexes.get(namespace)
+        if index is None:
+            index = ({}, {}, {})
+            self._indexes[namespace] = index
+            rows = self._conn.execute(
+                "SELECT id, prompt, signature, response FROM prompts WHERE namespace = ? ORDER BY id",
+                (namespace,),
+            ).fetchall()
+            for entry_id, prompt, blob, response in rows:
+                signature = struct.unpack(f"<{len(blob) // 8}Q", blob)
+                self._add_to_index(index, entry_id, prompt, signature, response)
+        return index
+
+    def _add_to_index(self, index, entry_id, prompt, signature, response):
+        exact, buckets, entries = index
+        exact[prompt] = entry_id
+        entries[entry_id] = (prompt, signature, response)
+        for key in self._band_keys(signature):
+            buckets.setdefault(key, []).append(entry_id)
+
+    def lookup(self, namespace, prompt):
+        """
+        Finds a cached answer to a near-identical prompt.
+
+        Args:
+            namespace (str): The namespace from `namespace()`.
+            prompt (str): The user prompt.
+
+        Returns:
+            str: The cached response, or None.
+        """
+        normalized = normalize_prompt(prompt)
+        if not self.min_length <= len(normalized) <= self.max_length:
+            return None
+        with self._lock:
+            exact, buckets, entries = self._index(namespace)
+            entry_id = exact.get(normalized)
+            if entry_id is not None:
+                self.hits += 1
+                return entries[entry_id][2]
+
+            signature = self.hasher.signature(normalized)
+            best, best_score = None, self.threshold
+            seen = set()
+            for key in self._band_keys(signature):
+                for candidate in buckets.get(key, ()):
+                    if candidate in seen or candidate not in entries:
+                        continue
+                    seen.add(candidate)
+                    score = MinHasher.similarity(signature, entries[candidate][1])
+                    if score >= best_score:
+                        best, best_score = candidate, score
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            logging.info(f"Similarity cache hit (estimated similarity {best_score:.2f})")
+            return entries[best][2]
+
+    def add(self, namespace, prompt, response):
+        """
+        Stores the answer to a prompt.
+
+        Args:
+            namespace (str): The namespace from `namespace()`.
+            prompt (str): The user prompt.
+            response (str): The model's answer.
+        """
+        normalized = normalize_prompt(prompt)
+        if not self.min_length <= len(normalized) <= self.max_length:
+            return
+        signature = self.hasher.signature(normalized)
+        blob = struct.pack(f"<{len(signature)}Q", *signature)
+        with self._lock:
+            index = self._index(namespace)
+            if normalized in index[0]:
+                return
+            try:
+                cursor = self._conn.execute(
+                    "INSERT INTO prompts (namespace, prompt, signature, response, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (namespace, normalized, blob, response, time.time()),
+                )
+                self._add_to_index(index, cursor.lastrowid, normalized, signature, response)
+                self._evict(namespace, index)
+            except sqlite3.Error as e:
+                logging.warning(f"Similarity cache store failed: {e}")
+
+    def _evict(self, namespace, index):
+        exact, buckets, entries = index
+        excess = len(entries) - self.max_entries
+        if excess <= 0:
+            return
+        # Entry ids increase with insertion time, so the smallest ids are the oldest
+        for entry_id in sorted(entries)[:excess]:
+            prompt = entries.pop(entry_id)[0]
+            exact.pop(prompt, None)
+            self._conn.execute("DELETE FROM prompts WHERE id = ?", (entry_id,))
+        # Bucket lists skip evicted ids lazily; compact them once in a while
+        self._evicted += excess
+        if self._evicted >= 256:
+            self._evicted = 0
+            for key in list(buckets):
+                alive = [i for i in buckets[key] if i in entries]
+                if alive:
+                    buckets[key] = alive
+                else:
+                    del buckets[key]
+
+    def close(self):
+        """Closes the database connection."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,135 @@
+import re
+import logging
+from functools import lru_cache
+
+# Context window sizes (in tokens) by model name prefix. Longest matching prefix wins.
+MODEL_CONTEXT_WINDOWS = {
+    "gemini-1.5-pro": 2_097_152,
+    "gemini-1.5": 1_048_576,
+    "gemini-2": 1_048_576,
+    "gemini-1.0": 32_768,
+    "gemini-pro": 32_768,
+    "gemma": 8_192,
+    "llama3-8b-8192": 8_192,
+    "llama3-70b-8192": 8_192,
+    "llama-3.1": 131_072,
+    "llama-3.2": 131_072,
+    "llama-3.3": 131_072,
+    "llama-guard": 8_192,
+    "mixtral-8x7b-32768": 32_768,
+    "deepseek-r1": 131_072,
+    "qwen": 131_072,
+}
+DEFAULT_CONTEXT_WINDOW = 8_192
+
+# Tokens the API adds around every message (role markers, separators)
+MESSAGE_OVERHEAD = 4
+
+# Providers whose models use a BPE vocabulary close to tiktoken's cl100k_base
+TIKTOKEN_PROVIDERS = {"groq"}
+
+# Average characters per token for the offline estimate, by provider
+CHARS_PER_TOKEN = {"gemini": 4, "groq": 4}
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def context_window(model):
+    """
+    Returns the context window size of a model.
+
+    Args:
+        model (str): The model name, with or without a `models/` prefix.
+
+    Returns:
+        int: The context window in tokens.
+    """
+    name = model.split("/")[-1].lower()
+    best = ""
+    for prefix in MODEL_CONTEXT_WINDOWS:
+        if name.startswith(prefix) and len(prefix) > len(best):
+            best = prefix
+    return MODEL_CONTEXT_WINDOWS[best] if best else DEFAULT_CONTEXT_WINDOW
+
+
+@lru_cache(maxsize=None)
+def _tiktoken_encoding():
+    """Loads the cl100k_base encoding, or returns None if tiktoken is unavailable."""
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:  # Not installed, or encoding files not cached and no network
+        logging.info(f"tiktoken unavailable, using estimated token counts: {e}")
+        return None
+
+
+class TokenCounter:
+    """
+    Counts tokens for one provider/model.
+
+    Uses tiktoken where it matches the provider's tokenizer and is available
+    locally, otherwise an offline estimate: one token per punctuation mark and
+    one per `CHARS_PER_TOKEN` characters of each word.
+    """
+
+    def __init__(self, ai_service, model):
+        self.ai_service = ai_service
+        self.model = model
+        self.chars_per_token = CHARS_PER_TOKEN.get(ai_service, 4)
+        self.encoding = _tiktoken_encoding() if ai_service in TIKTOKEN_PROVIDERS else None
+
+    @property
+    def context_window(self):
+        """The context window of the model, in tokens."""
+        return context_window(self.model)
+
+    def count(self, text):
+        """
+        Counts the tokens in a piece of text.
+
+        Args:
+            text (str): The text to count.
+
+        Returns:
+            int: The number of tokens.
+        """
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        cpt = self.chars_per_token
+        return sum(
+            (len(piece) + cpt - 1) // cpt if piece[0].isalnum() or piece[0] == "_" else 1
+            for piece in _PIECE_RE.findall(text)
+        )
+
+    def count_message(self, message):
+        """
+        Counts the tokens a chat message occupies in a request.
+
+        Args:
+            message (dict): A message with `role` and `content`.
+
+        Returns:
+            int: The number of tokens, including per-message overhead.
+        """
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = "\n".join(str(part) for part in content)
+        return self.count(content) + MESSAGE_OVERHEAD
+
+
+@lru_cache(maxsize=16)
+def get_token_counter(ai_service, model):
+    """
+    Returns a shared token counter for a provider/model.
+
+    Args:
+        ai_service (str): The AI service name.
+        model (str): The model name.
+
+    Returns:
+        TokenCounter: The token counter.
+    """
+    return TokenCounter(ai_service, model)
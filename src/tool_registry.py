@@ -0,0 +1,41 @@
+import inspect
+import agent_tools as tools
+from tool_runner import TOOLS
+
+# JSON schema types for parameter defaults; parameters without a default are strings
+_JSON_TYPES = {bool: "boolean", int: "integer", float: "number"}
+
+
+def build_tool_schema(func):
+    """
+    Builds an OpenAI function-calling schema from a tool function's signature.
+
+    Args:
+        func (callable): The tool function.
+
+    Returns:
+        dict: The `{"type": "function", "function": {...}}` tool definition.
+    """
+    properties = {}
+    required = []
+    for name, param in inspect.signature(func).parameters.items():
+        if param.default is inspect.Parameter.empty:
+            properties[name] = {"type": "string"}
+            required.append(name)
+        else:
+            properties[name] = {
+                "type": _JSON_TYPES.get(type(param.default), "string"),
+                "description": f"Default: {param.default!r}",
+            }
+    return {
+        "type": "function",
+        "function": {
+            "name": func.__name__,
+            "description": inspect.getdoc(func) or func.__name__,
+            "parameters": {"type": "object", "properties": properties, "required": required},
+        },
+    }
+
+
+# Built once at import, from the tools the model may call
+TOOL_SCHEMAS = [build_tool_schema(getattr(tools, name)) for name in sorted(TOOLS)]
@@ -0,0 +1,84 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import agent_tools as tools
+
+# Tools without side effects; consecutive calls to these run concurrently
+READ_ONLY_TOOLS = {"wiki", "calc", "ls", "cat", "head", "read_lines", "tail", "grep"}
+# Tools that change files; these run one at a time, in order
+WRITE_TOOLS = {"write_file", "append_file", "delete_file", "move", "copy"}
+# Tools the model may call
+TOOLS = READ_ONLY_TOOLS | WRITE_TOOLS
+
+_executor = None
+_executor_workers = 0
+
+
+def _get_executor(max_workers):
+    """Returns the shared tool thread pool, resized if `max_workers` changed."""
+    global _executor, _executor_workers
+    if _executor is None or _executor_workers != max_workers:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="frea-tool")
+        _executor_workers = max_workers
+    return _executor
+
+
+def run_tool(name, args):
+    """
+    Runs one tool call, turning failures into an error message for the model.
+
+    Args:
+        name (str): The tool name (a function in agent_tools).
+        args (dict): The keyword arguments.
+
+    Returns:
+        str: The tool output.
+    """
+    if name not in TOOLS:
+        return f"Unknown tool: {name}"
+    try:
+        result = getattr(tools, name)(**args)
+    except Exception as e:
+        logging.warning(f"Tool {name} failed: {e}")
+        return f"{name} error: {e}"
+    return "" if result is None else str(result)
+
+
+def run_tool_calls(calls, max_workers=4):
+    """
+    Runs a list of tool calls and returns their outputs in the same order.
+
+    Consecutive read-only calls run concurrently on a bounded thread pool;
+    a call with side effects waits for everything before it and runs alone,
+    so writes, moves and deletes keep the order the model asked for.
+
+    Args:
+        calls (list): (name, args, ...) tuples; extra items (such as call ids) are ignored.
+        max_workers (int): The maximum number of tools running at once.
+
+    Returns:
+        list: The output of each call.
+    """
+    results = [None] * len(calls)
+    batch = []  # Indexes of pending read-only calls
+
+    def flush():
+        if len(batch) == 1:
+            i = batch[0]
+            results[i] = run_tool(*calls[i][:2])
+        elif batch:
+            executor = _get_executor(max_workers)
+            futures = {i: executor.submit(run_tool, *calls[i][:2]) for i in batch}
+            for i, future in futures.items():
+                results[i] = future.result()
+        batch.clear()
+
+    for i, call in enumerate(calls):
+        if call[0] in READ_ONLY_TOOLS:
+            batch.append(i)
+        else:
+            flush()
+            results[i] = run_tool(*call[:2])
+    flush()
+    return results
@@ -0,0 +1,127 @@
+import atexit
+import logging
+import threading
+
+# Process-wide HTTP clients, one per (base URL, pool settings). Every API client
+# built for the same endpoint shares its keep-alive connection pool, so switching
+# provider or model does not throw away warm TLS connections.
+_clients = {}
+_async_clients = {}
+_warmed = set()
+_lock = threading.Lock()
+
+
+def http2_available():
+    """True if the `h2` package is installed, so httpx can negotiate HTTP/2."""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _client_options(max_connections, max_keepalive, keepalive_expiry, http2, timeout):
+    import httpx
+
+    return {
+        "limits": httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        ),
+        # HTTP/2 is negotiated via ALPN, so endpoints without it fall back to HTTP/1.1
+        "http2": http2 and http2_available(),
+        "timeout": httpx.Timeout(timeout, connect=10.0),
+        "follow_redirects": True,
+    }
+
+
+def get_http_client(base_url, max_connections=20, max_keepalive=10, keepalive_expiry=120.0,
+                    http2=True, timeout=600.0):
+    """
+    Returns the shared `httpx.Client` for an endpoint.
+
+    Args:
+        base_url (str): The API base URL.
+        max_connections (int): Maximum concurrent connections in the pool.
+        max_keepalive (int): Maximum idle connections kept open.
+        keepalive_expiry (float): Seconds an idle connection is kept.
+        http2 (bool): Use HTTP/2 where the endpoint and installed packages support it.
+        timeout (float): Read timeout in seconds.
+
+    Returns:
+        httpx.Client: The pooled client.
+    """
+    key = (base_url, max_connections, max_keepalive, keepalive_expiry, http2, timeout)
+    with _lock:
+        client = _clients.get(key)
+        if client is None or client.is_closed:
+            import httpx
+
+            client = httpx.Client(
+                **_client_options(max_connections, max_keepalive, keepalive_expiry, http2, timeout)
+            )
+            _clients[key] = client
+        return client
+
+
+def get_async_http_client(base_url, max_connections=20, max_keepalive=10, keepalive_expiry=120.0,
+                          http2=True, timeout=600.0):
+    """
+    Returns the shared `httpx.AsyncClient` for an endpoint.
+
+    Takes the same arguments as `get_http_client`.
+
+    Returns:
+        httpx.AsyncClient: The pooled client.
+    """
+    key = (base_url, max_connections, max_keepalive, keepalive_expiry, http2, timeout)
+    with _lock:
+        client = _async_clients.get(key)
+        if client is None or client.is_closed:
+            import httpx
+
+            client = httpx.AsyncClient(
+                **_client_options(max_connections, max_keepalive, keepalive_expiry, http2, timeout)
+            )
+            _async_clients[key] = client
+        return client
+
+
+def prewarm(client, base_url):
+    """
+    Opens a connection to an endpoint in the background, so the first API
+    request after a provider switch does not pay for the TCP/TLS handshake.
+
+    Only the first call per base URL does anything.
+
+    Args:
+        client (httpx.Client): The pooled client to warm.
+        base_url (str): The API base URL.
+    """
+    with _lock:
+        if base_url in _warmed:
+            return
+        _warmed.add(base_url)
+
+    def warm():
+        import httpx
+
+        try:
+            client.head(base_url, timeout=5.0)
+        except httpx.HTTPError as e:
+            logging.debug(f"Connection prewarm for {base_url} failed: {e}")
+
+    threading.Thread(target=warm, daemon=True).start()
+
+
+def close_all():
+    """Closes every shared synchronous client (async clients close with their event loop)."""
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+        _warmed.clear()
+
+
+atexit.register(close_all)
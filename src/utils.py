@@ -78,3 +78,109 @@ def loading_animation(*args):
         cursor_show()
         sys.stdout.write('\r' + ' ' * 50 + '\r')
         sys.stdout.flush()
+
+
+async def async_loading_animation(stop_event):
+    """Show loading spinner until `stop_event` (an asyncio.Event) is set."""
+    import asyncio  # Only the --async engine needs it; keep it off the startup path
+
+    cursor_hide()
+    spinner = itertools.cycle(['|', '/', '-', '\\'])
+    try:
+        while not stop_event.is_set():
+            sys.stdout.write(f'\r{Color.LIGHTPURPLE}{next(spinner)} Thinking...{Color.ENDC}')
+            sys.stdout.flush()
+            try:
+                await asyncio.wait_for(stop_event.wait(), 0.1)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        cursor_show()
+        sys.stdout.write('\r' + ' ' * 50 + '\r')
+        sys.stdout.flush()
+
+
+class StreamPrinter:
+    """
+    Prints a streamed model reply chunk by chunk while collecting the full text
+    and any native tool calls.
+
+    With `hold_tool_json`, replies that open like a JSON tool call (the
+    text-based tool protocol) are buffered instead of printed, so the caller
+    can still run the tool without echoing the payload.
+    """
+
+    FENCE = "```json"
+
+    def __init__(self, hold_tool_json=True):
+        self.hold_tool_json = hold_tool_json
+        self.parts = []
+        self.tool_calls = {}  # index -> {"id", "name", "arguments"}
+        self.pending = ""
+        self.held = False  # The reply is a text tool call; don't print it
+        self.printed = False
+
+    @staticmethod
+    def has_payload(chunk):
+        """
+        True if a `chat.completions` stream chunk carries content or a tool call.
+
+        Callers check this before `feed_chunk` so they can clear the spinner
+        line before the first text is printed.
+        """
+        if not chunk.choices:
+            return False
+        delta = chunk.choices[0].delta
+        return bool(delta.content or getattr(delta, "tool_calls", None))
+
+    def feed_chunk(self, chunk):
+        """Adds a `chat.completions` stream chunk, printing its text."""
+        if not chunk.choices:
+            return
+        delta = chunk.choices[0].delta
+        for call in getattr(delta, "tool_calls", None) or []:
+            index = call.index if call.index is not None else len(self.tool_calls)
+            slot = self.tool_calls.setdefault(index, {"id": None, "name": "", "arguments": ""})
+            if call.id:
+                slot["id"] = call.id
+            if call.function:
+                slot["name"] += call.function.name or ""
+                slot["arguments"] += call.function.arguments or ""
+        if delta.content:
+            self.feed(delta.content)
+
+    def feed(self, delta):
+        """Adds a chunk of text, printing it once the reply is known not to be a tool call."""
+        self.parts.append(delta)
+        if self.printed or not self.hold_tool_json:
+            self.printed = True
+            print(delta, end="", flush=True)
+            return
+        if self.held:
+            return
+
+        # Hold back the opening characters until we know whether this is a tool call
+        self.pending += delta
+        head = self.pending.lstrip()
+        if head.startswith(("{", "[")):
+            self.held = True
+        elif len(head) < len(self.FENCE) and self.FENCE.startswith(head):
+            return
+        elif head.startswith(self.FENCE):
+            self.held = True
+        else:
+            self.printed = True
+            print(self.pending, end="", flush=True)
+
+    def finish(self):
+        """
+        Ends the stream.
+
+        Returns:
+            tuple: The full response text, whether it was printed, and the
+                   native tool calls as a list of {"id", "name", "arguments"}.
+        """
+        if self.printed:
+            print()
+        tool_calls = [self.tool_calls[i] for i in sorted(self.tool_calls)]
+        return "".join(self.parts).strip(), self.printed, tool_calls
@@ -0,0 +1,413 @@
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+USER_AGENT = "frea/1.0 (azzarmrzs@gmail.com)"
+REQUEST_TIMEOUT = 10.0  # Seconds per HTTP request to Wikipedia
+MISSING_TTL = 24 * 3600  # Seconds a "no such page" answer is cached
+# Where pages come from: Wikipedia, a local dump (see wiki_offline), or the dump first
+BACKENDS = ("online", "offline", "auto")
+LOOKUP_WORKERS = 8  # Titles looked up at once by lookup_many
+
+# Candidate queries in a -wiki prompt
+_FLAG_RE = re.compile(r"(?i)(?:^|\s)-wiki(?=\s|$)")
+_BATCH_RE = re.compile(r"(?i)(?:^|\s)-wiki[ \t]+([^\n]*\|[^\n]*)")  # -wiki a | b | c
+_QUOTED_RE = re.compile(r'"([^"\n]+)"|`([^`\n]+)`')
+# Runs of capitalised words (likely names), with short joining words: "Bank of England"
+_NAME_RE = re.compile(r"[A-Z][\w'.-]*(?:\s+(?:(?:of|the|and|de|von|van|in|on|for)\s+)?[A-Z][\w'.-]*)*")
+# Words that start questions and requests, or end them, rather than naming a topic
+_NOT_TOPICS = {
+    "a", "an", "and", "are", "but", "can", "compare", "could", "describe", "did", "do", "does",
+    "explain", "for", "give", "hello", "hey", "hi", "how", "i", "i'm", "in", "is", "it", "list",
+    "me", "my", "of", "on", "or", "please", "show", "should", "summarize", "tell", "that", "the",
+    "these", "this", "those", "to", "was", "we", "were", "what", "when", "where", "which", "who",
+    "why", "will", "with", "would", "you", "about", "at", "be", "by", "from", "work", "works",
+    "mean", "means", "happen", "happened", "called", "made", "used", "there", "its", "their",
+}
+
+_settings = {
+    "path": None,
+    "ttl": 7 * 24 * 3600,
+    "max_bytes": 20 * 1024 * 1024,
+    "backend": "online",
+    "dump": None,  # (dump path, dump index path, title index path)
+}
+_client = None
+_client_lock = threading.Lock()
+_executor = None  # Shared by lookup_many calls; late lookups finish here and fill the cache
+
+
+def first_sentences(text, sentences):
+    """Returns the first `sentences` sentences of a text."""
+    return " ".join(re.split(r'(?<=[\.!?]) +', text)[:sentences]).strip()
+
+
+def candidate_queries(prompt, limit=6):
+    """
+    Guesses what a -wiki prompt wants looked up, most likely first: the
+    titles of a `-wiki a | b | c` list, every phrase in double quotes or
+    backticks and capitalised names; failing those, the last two words of
+    the prompt that are not question words.
+
+    Args:
+        prompt (str): The user prompt.
+        limit (int): The maximum number of candidates.
+
+    Returns:
+        list: The candidate queries, without duplicates.
+    """
+    candidates = []
+    batch = _BATCH_RE.search(prompt)
+    if batch:
+        candidates.extend(batch.group(1).split("|"))
+        prompt = prompt[:batch.start(1)] + prompt[batch.end(1):]
+    prompt = _FLAG_RE.sub(" ", prompt)
+    candidates.extend(q or b for q, b in _QUOTED_RE.findall(prompt))
+    rest = _QUOTED_RE.sub(" ", prompt)
+    for name in _NAME_RE.findall(rest):
+        words = name.rstrip(".").removesuffix("'s").split()
+        while words and words[0].lower() in _NOT_TOPICS:
+            words.pop(0)
+        if words:
+            candidates.append(" ".join(words))
+    if not candidates:
+        tail = []
+        for word in reversed(re.findall(r"\w[\w'-]*", rest)):
+            if word.lower() in _NOT_TOPICS:
+                if tail:
+                    break
+            elif len(tail) < 2:
+                tail.insert(0, word)
+            else:
+                break
+        candidates.append(" ".join(tail))
+    queries = []
+    seen = set()
+    for candidate in candidates:
+        candidate = " ".join(candidate.split())
+        if candidate and candidate.casefold() not in seen:
+            seen.add(candidate.casefold())
+            queries.append(candidate)
+    return queries[:limit]
+
+
+class WikiClient:
+    """
+    Wikipedia page summaries through one reused HTTP session, with a
+    persistent cache, or from a local dump.
+
+    Summaries (and pages found missing) are kept in a SQLite database in WAL
+    mode, shared by all frea processes, bounded by entry age and total size
+    (least recently used entries are evicted first). Concurrent lookups of
+    the same title wait for a single fetch.
+
+    With the offline backend pages are read from a dump instead (see
+    wiki_offline); with auto, from the dump first and from Wikipedia for
+    pages it lacks or while its index is not built.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS pages (
+        key TEXT PRIMARY KEY,
+        summary TEXT,
+        url TEXT,
+        size INTEGER NOT NULL,
+        fetched_at REAL NOT NULL,
+        last_access REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS pages_last_access ON pages (last_access);
+    """
+
+    def __init__(
+        self, path=None, ttl=7 * 24 * 3600, max_bytes=20 * 1024 * 1024, language="en",
+        backend="online", dump=None,
+    ):
+        """
+        Args:
+            path (str): The SQLite cache file; None for no persistent cache.
+            ttl (float): Seconds before a cached summary is fetched again.
+            max_bytes (int): The maximum total size of cached summaries.
+            language (str): The Wikipedia language edition.
+            backend (str): One of `BACKENDS`.
+            dump (tuple): (dump path, dump index path, title index path) for
+                the offline backend.
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"unknown Wikipedia backend {backend!r}; use one of {', '.join(BACKENDS)}")
+        self.backend = backend
+        self.offline = None
+        if backend != "online":
+            if not dump or not dump[0]:
+                raise ValueError(f"the {backend} Wikipedia backend needs a dump (WikiDump)")
+            from wiki_offline import OfflineWiki  # Deferred: only the offline backend needs it
+
+            self.offline = OfflineWiki(dump[0], dump[2], dump[1], language)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.language = language
+        self.fetches = 0
+        self._wiki = None
+        self._lock = threading.Lock()
+        self._inflight = {}  # Key -> Future of the fetch in progress
+        self._conn = None
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                self._conn = sqlite3.connect(
+                    path, timeout=10, check_same_thread=False, isolation_level=None
+                )
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+                self._conn.executescript(self.SCHEMA)
+            except sqlite3.Error as e:
+                logging.warning(f"Wikipedia cache unavailable: {e}")
+                self._conn = None
+
+    @property
+    def wiki(self):
+        """The `wikipediaapi.Wikipedia` object (and its HTTP session), created on first use."""
+        if self._wiki is None:
+            import wikipediaapi  # Deferred: only Wikipedia lookups need it
+
+            self._wiki = wikipediaapi.Wikipedia(
+                language=self.language, user_agent=USER_AGENT, timeout=REQUEST_TIMEOUT
+            )
+        return self._wiki
+
+    def _cached(self, key):
+        """Returns (summary, url) from the cache, (None, None) for a missing page, or None."""
+        if self._conn is None:
+            return None
+        now = time.time()
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT summary, url, fetched_at FROM pages WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                ttl = self.ttl if row[0] is not None else min(self.ttl, MISSING_TTL)
+                if now - row[2] > ttl:
+                    return None
+                self._conn.execute("UPDATE pages SET last_access = ? WHERE key = ?", (now, key))
+                return row[0], row[1]
+            except sqlite3.Error as e:
+                logging.warning(f"Wikipedia cache lookup failed: {e}")
+                return None
+
+    def _store(self, key, summary, url):
+        if self._conn is None:
+            return
+        now = time.time()
+        size = len((summary or "").encode("utf-8")) + len(key)
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO pages (key, summary, url, size, fetched_at, last_access) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (key, summary, url, size, now, now),
+                    )
+                    self._evict(now)
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            except sqlite3.Error as e:
+                logging.warning(f"Wikipedia cache store failed: {e}")
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM pages WHERE fetched_at < ?", (now - self.ttl,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        while total > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM pages ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM pages WHERE key = ?", (key,))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def _fetch(self, title):
+        self.fetches += 1
+        page = self.wiki.page(title)
+        if not page.exists():
+            return None, None
+        return page.summary or "", page.fullurl
+
+    def page(self, title):
+        """
+        Looks up a page's summary, from the cache or Wikipedia.
+
+        Args:
+            title (str): The page title or query.
+
+        Returns:
+            tuple: (summary, url), or (None, None) if there is no such page.
+
+        Raises:
+            Exception: If Wikipedia cannot be reached (errors are not cached),
+                or the offline index is missing with the offline backend.
+        """
+        if self.offline is not None:
+            try:
+                found = self.offline.lookup(title)
+            except Exception as e:
+                if self.backend == "offline":
+                    raise
+                logging.warning(f"Offline Wikipedia lookup failed, asking Wikipedia: {e}")
+                found = (None, None)
+            if found[0] is not None or self.backend == "offline":
+                return found
+        key = f"{self.language}:{title.strip()}"
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return future.result()  # Another thread is fetching this title
+        try:
+            result = self._fetch(title.strip())
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            self._store(key, *result)
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def summary(self, title, sentences=3):
+        """
+        Returns the first sentences of a page's summary.
+
+        Args:
+            title (str): The page title or query.
+            sentences (int): Number of sentences to return.
+
+        Returns:
+            tuple: (text, url), or None if there is no such page.
+        """
+        summary, url = self.page(title)
+        if summary is None:
+            return None
+        return first_sentences(summary, sentences), url
+
+    def close(self):
+        """Closes the cache database and the dump."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        if self.offline is not None:
+            self.offline.close()
+
+
+def configure(path, ttl, max_bytes, backend="online", dump=None):
+    """
+    Sets up the shared client; takes effect on its next use.
+
+    Args:
+        path (str): The SQLite cache file; None for no persistent cache.
+        ttl (float): Seconds before a cached summary is fetched again.
+        max_bytes (int): The maximum total size of cached summaries.
+        backend (str): One of `BACKENDS`.
+        dump (tuple): (dump path, dump index path, title index path).
+    """
+    global _client
+    settings = {"path": path, "ttl": ttl, "max_bytes": max_bytes, "backend": backend, "dump": dump}
+    with _client_lock:
+        if settings == _settings:
+            return
+        _settings.update(settings)
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def get_client():
+    """Returns the client shared by the -wiki lookups and the wiki tool."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = WikiClient(**_settings)
+        return _client
+
+
+def lookup_many(titles, sentences=3, timeout=None):
+    """
+    Looks several titles up at once through the shared client.
+
+    Lookups still running when `timeout` expires are not waited for: they
+    finish in the background (filling the cache for next time) and their
+    results are dropped.
+
+    Args:
+        titles (list): The page titles or queries.
+        sentences (int): Number of sentences of each summary.
+        timeout (float): Seconds to wait for the lookups; None waits for all.
+
+    Returns:
+        dict: Title -> (text, url), or None if there is no such page. Titles
+              whose lookup failed or was late are left out.
+    """
+    global _executor
+    client = get_client()
+    with _client_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=LOOKUP_WORKERS, thread_name_prefix="frea-wiki")
+    futures = {_executor.submit(client.summary, title, sentences): title for title in titles}
+    done, late = wait(futures, timeout=timeout)
+    for future in late:
+        future.cancel()  # Only stops lookups that have not started yet
+    results = {}
+    for future in done:
+        title = futures[future]
+        try:
+            results[title] = future.result()
+        except Exception as e:
+            logging.warning(f"Wikipedia lookup of {title!r} failed: {e}")
+    if late:
+        logging.info(f"Wikipedia: dropped {len(late)} late lookups: {', '.join(futures[f] for f in late)}")
+    return results
+
+
+def build_offline_index():
+    """
+    Builds the title index of the configured dump, printing progress.
+
+    Returns:
+        int: The process exit status.
+    """
+    from wiki_offline import OfflineWiki  # Deferred: only the offline backend needs it
+
+    dump = _settings["dump"]
+    if not dump or not dump[0]:
+        print("No Wikipedia dump configured; set WikiDump (and WikiDumpIndex) in config.ini.")
+        return 2
+    wiki = OfflineWiki(dump[0], dump[2], dump[1])
+    if wiki.is_built():
+        print(f"The index of {dump[0]} is up to date.")
+        return 0
+    started = time.monotonic()
+    try:
+        count = wiki.build(lambda n: print(f"\r{n:,} titles indexed", end="", flush=True))
+    except (OSError, ValueError) as e:
+        print(f"\nCould not build the index: {e}")
+        return 1
+    print(f"\r{count:,} titles indexed in {time.monotonic() - started:.0f}s: {dump[2]}")
+    return 0
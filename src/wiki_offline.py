@@ -0,0 +1,325 @@
+import os
+import re
+import bz2
+import html
+import sqlite3
+import threading
+import urllib.parse
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+
+READ_SIZE = 64 * 1024
+CACHED_STREAMS = 8  # Decompressed multistream blocks (100 pages each) kept in memory
+MAX_REDIRECTS = 3
+BATCH_ROWS = 50000  # Index rows inserted per statement batch while building
+INDEX_VERSION = "2"  # Bumped when the index layout changes, so old indexes are rebuilt
+
+# Wikitext markup removed or unwrapped to get plain text
+_COMMENT_RE = re.compile(r"<!--.*?-->", re.S)
+_REF_RE = re.compile(r"<ref[^>/]*/>|<ref[^>]*>.*?</ref>", re.S | re.I)
+_TEMPLATE_RE = re.compile(r"\{\{[^{}]*\}\}|\{\|[^{}]*?\|\}")  # Innermost templates and tables
+_FILE_RE = re.compile(r"\[\[(?:File|Image|Category):[^\[\]]*\]\]", re.I)
+_LINK_RE = re.compile(r"\[\[(?:[^\[\]|]*\|)?([^\[\]]*)\]\]")
+_EXTERNAL_LINK_RE = re.compile(r"\[(?:https?:)?//[^\s\]]+\s*([^\]]*)\]")
+_TAG_RE = re.compile(r"<[^>]+>")
+_PAGE_RE = re.compile(rb"<page>.*?</page>", re.S)
+_TITLE_RE = re.compile(rb"<title>(.*?)</title>", re.S)
+
+
+def normalize_title(title):
+    """The index key of a title: case-folded, with underscores and runs of spaces as one space."""
+    return " ".join(title.replace("_", " ").split()).casefold()
+
+
+def wikitext_summary(text):
+    """
+    Turns the lead section of a page's wikitext into plain text.
+
+    Args:
+        text (str): The wikitext.
+
+    Returns:
+        str: The lead paragraphs on one line.
+    """
+    lead = re.split(r"\n==[^=]", text, maxsplit=1)[0]
+    lead = _REF_RE.sub("", _COMMENT_RE.sub("", lead))
+    previous = None
+    while previous != lead:  # Nested templates and links unwrap from the inside out
+        previous = lead
+        lead = _TEMPLATE_RE.sub("", lead)
+        lead = _FILE_RE.sub("", lead)
+    lead = _LINK_RE.sub(r"\1", lead)
+    lead = _EXTERNAL_LINK_RE.sub(r"\1", lead)
+    lead = _TAG_RE.sub("", lead).replace("'''", "").replace("''", "")
+    lead = html.unescape(lead)
+    paragraphs = [" ".join(line.split()) for line in lead.split("\n")]
+    return " ".join(p for p in paragraphs if p and not p.startswith(("*", "#", "|", ":")))
+
+
+class OfflineWiki:
+    """
+    Looks pages up in a downloaded Wikipedia dump through a title -> offset index.
+
+    Two dump formats are supported:
+
+    - A multistream dump (`*-pages-articles-multistream.xml.bz2`) with its
+      index (`*-multistream-index.txt.bz2`). The dump is a series of bz2
+      streams of 100 pages each, so a lookup seeks to the page's stream and
+      decompresses only that.
+    - An abstracts file (`*-abstract.xml`, decompressed), where a lookup
+      seeks to the page's `<doc>` entry.
+
+    The index is a SQLite table built once from the dump index or the
+    abstracts file (`build`); it is rebuilt when the dump changes. Titles
+    that differ only in case share a key and may sit in different streams,
+    so every offset of a key is kept and a lookup prefers the exact spelling.
+    """
+
+    def __init__(self, dump_path, index_path, dump_index_path=None, language="en"):
+        """
+        Args:
+            dump_path (str): The multistream dump or abstracts file.
+            index_path (str): The SQLite title index (built by `build`).
+            dump_index_path (str): The multistream dump's own index file.
+            language (str): The language edition, for page URLs.
+        """
+        self.dump_path = dump_path
+        self.index_path = index_path
+        self.dump_index_path = dump_index_path
+        self.language = language
+        self.multistream = dump_path.endswith(".bz2")
+        self._lock = threading.Lock()
+        self._file = None
+        self._conn = None
+        self._streams = OrderedDict()  # Offset -> decompressed stream
+
+    def _source_stamp(self):
+        stat = os.stat(self.dump_path)
+        return f"{os.path.abspath(self.dump_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def is_built(self):
+        """True if the index exists and was built from the current dump."""
+        if not os.path.exists(self.index_path):
+            return False
+        try:
+            conn = sqlite3.connect(f"file:{self.index_path}?mode=ro", uri=True)
+            try:
+                meta = dict(conn.execute("SELECT name, value FROM meta"))
+            finally:
+                conn.close()
+            return meta.get("source") == self._source_stamp() and meta.get("version") == INDEX_VERSION
+        except (sqlite3.Error, OSError):
+            return False
+
+    def _entries(self):
+        """Yields (title, offset) pairs from the dump index or the abstracts file."""
+        if self.multistream:
+            if not self.dump_index_path:
+                raise ValueError("a multistream dump needs its index file (WikiDumpIndex)")
+            opener = bz2.open if self.dump_index_path.endswith(".bz2") else open
+            with opener(self.dump_index_path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    offset, _, title = line.rstrip("\n").split(":", 2)
+                    yield title, int(offset)
+            return
+        with open(self.dump_path, "rb") as f:
+            offset = 0
+            doc = None
+            for line in f:
+                if line.startswith(b"<doc>"):
+                    doc = offset
+                elif doc is not None and line.startswith(b"<title>"):
+                    match = _TITLE_RE.match(line)
+                    if match:
+                        title = html.unescape(match.group(1).decode("utf-8", "replace"))
+                        yield title.removeprefix("Wikipedia: "), doc
+                    doc = None
+                offset += len(line)
+
+    def build(self, progress=None):
+        """
+        Builds the title index. Runs once per dump; takes minutes for a full
+        English dump.
+
+        Args:
+            progress (callable): Called with the number of titles indexed so far.
+
+        Returns:
+            int: The number of titles indexed.
+        """
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        partial = self.index_path + ".partial"
+        if os.path.exists(partial):
+            os.remove(partial)
+        conn = sqlite3.connect(partial)
+        count = 0
+        try:
+            conn.execute("PRAGMA journal_mode=OFF")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE titles (key TEXT NOT NULL, offset INTEGER NOT NULL, "
+                "PRIMARY KEY (key, offset)) WITHOUT ROWID"
+            )
+            conn.execute("CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            rows = []
+            for title, offset in self._entries():
+                rows.append((normalize_title(title), offset))
+                if len(rows) >= BATCH_ROWS:
+                    conn.executemany("INSERT OR IGNORE INTO titles VALUES (?, ?)", rows)
+                    count += len(rows)
+                    rows = []
+                    if progress:
+                        progress(count)
+            conn.executemany("INSERT OR IGNORE INTO titles VALUES (?, ?)", rows)
+            count += len(rows)
+            conn.execute("INSERT INTO meta VALUES ('source', ?)", (self._source_stamp(),))
+            conn.execute("INSERT INTO meta VALUES ('version', ?)", (INDEX_VERSION,))
+            conn.commit()
+        finally:
+            conn.close()
+        self.close()
+        os.replace(partial, self.index_path)  # Never leave a half-built index in place
+        return count
+
+    def _offsets(self, key):
+        """The offsets of every title with this key, in dump order."""
+        with self._lock:
+            if self._conn is None:
+                if not self.is_built():
+                    raise FileNotFoundError(
+                        f"offline Wikipedia index not built for {self.dump_path}; "
+                        "run frea with --build-wiki-index"
+                    )
+                self._conn = sqlite3.connect(
+                    f"file:{self.index_path}?mode=ro", uri=True, check_same_thread=False
+                )
+                self._file = open(self.dump_path, "rb")
+            rows = self._conn.execute(
+                "SELECT offset FROM titles WHERE key = ? ORDER BY offset", (key,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def _stream(self, offset):
+        """Returns the decompressed bz2 stream starting at `offset`."""
+        with self._lock:
+            data = self._streams.pop(offset, None)
+            if data is None:
+                decompressor = bz2.BZ2Decompressor()
+                pieces = []
+                self._file.seek(offset)
+                while not decompressor.eof:
+                    chunk = self._file.read(READ_SIZE)
+                    if not chunk:
+                        break
+                    pieces.append(decompressor.decompress(chunk))
+                data = b"".join(pieces)
+            self._streams[offset] = data
+            while len(self._streams) > CACHED_STREAMS:
+                self._streams.popitem(last=False)
+        return data
+
+    def _read_page(self, key, offsets, wanted):
+        """
+        Returns (title, wikitext, redirect target) of a page in the multistream
+        blocks at `offsets`; among titles differing only in case, the one
+        spelled `wanted`, else the first.
+        """
+        found = None
+        for offset in offsets:
+            for match in _PAGE_RE.finditer(self._stream(offset)):
+                title = _TITLE_RE.search(match.group(0))
+                if not title:
+                    continue
+                title = html.unescape(title.group(1).decode("utf-8", "replace"))
+                if normalize_title(title) != key:
+                    continue
+                if title == wanted:
+                    return self._parse_page(title, match.group(0))
+                if found is None:
+                    found = (title, match.group(0))
+        return self._parse_page(*found) if found else None
+
+    @staticmethod
+    def _parse_page(title, xml):
+        page = ET.fromstring(xml)
+        redirect = page.find("redirect")
+        return (
+            title,
+            page.findtext("revision/text") or "",
+            redirect.get("title") if redirect is not None else None,
+        )
+
+    def _read_abstract(self, offsets, wanted):
+        """
+        Returns (title, abstract, url) of a `<doc>` entry in an abstracts file;
+        among the entries at `offsets`, the one spelled `wanted`, else the first.
+        """
+        found = None
+        for offset in offsets:
+            entry = self._read_doc(offset)
+            if entry[0] == wanted:
+                return entry
+            found = found or entry
+        return found
+
+    def _read_doc(self, offset):
+        """Returns (title, abstract, url) of the `<doc>` entry at `offset`."""
+        with self._lock:
+            self._file.seek(offset)
+            lines = []
+            for line in self._file:
+                lines.append(line)
+                if line.startswith(b"</doc>"):
+                    break
+        doc = ET.fromstring(b"".join(lines))
+        title = (doc.findtext("title") or "").removeprefix("Wikipedia: ")
+        return title, doc.findtext("abstract") or "", doc.findtext("url")
+
+    def page_url(self, title):
+        """The Wikipedia URL of a page."""
+        path = urllib.parse.quote(title.replace(" ", "_"), safe="/:(),'")
+        return f"https://{self.language}.wikipedia.org/wiki/{path}"
+
+    def lookup(self, title):
+        """
+        Looks a page up, following redirects.
+
+        Args:
+            title (str): The page title or query.
+
+        Returns:
+            tuple: (summary, url), or (None, None) if the dump has no such page.
+
+        Raises:
+            FileNotFoundError: If the index has not been built.
+        """
+        wanted = " ".join(title.replace("_", " ").split())
+        wanted = wanted[:1].upper() + wanted[1:]  # Wikipedia capitalises the first letter
+        key = normalize_title(wanted)
+        for _ in range(MAX_REDIRECTS + 1):
+            offsets = self._offsets(key)
+            if not offsets:
+                return None, None
+            if not self.multistream:
+                found_title, abstract, url = self._read_abstract(offsets, wanted)
+                return abstract, url or self.page_url(found_title)
+            page = self._read_page(key, offsets, wanted)
+            if page is None:
+                return None, None
+            found_title, text, redirect = page
+            if not redirect:
+                return wikitext_summary(text), self.page_url(found_title)
+            wanted = redirect
+            key = normalize_title(redirect)
+        return None, None
+
+    def close(self):
+        """Closes the index and the dump."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._streams.clear()